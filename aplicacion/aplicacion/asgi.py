@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aplicacion.settings')
 
 application = get_asgi_application()
+
+# Con PRODUCTOS_PRECARGA (settings_produccion): URLs y plantillas listas antes
+# de que el servidor forkee los workers
+from productos.arranque import precargar_si_corresponde  # noqa: E402
+
+precargar_si_corresponde()
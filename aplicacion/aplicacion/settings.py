@@ -20,6 +20,99 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'lista_productos'   # adonde redirige después de iniciar sesión
 LOGOUT_REDIRECT_URL = 'index'          # adonde redirige al cerrar sesión
 
+# Paginación por cursor del listado de productos (?por_pagina=)
+PRODUCTOS_POR_PAGINA = 25
+PRODUCTOS_POR_PAGINA_MAX = 100
+
+# Backend de búsqueda de productos; None elige según el motor de la BD
+# ('productos.busqueda.PostgresBackend' o 'productos.busqueda.InvertidoBackend')
+PRODUCTOS_BUSQUEDA_BACKEND = None
+
+# Feed de cambios /productos/cambios/ (?limite=); el margen en segundos evita
+# casi todos los saltos de transacciones que confirmaron fuera de orden, y el
+# token sigue esperando los ids saltados durante la ventana: una transacción
+# que tarde más que la ventana en confirmar puede perder sus cambios en el feed
+PRODUCTOS_CAMBIOS_LIMITE = 500
+PRODUCTOS_CAMBIOS_LIMITE_MAX = 5000
+PRODUCTOS_CAMBIOS_MARGEN = 2
+PRODUCTOS_CAMBIOS_VENTANA = 300
+
+# API de lectura por lotes /api/productos/?ids=: máximo de ids por llamada
+PRODUCTOS_API_MAX_IDS = 100
+
+# Sugerencias del buscador (/productos/sugerencias/): índice de prefijos en
+# memoria de cada proceso, al día con el registro de cambios cada
+# SINCRONIZACION segundos; sin él se consulta el índice de búsqueda de la BD
+PRODUCTOS_SUGERENCIAS_EN_MEMORIA = True
+PRODUCTOS_SUGERENCIAS_LIMITE = 8
+PRODUCTOS_SUGERENCIAS_SINCRONIZACION = 5
+# Candidatos que se revisan como máximo por petición (acota prefijos muy comunes)
+PRODUCTOS_SUGERENCIAS_ESCANEO = 1000
+
+# Precarga de URLs y plantillas al importar wsgi.py/asgi.py (productos.arranque);
+# la activa settings_produccion
+PRODUCTOS_PRECARGA = False
+PRODUCTOS_PRECARGA_SUGERENCIAS = False
+
+# Tablero de analítica (/productos/analitica/): umbral de "stock bajo"
+PRODUCTOS_STOCK_BAJO = 5
+# Segundos que espera el refresco de la analítica tras un cambio; los cambios
+# que llegan mientras tanto se suman a la misma tarea
+PRODUCTOS_ANALITICA_DEMORA = 60
+
+# Productos relacionados del detalle (productos.relacionados, requiere numpy):
+# cuántos se guardan por producto y segundos que espera su recálculo tras un cambio
+PRODUCTOS_RELACIONADOS_K = 6
+PRODUCTOS_RELACIONADOS_DEMORA = 300
+
+# Cola de tareas en segundo plano (productos.tareas, `manage.py procesar_tareas`).
+# Con INMEDIATAS las tareas se ejecutan al confirmar la transacción, sin worker:
+# así en desarrollo la búsqueda y los relacionados siguen al día.
+# settings_produccion.py lo desactiva y ahí hace falta un worker en marcha.
+PRODUCTOS_TAREAS_INMEDIATAS = True
+# Espera exponencial entre reintentos de un lote fallido: base * 2^(intento-1), con tope
+PRODUCTOS_TAREAS_ESPERA_BASE = 2
+PRODUCTOS_TAREAS_ESPERA_MAX = 300
+# Segundos tras los que una tarea 'en_curso' se da por abandonada y vuelve a la cola
+PRODUCTOS_TAREAS_VENCIMIENTO = 300
+# Días de historial de ejecuciones para las métricas de latencia
+PRODUCTOS_TAREAS_HISTORIA_DIAS = 7
+
+# Instrumentación de consultas por vista (/productos/estadisticas/ y log
+# 'productos.consultas'). Los presupuestos también los verifican los tests;
+# 'vista:POST' cuenta las escrituras derivadas (índice, proyección, cambios,
+# libro de stock)
+# y los SAVEPOINT de las transacciones.
+PRODUCTOS_INSTRUMENTACION = True
+PRODUCTOS_PRESUPUESTO_CONSULTAS = {
+    'index': 2,
+    'lista_productos': 7,
+    'detalle_producto': 3,
+    'crear_producto': 4,
+    'crear_producto:POST': 21,
+    'editar_producto': 7,
+    'editar_producto:POST': 25,
+    'eliminar_producto': 3,
+    'lista_categorias': 3,
+    'lista_etiquetas': 3,
+    'feed_cambios': 1,
+    'analitica': 6,
+    'api_productos': 3,
+    'sugerencias': 2,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # INFO registra cada request; WARNING solo excesos y consultas repetidas
+        'productos': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -40,16 +133,26 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'productos.routers.EnrutamientoLecturasMiddleware',
+    'productos.instrumentacion.InstrumentacionConsultasMiddleware',
 ]
 
 ROOT_URLCONF = 'aplicacion.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates con medición del tiempo de render (productos.plantillas)
+        'BACKEND': 'productos.plantillas.DjangoTemplatesMedidas',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Plantillas compiladas una vez por proceso
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -76,6 +179,69 @@ DATABASES = {
     }
 }
 
+# Conexiones persistentes con verificación de salud: cada proceso reutiliza
+# su conexión hasta 60 s en vez de abrir una por request, y la descarta si el
+# servidor la cerró. Bajo ASGI cada request corre en un hilo nuevo y no las
+# reutiliza; ahí conviene el pool de psycopg 3 (DB_POOL=1, requiere psycopg-pool).
+if os.environ.get('DB_POOL') == '1':
+    DATABASES['default']['OPTIONS'] = {'pool': {'min_size': 2, 'max_size': 20, 'timeout': 10}}
+else:
+    DATABASES['default'].update(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+
+# Réplicas de solo lectura: DB_REPLICAS=host1,host2 crea los alias replica_1,
+# replica_2... con las mismas credenciales que el primario.
+for i, host in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica_{i}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['productos.routers.RouterReplicas']
+
+# Alias que reciben las lecturas de PRODUCTOS_VISTAS_REPLICA; sin réplicas todo va al primario
+PRODUCTOS_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+PRODUCTOS_VISTAS_REPLICA = [
+    'lista_productos', 'detalle_producto', 'lista_categorias', 'lista_etiquetas', 'api_productos',
+]
+# Segundos que un navegador lee del primario después de escribir (lectura tras escritura)
+PRODUCTOS_REPLICA_RETRASO = 5
+
+# Caché
+# 'productos' es la caché compartida entre los workers del mismo servidor;
+# delante de ella cada proceso mantiene un LRU en memoria (productos.cache).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Una entrada por detalle y un token de versión por producto, más los de
+    # tablas y catálogo: sin MAX_ENTRIES Django recorta a 300 archivos. Al
+    # llenarse borra 1/CULL_FREQUENCY al azar (un token desalojado solo causa
+    # un fallo, nunca datos viejos). En producción, mejor un backend acotado
+    # compartido: settings_produccion usa Redis si hay PRODUCTOS_REDIS_URL.
+    'productos': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'productos',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 250_000, 'CULL_FREQUENCY': 10},
+    },
+    # Fragmentos {% cache %} de las plantillas (navegación de base.html): por proceso
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragmentos',
+    },
+}
+
+PRODUCTOS_CACHE_ALIAS = 'productos'
+PRODUCTOS_CACHE_LRU = 1000   # entradas por proceso
+PRODUCTOS_FRAGMENTOS_LRU = 5000   # filas del listado ya renderizadas, por proceso
+# Segundos que se guardan los conteos de facetas de una versión del catálogo
+# (la clave cambia con cada cambio; esto solo acota las entradas huérfanas)
+PRODUCTOS_FACETAS_TIMEOUT = 300
+
+# GET condicional del catálogo (productos.condicional): segundos que un proxy
+# puede servir una página anónima sin revalidar, y un valor a cambiar en cada
+# despliegue que modifique las plantillas (invalida los ETag emitidos).
+PRODUCTOS_HTTP_MAX_AGE = 30
+PRODUCTOS_VERSION_PLANTILLAS = '1'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
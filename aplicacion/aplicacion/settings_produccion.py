@@ -0,0 +1,49 @@
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import CACHES, INSTALLED_APPS
+
+# Perfil de los workers públicos del catálogo (DJANGO_SETTINGS_MODULE=aplicacion.settings_produccion).
+# El admin se despliega aparte con aplicacion.settings, que también corre
+# collectstatic y las migraciones.
+
+DEBUG = False
+ALLOWED_HOSTS = [h.strip() for h in os.environ.get('ALLOWED_HOSTS', '').split(',') if h.strip()]
+# Sin valor por defecto: la clave de settings.py es pública (está en el repositorio)
+try:
+    SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+except KeyError:
+    raise ImproperlyConfigured('Falta la variable de entorno DJANGO_SECRET_KEY.')
+
+# Sin admin (ni sus plantillas, formularios y registros de modelos) ni
+# staticfiles: {% static %} sigue funcionando con STATIC_URL
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in ('django.contrib.admin', 'django.contrib.staticfiles')
+]
+
+# Las tareas (índice de búsqueda, analítica, relacionados) van a la cola y las
+# procesa `manage.py procesar_tareas`: sin un worker en marcha los productos
+# nuevos o editados no aparecen en la búsqueda
+PRODUCTOS_TAREAS_INMEDIATAS = False
+
+# Precarga en wsgi.py/asgi.py antes de forkear los workers (gunicorn --preload):
+# URLs resueltas, plantillas compiladas y objetos congelados para el gc
+PRODUCTOS_PRECARGA = True
+# También el índice de sugerencias: los workers lo heredan ya cargado
+PRODUCTOS_PRECARGA_SUGERENCIAS = True
+
+# Caché compartida acotada para todos los workers (y máquinas): Redis con
+# maxmemory y maxmemory-policy allkeys-lru. Sin ella, la FileBasedCache de
+# settings.py (requiere redis-py)
+if os.environ.get('PRODUCTOS_REDIS_URL'):
+    CACHES = {
+        **CACHES,
+        'productos': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['PRODUCTOS_REDIS_URL'],
+            'TIMEOUT': 60 * 60,
+        },
+    }
@@ -1,8 +1,23 @@
-from django.contrib import admin
+from django.apps import apps
+from django.contrib.auth import views as auth_views
 from django.urls import path, include
 
 urlpatterns = [
     path('', include('productos.urls')),  # tu app principal
-    path('accounts/', include('django.contrib.auth.urls')),  
-    path('admin/', admin.site.urls),
-]
\ No newline at end of file
+]
+
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns += [
+        path('accounts/', include('django.contrib.auth.urls')),
+        path('admin/', admin.site.urls),
+    ]
+else:
+    # Perfil de producción (settings_produccion): el admin y las páginas de
+    # contraseña, cuyas plantillas vienen del admin, las sirve el despliegue
+    # de administración; aquí solo quedan el login y el logout
+    urlpatterns += [
+        path('accounts/login/', auth_views.LoginView.as_view(), name='login'),
+        path('accounts/logout/', auth_views.LogoutView.as_view(), name='logout'),
+    ]
@@ -0,0 +1,205 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .facetas import RANGOS_PRECIO, _q_rango, nombre_rango
+from .models import (
+    Cambio, Producto, ProductoResumen, RefrescoAnalitica, ResumenCategoria, ResumenEtiqueta,
+)
+from .tablas import tabla_categorias, tabla_etiquetas
+
+
+# Agregados del catálogo para el tablero de analítica: valor de inventario
+# por categoría, productos por etiqueta, stock bajo y distribución de
+# precios. Se calculan fuera de las peticiones (dos GROUP BY, uno por tabla)
+# y se guardan en ResumenCategoria / ResumenEtiqueta; el tablero y las listas
+# de categorías y etiquetas solo leen esas filas.
+#
+# El refresco lo guía el registro de cambios: cada RefrescoAnalitica guarda
+# el último Cambio incluido y, si no hubo cambios desde entonces, refrescar()
+# no hace nada. Solo se reescriben las filas cuyos agregados cambiaron.
+#
+# Los conteos por categoría y etiqueta de las listas se guardan además en la
+# caché compartida: el refresco los reemplaza al confirmarse y las listas no
+# consultan las tablas de resumen en cada petición.
+
+Intermedia = Producto.etiquetas.through
+
+CERO = Decimal('0.00')
+
+
+def umbral_stock_bajo():
+    return getattr(settings, 'PRODUCTOS_STOCK_BAJO', 5)
+
+
+def _agregados_categorias():
+    umbral = umbral_stock_bajo()
+    valor = models.ExpressionWrapper(
+        F('precio') * F('stock'), output_field=models.DecimalField(max_digits=18, decimal_places=2),
+    )
+    filas = (
+        ProductoResumen.objects.order_by().values('categoria_id')
+        .annotate(
+            productos=Count('pk'),
+            unidades=Coalesce(Sum('stock'), 0),
+            valor_inventario=Coalesce(Sum(valor), CERO, output_field=valor.output_field),
+            sin_stock=Count('pk', filter=Q(stock=0)),
+            stock_bajo=Count('pk', filter=Q(stock__gt=0, stock__lte=umbral)),
+            precio_minimo=Min('precio'),
+            precio_maximo=Max('precio'),
+            **{f'r{i}': Count('pk', filter=_q_rango(i)) for i in range(len(RANGOS_PRECIO))},
+        )
+    )
+    agregados = {}
+    for fila in filas:
+        pk = fila.pop('categoria_id')
+        fila['rangos'] = [fila.pop(f'r{i}') for i in range(len(RANGOS_PRECIO))]
+        fila['valor_inventario'] = Decimal(fila['valor_inventario']).quantize(CERO)
+        agregados[pk] = fila
+    # Las categorías sin productos también tienen su fila (en cero)
+    vacia = {
+        'productos': 0, 'unidades': 0, 'valor_inventario': CERO, 'sin_stock': 0, 'stock_bajo': 0,
+        'precio_minimo': None, 'precio_maximo': None, 'rangos': [0] * len(RANGOS_PRECIO),
+    }
+    return {pk: agregados.get(pk, vacia) for pk in tabla_categorias.nombres()}
+
+
+def _agregados_etiquetas():
+    filas = (
+        Intermedia.objects.order_by().values('etiqueta_id')
+        .annotate(productos=Count('producto_id'), con_stock=Count('producto_id', filter=Q(producto__stock__gt=0)))
+    )
+    agregados = {fila.pop('etiqueta_id'): fila for fila in filas}
+    vacia = {'productos': 0, 'con_stock': 0}
+    return {pk: agregados.get(pk, vacia) for pk in tabla_etiquetas.nombres()}
+
+
+def _escribir(modelo, campo, agregados):
+    """Upsert de las filas de `modelo` cuyos valores difieren de `agregados`; devuelve cuántas escribió."""
+    campos = [f.name for f in modelo._meta.concrete_fields if not f.primary_key and f.name != 'actualizado']
+    actuales = {fila.pop(campo): fila for fila in modelo.objects.values(campo, *campos)}
+    filas = [
+        modelo(**{campo: pk}, **valores)
+        for pk, valores in agregados.items() if actuales.get(pk) != valores
+    ]
+    modelo.objects.bulk_create(
+        filas, update_conflicts=True, unique_fields=[campo.removesuffix('_id')],
+        update_fields=campos + ['actualizado'],
+    )
+    return len(filas)
+
+
+def _ultimo_cambio():
+    # Con el mismo margen que el feed: un cambio con id menor que aún no se
+    # confirmó quedaría detrás del cursor y su efecto no se vería hasta el
+    # siguiente cambio.
+    margen = getattr(settings, 'PRODUCTOS_CAMBIOS_MARGEN', 2)
+    return (
+        Cambio.objects.filter(momento__lte=timezone.now() - timedelta(seconds=margen))
+        .order_by('-pk').values_list('pk', flat=True).first()
+    ) or 0
+
+
+def refrescar(forzar=False):
+    """
+    Recalcula los agregados si hubo cambios desde el último refresco (o
+    siempre, con `forzar`). Devuelve el RefrescoAnalitica creado, o None si
+    no había nada que hacer.
+    """
+    inicio = time.perf_counter()
+    ultimo = _ultimo_cambio()
+    anterior = RefrescoAnalitica.objects.values_list('ultimo_cambio', flat=True).first()
+    if not forzar and anterior is not None and anterior >= ultimo:
+        return None
+    with transaction.atomic():
+        escritas = (
+            _escribir(ResumenCategoria, 'categoria_id', _agregados_categorias())
+            + _escribir(ResumenEtiqueta, 'etiqueta_id', _agregados_etiquetas())
+        )
+        conteos = _leer_conteos()
+        transaction.on_commit(lambda: _cache().set(CLAVE_CONTEOS, conteos, None))
+        return RefrescoAnalitica.objects.create(
+            ultimo_cambio=ultimo, filas_escritas=escritas,
+            duracion_ms=round((time.perf_counter() - inicio) * 1000),
+        )
+
+
+# ---- Lecturas (solo tablas de resumen) ----
+
+CLAVE_CONTEOS = 'analitica:conteos'
+
+
+def _cache():
+    return caches[getattr(settings, 'PRODUCTOS_CACHE_ALIAS', 'default')]
+
+
+def _leer_conteos():
+    return {
+        'categorias': dict(ResumenCategoria.objects.values_list('categoria_id', 'productos')),
+        'etiquetas': dict(ResumenEtiqueta.objects.values_list('etiqueta_id', 'productos')),
+    }
+
+
+async def _aconteos():
+    conteos = await _cache().aget(CLAVE_CONTEOS)
+    if conteos is None:
+        conteos = {
+            'categorias': {pk: n async for pk, n in ResumenCategoria.objects.values_list('categoria_id', 'productos')},
+            'etiquetas': {pk: n async for pk, n in ResumenEtiqueta.objects.values_list('etiqueta_id', 'productos')},
+        }
+        # add y no set: si un refresco ya guardó conteos más nuevos, ganan esos
+        await _cache().aadd(CLAVE_CONTEOS, conteos, None)
+    return conteos
+
+
+async def aconteos_categorias():
+    """{categoria_id: productos} según el último refresco."""
+    return (await _aconteos())['categorias']
+
+
+async def aconteos_etiquetas():
+    return (await _aconteos())['etiquetas']
+
+
+def tablero(limite=20):
+    """Datos del tablero: totales, categorías, etiquetas más usadas, precios y stock bajo."""
+    nombres_categorias = tabla_categorias.nombres()
+    nombres_etiquetas = tabla_etiquetas.nombres()
+
+    categorias = [
+        {'nombre': nombres_categorias.get(r.categoria_id, r.categoria_id), 'resumen': r}
+        for r in ResumenCategoria.objects.order_by('-valor_inventario', 'categoria_id')
+    ]
+    totales = {
+        campo: sum(getattr(c['resumen'], campo) for c in categorias)
+        for campo in ('productos', 'unidades', 'valor_inventario', 'sin_stock', 'stock_bajo')
+    }
+    distribucion = [
+        {'nombre': nombre_rango(i), 'n': sum(c['resumen'].rangos[i] for c in categorias if c['resumen'].rangos)}
+        for i in range(len(RANGOS_PRECIO))
+    ]
+    etiquetas = [
+        {'nombre': nombres_etiquetas.get(r.etiqueta_id, r.etiqueta_id), 'resumen': r}
+        for r in ResumenEtiqueta.objects.order_by('-productos', 'etiqueta_id')[:limite]
+    ]
+    stock_bajo = list(
+        ProductoResumen.objects.filter(stock__lte=umbral_stock_bajo())
+        .order_by('stock', 'producto')
+        .values('producto_id', 'nombre', 'stock', 'categoria_nombre')[:limite]
+    )
+    return {
+        'totales': totales,
+        'categorias': categorias,
+        'etiquetas': etiquetas,
+        'distribucion': distribucion,
+        'stock_bajo': stock_bajo,
+        'umbral': umbral_stock_bajo(),
+        'refresco': RefrescoAnalitica.objects.first(),
+    }
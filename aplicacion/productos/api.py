@@ -0,0 +1,113 @@
+import asyncio
+
+from django.conf import settings
+
+from .models import Producto, DetalleProductos
+from .tablas import tabla_categorias, tabla_etiquetas
+
+
+# Lectura por lotes para la tienda y las apps: /api/productos/?ids=1,2,3
+#
+#   fields=nombre,precio    solo esas columnas en el SELECT (el id siempre va)
+#   include=categoria,etiquetas,detalle
+#
+# El número de consultas no depende de cuántos ids se pidan: una para los
+# productos, una para la tabla intermedia de etiquetas y una para los
+# detalles; los nombres de categorías y etiquetas salen de las tablas en
+# memoria. Las filas se serializan desde tuplas (values_list), sin
+# instancias de modelo.
+
+CAMPOS = ('id', 'nombre', 'descripcion', 'precio', 'stock', 'categoria_id', 'creado', 'actualizado')
+INCLUSIONES = ('categoria', 'etiquetas', 'detalle')
+CAMPOS_DETALLE = ('peso_kg', 'alto_cm', 'ancho_cm', 'largo_cm')
+
+Intermedia = Producto.etiquetas.through
+
+
+def _lista(valor):
+    return [v.strip() for v in (valor or '').split(',') if v.strip()]
+
+
+def maximo_ids():
+    return getattr(settings, 'PRODUCTOS_API_MAX_IDS', 100)
+
+
+def interpretar(params):
+    """
+    (ids, campos, inclusiones) a partir de los parámetros GET. Lanza
+    ValueError con un mensaje para el cliente si alguno no es válido.
+    """
+    try:
+        ids = list(dict.fromkeys(int(v) for v in _lista(params.get('ids'))))
+    except ValueError:
+        raise ValueError('ids debe ser una lista de enteros separados por comas.')
+    if not ids:
+        raise ValueError('Falta el parámetro ids.')
+    if len(ids) > maximo_ids():
+        raise ValueError(f'Como máximo {maximo_ids()} ids por llamada.')
+
+    campos = _lista(params.get('fields')) or list(CAMPOS)
+    desconocidos = sorted(set(campos) - set(CAMPOS))
+    if desconocidos:
+        raise ValueError(f'Campos desconocidos: {", ".join(desconocidos)}. Válidos: {", ".join(CAMPOS)}.')
+    campos = ['id'] + [c for c in dict.fromkeys(campos) if c != 'id']
+
+    inclusiones = list(dict.fromkeys(_lista(params.get('include'))))
+    desconocidas = sorted(set(inclusiones) - set(INCLUSIONES))
+    if desconocidas:
+        raise ValueError(f'include desconocido: {", ".join(desconocidas)}. Válidos: {", ".join(INCLUSIONES)}.')
+    return ids, campos, inclusiones
+
+
+async def _filas(queryset):
+    return [fila async for fila in queryset]
+
+
+async def _etiquetas_por_producto(ids):
+    nombres, filas = await asyncio.gather(
+        tabla_etiquetas.anombres(),
+        _filas(Intermedia.objects.filter(producto_id__in=ids).values_list('producto_id', 'etiqueta_id')),
+    )
+    por_producto = {}
+    for producto_id, etiqueta_id in filas:
+        por_producto.setdefault(producto_id, []).append({'id': etiqueta_id, 'nombre': nombres.get(etiqueta_id)})
+    for etiquetas in por_producto.values():
+        etiquetas.sort(key=lambda e: e['nombre'] or '')
+    return por_producto
+
+
+async def _detalles_por_producto(ids):
+    filas = DetalleProductos.objects.filter(producto_id__in=ids).values_list('producto_id', *CAMPOS_DETALLE)
+    return {fila[0]: dict(zip(CAMPOS_DETALLE, fila[1:])) async for fila in filas}
+
+
+async def _nada():
+    return None
+
+
+async def aproductos(ids, campos, inclusiones=()):
+    """
+    ([producto, ...] en el orden de `ids`, [ids que no existen]). Cada
+    producto es un dict con `campos` y las relaciones de `inclusiones`.
+    """
+    # categoria_id hace falta para incluir la categoría aunque no se pida
+    columnas = campos + ['categoria_id'] if 'categoria' in inclusiones and 'categoria_id' not in campos else campos
+    filas, etiquetas, detalles, categorias = await asyncio.gather(
+        _filas(Producto.objects.filter(pk__in=ids).order_by().values_list(*columnas)),
+        _etiquetas_por_producto(ids) if 'etiquetas' in inclusiones else _nada(),
+        _detalles_por_producto(ids) if 'detalle' in inclusiones else _nada(),
+        tabla_categorias.anombres() if 'categoria' in inclusiones else _nada(),
+    )
+
+    por_id = {}
+    for fila in filas:
+        producto = dict(zip(columnas, fila))
+        if categorias is not None:
+            categoria_id = producto['categoria_id'] if 'categoria_id' in campos else producto.pop('categoria_id')
+            producto['categoria'] = {'id': categoria_id, 'nombre': categorias.get(categoria_id)}
+        if etiquetas is not None:
+            producto['etiquetas'] = etiquetas.get(producto['id'], [])
+        if detalles is not None:
+            producto['detalle'] = detalles.get(producto['id'])
+        por_id[producto['id']] = producto
+    return [por_id[pk] for pk in ids if pk in por_id], [pk for pk in ids if pk not in por_id]
@@ -0,0 +1,76 @@
+import gc
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+
+# Precarga del proceso maestro antes de forkear los workers. Lo que Django
+# hace perezosamente en la primera petición de cada worker (importar las
+# vistas, compilar las expresiones de las URLs, compilar cada plantilla) se
+# hace una vez aquí; los workers lo heredan en memoria compartida. Al final
+# gc.freeze() deja esos objetos fuera de las pasadas del recolector, que si
+# no los tocaría y forzaría a copiar sus páginas en cada worker.
+
+logger = logging.getLogger('productos.arranque')
+
+
+def _directorios_plantillas(motor):
+    for loader in motor.engine.template_loaders:
+        # cached.Loader envuelve a los loaders que buscan en disco
+        for cargador in getattr(loader, 'loaders', [loader]):
+            yield from cargador.get_dirs()
+
+
+def compilar_plantillas():
+    """Compila las plantillas .html de todos los motores (quedan en su cached.Loader); devuelve cuántas."""
+    total = 0
+    for motor in engines.all():
+        if not hasattr(motor, 'engine'):
+            continue
+        vistas = set()
+        for directorio in _directorios_plantillas(motor):
+            for ruta in sorted(Path(directorio).rglob('*.html')):
+                nombre = ruta.relative_to(directorio).as_posix()
+                if nombre in vistas:
+                    continue  # la primera que encuentran los loaders es la que se usa
+                vistas.add(nombre)
+                try:
+                    motor.get_template(nombre)
+                except TemplateSyntaxError as exc:
+                    logger.warning('No se pudo precompilar %s: %s', nombre, exc)
+                else:
+                    total += 1
+    return total
+
+
+def resolver_urls():
+    """Importa el URLconf (y con él las vistas) y compila todos sus patrones."""
+    resolver = get_resolver()
+    return len(resolver.reverse_dict)
+
+
+def precargar():
+    inicio = time.perf_counter()
+    urls = resolver_urls()
+    plantillas = compilar_plantillas()
+    if getattr(settings, 'PRODUCTOS_PRECARGA_SUGERENCIAS', False):
+        from .sugerencias import indice_productos
+        indice_productos.obtener()
+        # Cada worker abre sus propias conexiones
+        connections.close_all()
+    gc.collect()
+    gc.freeze()
+    logger.info(
+        'Precarga: %d nombres de URL, %d plantillas en %.0f ms',
+        urls, plantillas, (time.perf_counter() - inicio) * 1000,
+    )
+
+
+def precargar_si_corresponde():
+    if getattr(settings, 'PRODUCTOS_PRECARGA', False):
+        precargar()
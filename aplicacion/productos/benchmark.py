@@ -0,0 +1,361 @@
+import asyncio
+import json
+import math
+import platform
+import random
+import time
+from itertools import accumulate
+from urllib.parse import unquote, urlencode
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Max, Min
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Producto, Categoria, ProductoResumen
+from .importacion import ImportadorCatalogo, CAMPOS_DETALLE, normalizar
+from .paginacion import codificar_cursor, tamano_pagina
+
+
+# Herramientas de benchmark del catálogo:
+#
+# - filas_sinteticas(): catálogo sintético reproducible (misma semilla, mismos
+#   datos) con una distribución de etiquetas sesgada como la de un catálogo
+#   real: unas pocas etiquetas muy usadas y una cola larga de etiquetas raras.
+# - Escenario / preparar_escenarios(): las peticiones a medir.
+# - resumir() / comparar(): percentiles, req/s y detección de regresiones
+#   entre dos archivos JSON de resultados.
+
+TIPOS = ['Figura', 'Estatua', 'Busto', 'Diorama', 'Peluche', 'Llavero', 'Póster', 'Réplica']
+PERSONAJES = [
+    'dragón', 'samurái', 'robot', 'hechicera', 'piloto', 'caballero', 'ninja', 'pirata',
+    'astronauta', 'vampiro', 'detective', 'guerrera', 'alquimista', 'cazador', 'mago',
+]
+MATERIALES = ['PVC', 'resina', 'vinilo', 'metal', 'madera', 'felpa']
+ADJETIVOS = ['edición limitada', 'pintado a mano', 'articulado', 'numerado', 'con base', 'de colección']
+
+# Etiquetas por producto: (cantidad, peso relativo)
+REPARTO_ETIQUETAS = [(0, 5), (1, 15), (2, 25), (3, 25), (4, 15), (5, 10), (8, 5)]
+
+
+def filas_sinteticas(total, semilla=42, categorias=50, etiquetas=500):
+    """
+    Genera `total` registros con el formato de importar_catalogo.
+
+    La popularidad de las etiquetas sigue una ley de Zipf (la etiqueta k se
+    usa ~1/k veces lo que la primera), igual que las categorías.
+    """
+    rng = random.Random(semilla)
+    nombres_categoria = [f'Categoría {i:03d}' for i in range(1, categorias + 1)]
+    nombres_etiqueta = [f'etiqueta-{i:04d}' for i in range(1, etiquetas + 1)]
+    peso_categoria = list(accumulate(1 / k for k in range(1, categorias + 1)))
+    peso_etiqueta = list(accumulate(1 / k for k in range(1, etiquetas + 1)))
+    cantidades, pesos = zip(*REPARTO_ETIQUETAS)
+
+    for i in range(1, total + 1):
+        tipo = rng.choice(TIPOS)
+        personaje = rng.choice(PERSONAJES)
+        material = rng.choice(MATERIALES)
+        cuantas = min(rng.choices(cantidades, weights=pesos)[0], etiquetas)
+        elegidas = set()
+        while len(elegidas) < cuantas:
+            elegidas.add(rng.choices(nombres_etiqueta, cum_weights=peso_etiqueta)[0])
+        # Precio log-normal entre ~$1.000 y ~$500.000, redondeado a $10
+        precio = min(max(round(math.exp(rng.gauss(9.5, 1.0)), -1), 990), 500000)
+        con_detalle = rng.random() < 0.7
+        detalle = {
+            'peso_kg': round(rng.uniform(0.05, 5), 2),
+            'alto_cm': round(rng.uniform(5, 60), 1),
+            'ancho_cm': round(rng.uniform(5, 40), 1),
+            'largo_cm': round(rng.uniform(5, 40), 1),
+        } if con_detalle else {}
+        yield {
+            'nombre': f'{tipo} {personaje} {material} #{i}',
+            'descripcion': f'{tipo} de {personaje} en {material}, {rng.choice(ADJETIVOS)}.',
+            'precio': precio,
+            'stock': 0 if rng.random() < 0.15 else rng.randint(1, 50),
+            'categoria': rng.choices(nombres_categoria, cum_weights=peso_categoria)[0],
+            'etiquetas': sorted(elegidas),
+            **{c: detalle.get(c) for c in CAMPOS_DETALLE},
+        }
+
+
+def generar_catalogo(total, semilla=42, categorias=50, etiquetas=500, lote=2000, informar=None):
+    """Carga el catálogo sintético con el mismo camino de escritura que la importación."""
+    importador = ImportadorCatalogo(lote=lote, informar=informar)
+    inicio = time.monotonic()
+    pendientes = []
+    for fila in filas_sinteticas(total, semilla, categorias, etiquetas):
+        pendientes.append(normalizar(fila))
+        if len(pendientes) >= lote:
+            importador.escribir(pendientes)
+            pendientes = []
+            transcurrido = max(time.monotonic() - inicio, 1e-6)
+            importador.informar(
+                f'{importador.creados} productos ({importador.creados / transcurrido:,.0f} filas/s).'
+            )
+    importador.escribir(pendientes)
+    return importador.creados, time.monotonic() - inicio
+
+
+# =================== Escenarios ===================
+
+PREFIJO_BENCHMARK = '[benchmark]'
+
+
+class Escenario:
+    """Una petición a medir; `rutas` se recorren en ciclo según el número de iteración."""
+
+    def __init__(self, nombre, rutas, metodo='GET', datos=None, peso=1):
+        self.nombre = nombre
+        self.rutas = rutas
+        self.metodo = metodo
+        self.datos = datos
+        self.peso = peso
+
+    def ruta(self, i):
+        return self.rutas[i % len(self.rutas)]
+
+    def ejecutar(self, cliente, i):
+        if self.metodo == 'POST':
+            return cliente.post(self.ruta(i), self.datos(i))
+        return cliente.get(self.ruta(i))
+
+
+def _ids_al_azar(rng, cantidad):
+    # Sin ORDER BY RANDOM(): sobre un millón de filas sería un sort completo
+    extremos = ProductoResumen.objects.aggregate(minimo=Min('pk'), maximo=Max('pk'))
+    if extremos['minimo'] is None:
+        return []
+    candidatos = {rng.randint(extremos['minimo'], extremos['maximo']) for _ in range(cantidad * 2)}
+    ids = list(ProductoResumen.objects.filter(pk__in=candidatos).values_list('pk', flat=True)[:cantidad])
+    rng.shuffle(ids)
+    return ids
+
+
+def _datos_formulario(producto):
+    datos = {
+        'nombre': producto.nombre,
+        'descripcion': producto.descripcion,
+        'precio': str(producto.precio),
+        'stock': str(producto.stock),
+        'categoria': producto.categoria_id,
+        'etiquetas': [e.pk for e in producto.etiquetas.all()],
+    }
+    detalle = getattr(producto, 'detalle', None)
+    for campo in CAMPOS_DETALLE:
+        valor = getattr(detalle, campo, None) if detalle else None
+        datos[campo] = '' if valor is None else str(valor)
+    return datos
+
+
+def preparar_escenarios(semilla=42, escrituras=False, muestras=200):
+    """
+    Arma los escenarios sobre los datos que hay en la base. Los de lectura
+    llevan un peso para el reparto de la prueba de carga.
+    """
+    rng = random.Random(semilla)
+    ids = _ids_al_azar(rng, muestras)
+    if not ids:
+        raise ValueError('El catálogo está vacío: ejecute generar_catalogo primero.')
+
+    lista = reverse('lista_productos')
+    profundo = ProductoResumen.objects.order_by('-pk').values_list('pk', flat=True)[
+        tamano_pagina(None) * 20:tamano_pagina(None) * 20 + 1
+    ]
+    categoria = Categoria.objects.order_by('pk').values_list('pk', flat=True).first()
+    etiqueta = (
+        Producto.etiquetas.through.objects.values('etiqueta_id')
+        .annotate(n=Count('producto_id')).order_by('-n')
+        .values_list('etiqueta_id', flat=True).first()
+    )
+    terminos = rng.sample(PERSONAJES, 5)
+
+    escenarios = [
+        Escenario('index', [reverse('index')], peso=2),
+        Escenario('lista_productos', [lista], peso=30),
+        Escenario('lista_productos_profunda',
+                  [f'{lista}?after={codificar_cursor([pk])}' for pk in profundo] or [lista], peso=5),
+        Escenario('lista_productos_busqueda', [f'{lista}?{urlencode({"q": t})}' for t in terminos], peso=10),
+        Escenario('lista_productos_facetas', [
+            f'{lista}?categoria={categoria}&etiqueta={etiqueta}&precio=1&disponible=1',
+        ], peso=8),
+        Escenario('detalle_producto', [reverse('detalle_producto', args=[pk]) for pk in ids], peso=35),
+        Escenario('lista_categorias', [reverse('lista_categorias')], peso=5),
+        Escenario('lista_etiquetas', [reverse('lista_etiquetas')], peso=5),
+    ]
+    if escrituras:
+        base = (
+            Producto.objects.select_related('detalle').prefetch_related('etiquetas')
+            .defer('vector_busqueda').get(pk=ids[0])
+        )
+        datos = _datos_formulario(base)
+        escenarios += [
+            Escenario('crear_producto:POST', [reverse('crear_producto')], 'POST',
+                      lambda i: {**datos, 'nombre': f'{PREFIJO_BENCHMARK} {i}'}, peso=0),
+            # Reenvía los mismos valores: mide el camino completo sin alterar el dato
+            Escenario('editar_producto:POST', [reverse('editar_producto', args=[base.pk])], 'POST',
+                      lambda i: datos, peso=0),
+        ]
+    return escenarios
+
+
+def limpiar_escrituras():
+    """Elimina los productos creados por los escenarios de escritura."""
+    return Producto.objects.filter(nombre__startswith=PREFIJO_BENCHMARK).delete()[0]
+
+
+# =================== Resultados ===================
+
+def percentil(ordenadas, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not ordenadas:
+        return None
+    indice = max(0, math.ceil(p / 100 * len(ordenadas)) - 1)
+    return ordenadas[indice]
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 3) if segundos is not None else None
+
+
+def resumir(muestras, errores=0, segundos=None):
+    """Resumen en milisegundos; req/s sobre `segundos` de reloj o sobre la suma de muestras."""
+    ordenadas = sorted(muestras)
+    n = len(ordenadas)
+    total = segundos if segundos is not None else sum(ordenadas)
+    return {
+        'n': n,
+        'errores': errores,
+        'p50_ms': _ms(percentil(ordenadas, 50)),
+        'p95_ms': _ms(percentil(ordenadas, 95)),
+        'p99_ms': _ms(percentil(ordenadas, 99)),
+        'media_ms': _ms(sum(ordenadas) / n) if n else None,
+        'min_ms': _ms(ordenadas[0]) if n else None,
+        'max_ms': _ms(ordenadas[-1]) if n else None,
+        'req_s': round(n / total, 1) if n and total else None,
+    }
+
+
+def entorno():
+    return {
+        'motor': connection.vendor,
+        'base_datos': str(connection.settings_dict.get('NAME')),
+        'productos': ProductoResumen.objects.count(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'maquina': platform.node(),
+    }
+
+
+def documento(tipo, parametros, resultados):
+    return {
+        'tipo': tipo,
+        'fecha': timezone.now().isoformat(),
+        'entorno': entorno(),
+        'parametros': parametros,
+        'resultados': resultados,
+    }
+
+
+def guardar(doc, ruta):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+
+
+def cargar(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def comparar(actual, base, tolerancia=0.15, metrica='p95_ms', minimo_ms=1.0):
+    """
+    Compara dos documentos de resultados escenario a escenario. Devuelve una
+    lista de (escenario, antes, ahora, variación) para todos los escenarios
+    comunes y marca como regresión los que empeoran más que `tolerancia`
+    (y más de `minimo_ms`, para no alarmarse por ruido en vistas de 2 ms).
+    """
+    filas = []
+    for nombre, resultado in actual['resultados'].items():
+        anterior = base['resultados'].get(nombre)
+        if not anterior or not anterior.get(metrica) or resultado.get(metrica) is None:
+            continue
+        variacion = resultado[metrica] / anterior[metrica] - 1
+        filas.append({
+            'escenario': nombre,
+            'antes': anterior[metrica],
+            'ahora': resultado[metrica],
+            'variacion': round(variacion, 4),
+            'regresion': variacion > tolerancia and resultado[metrica] - anterior[metrica] > minimo_ms,
+        })
+    return filas
+
+
+class ComandoBenchmark(BaseCommand):
+    """Base de benchmark_vistas y prueba_carga: salida JSON y comparación."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+        parser.add_argument('--comparar', metavar='BASE',
+                            help='JSON de una ejecución anterior contra el cual comparar.')
+        parser.add_argument('--tolerancia', type=float, default=0.15,
+                            help='Empeoramiento de p95 tolerado antes de marcar regresión (0.15 = 15%%).')
+
+    def publicar(self, doc, options):
+        for nombre, r in doc['resultados'].items():
+            self.stdout.write(
+                f"{nombre:<28} n={r['n']:<6} p50={r['p50_ms']} ms  p95={r['p95_ms']} ms  "
+                f"p99={r['p99_ms']} ms  {r['req_s']} req/s  errores={r['errores']}"
+            )
+        if options['salida']:
+            guardar(doc, options['salida'])
+            self.stdout.write(f"Resultados guardados en {options['salida']}.")
+        if not options['comparar']:
+            return
+
+        filas = comparar(doc, cargar(options['comparar']), options['tolerancia'])
+        regresiones = [f for f in filas if f['regresion']]
+        for f in filas:
+            linea = f"{f['escenario']:<28} p95 {f['antes']} → {f['ahora']} ms ({f['variacion']:+.1%})"
+            self.stdout.write(self.style.ERROR(linea) if f['regresion'] else linea)
+        if regresiones:
+            raise CommandError(
+                f'{len(regresiones)} escenario(s) empeoraron más de {options["tolerancia"]:.0%} en p95.'
+            )
+        self.stdout.write(self.style.SUCCESS('Sin regresiones respecto de la ejecución base.'))
+
+
+async def llamar_asgi(aplicacion, ruta, host='testserver'):
+    """Hace un GET directo a la aplicación ASGI, sin servidor; devuelve el status."""
+    camino, _, consulta = ruta.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': unquote(camino),
+        'raw_path': camino.encode(), 'query_string': consulta.encode(), 'root_path': '',
+        'headers': [(b'host', host.encode())],
+        'client': ('127.0.0.1', 0), 'server': (host, 80),
+    }
+    respondido = asyncio.Event()
+    pedido_enviado = False
+    estado = None
+
+    async def receive():
+        nonlocal pedido_enviado
+        if not pedido_enviado:
+            pedido_enviado = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await respondido.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(mensaje):
+        nonlocal estado
+        if mensaje['type'] == 'http.response.start':
+            estado = mensaje['status']
+        elif mensaje['type'] == 'http.response.body' and not mensaje.get('more_body'):
+            respondido.set()
+
+    await aplicacion(scope, receive, send)
+    return estado
@@ -0,0 +1,177 @@
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Round
+from django.utils.module_loading import import_string
+
+from .models import Producto, IndiceBusqueda
+
+
+# Backends de búsqueda para el filtro `q` de lista_productos. Ambos devuelven
+# el queryset filtrado y anotado con `rango` (entero, mayor = más relevante),
+# para poder ordenar y paginar por cursor sobre ('-rango', '-id'): un float
+# podría no compararse igual después de pasar por el cursor JSON.
+
+class BackendBusqueda:
+    def buscar(self, queryset, q):
+        raise NotImplementedError
+
+    def indexar(self, producto_ids):
+        """Recalcula el índice de los productos indicados."""
+        raise NotImplementedError
+
+    def sugerir(self, queryset, q):
+        """Filtra los productos con algún término que empiece por cada palabra de `q` (sin `rango`)."""
+        raise NotImplementedError
+
+    def reconstruir(self, lote=1000):
+        """Reindexa todo el catálogo en lotes; devuelve cuántos productos procesó."""
+        total = 0
+        ultimo = 0
+        while True:
+            ids = list(
+                Producto.objects.filter(pk__gt=ultimo)
+                .order_by('pk').values_list('pk', flat=True)[:lote]
+            )
+            if not ids:
+                return total
+            with transaction.atomic():
+                self.indexar(ids)
+            total += len(ids)
+            ultimo = ids[-1]
+
+
+ESCALA_RANGO = 1_000_000
+
+
+class PostgresBackend(BackendBusqueda):
+    """tsvector con pesos (nombre A, descripción B) sobre el índice GIN."""
+
+    config = 'spanish'
+
+    def buscar(self, queryset, q):
+        consulta = SearchQuery(q, config=self.config, search_type='websearch')
+        # El vector vive en Producto; desde la proyección se llega por la FK
+        campo = 'vector_busqueda' if queryset.model is Producto else 'producto__vector_busqueda'
+        # ts_rank es float4: se guarda como entero (millonésimas) para que el
+        # cursor lo compare exactamente
+        rango = Cast(Round(SearchRank(F(campo), consulta) * ESCALA_RANGO), BigIntegerField())
+        return (
+            queryset
+            .filter(**{campo: consulta})
+            .annotate(rango=rango)
+        )
+
+    def indexar(self, producto_ids):
+        vector = (
+            SearchVector('nombre', weight='A', config=self.config)
+            + SearchVector('descripcion', weight='B', config=self.config)
+        )
+        Producto.objects.filter(pk__in=list(producto_ids)).update(vector_busqueda=vector)
+
+    def sugerir(self, queryset, q):
+        terminos = tokenizar(q)
+        if not terminos:
+            return queryset.none()
+        # Prefijos de tsquery ('drag:* & ro:*'): los resuelve el mismo índice GIN
+        consulta = SearchQuery(' & '.join(f'{t}:*' for t in terminos), config=self.config, search_type='raw')
+        campo = 'vector_busqueda' if queryset.model is Producto else 'producto__vector_busqueda'
+        return queryset.filter(**{campo: consulta})
+
+
+# ---- Índice invertido en Python (SQLite / tests) ----
+
+PALABRAS_VACIAS = frozenset(
+    'a al con de del el en es la las lo los o para por que se sin su un una y'.split()
+)
+PESO_NOMBRE = 3
+PESO_DESCRIPCION = 1
+
+
+def tokenizar(texto):
+    """Minúsculas, sin tildes, sin palabras vacías ni términos de 1 letra."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return [
+        t[:64] for t in re.findall(r'\w+', texto)
+        if len(t) > 1 and t not in PALABRAS_VACIAS
+    ]
+
+
+class InvertidoBackend(BackendBusqueda):
+    """Índice término → producto en la tabla IndiceBusqueda; todos los términos deben aparecer."""
+
+    def buscar(self, queryset, q):
+        terminos = sorted(set(tokenizar(q)))
+        if not terminos:
+            return queryset.none().annotate(rango=Value(0))
+
+        coincidencias = (
+            IndiceBusqueda.objects
+            .filter(termino__in=terminos)
+            .values('producto')
+            .annotate(n=Count('termino'))
+            .filter(n=len(terminos))
+        )
+        rango = (
+            IndiceBusqueda.objects
+            .filter(producto=OuterRef('pk'), termino__in=terminos)
+            .values('producto')
+            .annotate(total=Sum('peso'))
+            .values('total')
+        )
+        return (
+            queryset
+            .filter(pk__in=coincidencias.values('producto'))
+            .annotate(rango=Subquery(rango))
+        )
+
+    def sugerir(self, queryset, q):
+        terminos = sorted(set(tokenizar(q)))
+        if not terminos:
+            return queryset.none()
+        for t in terminos:
+            # Rango sobre el índice (termino, producto) en vez de LIKE, que
+            # en SQLite no usa índices
+            queryset = queryset.filter(pk__in=(
+                IndiceBusqueda.objects.filter(termino__gte=t, termino__lt=t + '\uffff').values('producto')
+            ))
+        return queryset
+
+    def indexar(self, producto_ids):
+        producto_ids = list(producto_ids)
+        filas = []
+        for pk, nombre, descripcion in (
+            Producto.objects.filter(pk__in=producto_ids)
+            .values_list('pk', 'nombre', 'descripcion')
+        ):
+            pesos = Counter()
+            for t in tokenizar(nombre):
+                pesos[t] += PESO_NOMBRE
+            for t in tokenizar(descripcion):
+                pesos[t] += PESO_DESCRIPCION
+            filas.extend(
+                IndiceBusqueda(termino=t, producto_id=pk, peso=peso)
+                for t, peso in pesos.items()
+            )
+        with transaction.atomic():
+            IndiceBusqueda.objects.filter(producto_id__in=producto_ids).delete()
+            IndiceBusqueda.objects.bulk_create(filas, batch_size=1000)
+
+
+@lru_cache(maxsize=None)
+def obtener_backend():
+    """Backend configurado en PRODUCTOS_BUSQUEDA_BACKEND, o el adecuado al motor de la BD."""
+    ruta = getattr(settings, 'PRODUCTOS_BUSQUEDA_BACKEND', None)
+    if not ruta:
+        if connection.vendor == 'postgresql':
+            ruta = 'productos.busqueda.PostgresBackend'
+        else:
+            ruta = 'productos.busqueda.InvertidoBackend'
+    return import_string(ruta)()
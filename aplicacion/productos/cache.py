@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Caché por objeto para detalle_producto, en dos niveles:
+#   1. LRU en memoria del proceso (sin red ni disco)
+#   2. caché compartida local (alias PRODUCTOS_CACHE_ALIAS)
+# Cada producto tiene un token de versión en la caché compartida; invalidar
+# es cambiar ese token, así las entradas viejas de ambos niveles dejan de
+# coincidir sin tener que borrarlas una por una en cada proceso.
+
+
+class CacheLRU:
+    def __init__(self, tamano):
+        self.tamano = tamano
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave, por_defecto=None):
+        with self._lock:
+            if clave not in self._datos:
+                return por_defecto
+            self._datos.move_to_end(clave)
+            return self._datos[clave]
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class CacheVersionada:
+    def __init__(self, prefijo, alias=None, tamano_lru=None):
+        self.prefijo = prefijo
+        self.alias = alias or getattr(settings, 'PRODUCTOS_CACHE_ALIAS', 'default')
+        self.local = CacheLRU(tamano_lru or getattr(settings, 'PRODUCTOS_CACHE_LRU', 1000))
+        self._contadores = {'local': 0, 'compartida': 0, 'fallos': 0, 'invalidaciones': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def compartida(self):
+        return caches[self.alias]
+
+    def _clave_version(self, pk):
+        return f'{self.prefijo}:v:{pk}'
+
+    def _clave(self, pk, version):
+        return f'{self.prefijo}:{pk}:{version}'
+
+    def _contar(self, nombre, n=1):
+        with self._lock:
+            self._contadores[nombre] += n
+
+    def version(self, pk):
+        clave = self._clave_version(pk)
+        version = self.compartida.get(clave)
+        if version is None:
+            # Token único: si la clave de versión se desalojó, no se
+            # reutiliza una versión antigua que aún pueda estar cacheada.
+            self.compartida.add(clave, time.time_ns())
+            version = self.compartida.get(clave)
+        return version
+
+    def obtener(self, pk, construir):
+        """Devuelve el valor cacheado de `pk` o lo construye con `construir()`."""
+        version = self.version(pk)
+        en_local = self.local.get(pk)
+        if en_local is not None and en_local[0] == version:
+            self._contar('local')
+            return en_local[1]
+
+        clave = self._clave(pk, version)
+        valor = self.compartida.get(clave)
+        if valor is not None:
+            self._contar('compartida')
+        else:
+            self._contar('fallos')
+            valor = construir()
+            self.compartida.set(clave, valor)
+        self.local.set(pk, (version, valor))
+        return valor
+
+    async def aversion(self, pk):
+        clave = self._clave_version(pk)
+        version = await self.compartida.aget(clave)
+        if version is None:
+            await self.compartida.aadd(clave, time.time_ns())
+            version = await self.compartida.aget(clave)
+        return version
+
+    async def aobtener(self, pk, construir):
+        """Como obtener(), para vistas async: `construir` es una corrutina."""
+        version = await self.aversion(pk)
+        en_local = self.local.get(pk)
+        if en_local is not None and en_local[0] == version:
+            self._contar('local')
+            return en_local[1]
+
+        clave = self._clave(pk, version)
+        valor = await self.compartida.aget(clave)
+        if valor is not None:
+            self._contar('compartida')
+        else:
+            self._contar('fallos')
+            valor = await construir()
+            await self.compartida.aset(clave, valor)
+        self.local.set(pk, (version, valor))
+        return valor
+
+    def invalidar(self, pks, lote=500):
+        pks = list(pks)
+        nuevo = time.time_ns()
+        for i in range(0, len(pks), lote):
+            self.compartida.set_many({
+                self._clave_version(pk): nuevo for pk in pks[i:i + lote]
+            })
+        for pk in pks:
+            self.local.delete(pk)
+        self._contar('invalidaciones', len(pks))
+
+    def estadisticas(self):
+        with self._lock:
+            datos = dict(self._contadores)
+        lecturas = datos['local'] + datos['compartida'] + datos['fallos']
+        datos['tasa_aciertos'] = (
+            round((datos['local'] + datos['compartida']) / lecturas, 4) if lecturas else None
+        )
+        datos['tamano_local'] = len(self.local)
+        return datos
+
+
+cache_detalle = CacheVersionada('producto_detalle')
+
+
+# Versión del catálogo completo: cambia con cada cambio registrado en el feed
+# (productos, categorías, etiquetas, stock). Sirve de validador HTTP para el
+# listado sin consultar la base de datos.
+
+CLAVE_CATALOGO = 'catalogo:v'
+
+
+def _cache_catalogo():
+    return caches[getattr(settings, 'PRODUCTOS_CACHE_ALIAS', 'default')]
+
+
+def version_catalogo():
+    version = _cache_catalogo().get(CLAVE_CATALOGO)
+    if version is None:
+        _cache_catalogo().add(CLAVE_CATALOGO, time.time_ns())
+        version = _cache_catalogo().get(CLAVE_CATALOGO)
+    return version
+
+
+async def aversion_catalogo():
+    version = await _cache_catalogo().aget(CLAVE_CATALOGO)
+    if version is None:
+        await _cache_catalogo().aadd(CLAVE_CATALOGO, time.time_ns())
+        version = await _cache_catalogo().aget(CLAVE_CATALOGO)
+    return version
+
+
+def invalidar_catalogo():
+    _cache_catalogo().set(CLAVE_CATALOGO, time.time_ns())
@@ -0,0 +1,204 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import invalidar_catalogo
+from .models import Cambio
+from .paginacion import codificar_cursor, decodificar_cursor
+from .tareas import encolar
+
+
+# Registro de cambios (change feed) para sincronizaciones incrementales: los
+# consumidores guardan el token `siguiente` y en la próxima pasada piden solo
+# lo que cambió desde ahí.
+
+# Campos de Producto de los que dependen los relacionados: la similitud
+# (categoría, precio; las etiquetas y las dimensiones se guardan aparte) y lo
+# que el detalle muestra de cada relacionado (nombre, precio). Los cambios de
+# stock no los tocan y no encolan el recálculo.
+CAMPOS_RELACIONADOS = frozenset({'nombre', 'precio', 'categoria', 'categoria_id'})
+
+
+def registrar_cambios(modelo, ids, accion, lote=1000, agrupar=False, relacionados=True):
+    ids = list(ids)
+    pendientes = _agrupados.get()
+    if pendientes is not None:
+        for pk in ids:
+            anterior, recalcular = pendientes.get((modelo, pk), (None, False))
+            # 'crear' y 'eliminar' dicen más que un 'actualizar' del mismo objeto
+            if anterior in (None, 'actualizar') or accion == 'eliminar':
+                anterior = accion
+            pendientes[(modelo, pk)] = (anterior, recalcular or relacionados)
+        return
+    _escribir_cambios([(modelo, pk, accion, relacionados) for pk in ids], lote, agrupar)
+
+
+def _escribir_cambios(filas, lote=1000, agrupar=False):
+    Cambio.objects.bulk_create(
+        [Cambio(modelo=modelo, objeto_id=pk, accion=accion) for modelo, pk, accion, _ in filas],
+        batch_size=lote,
+    )
+    # Todo cambio del catálogo pasa por aquí: invalida los ETag del listado
+    # y programa el refresco de la analítica (una sola tarea pendiente por
+    # muchos cambios que lleguen durante la demora) y, para productos con
+    # `relacionados`, el recálculo de sus relacionados (una tarea pendiente
+    # por producto o, con `agrupar`, una sola con el rango de ids, para las
+    # escrituras en lote)
+    transaction.on_commit(invalidar_catalogo)
+    encolar('refrescar_analitica', demora=getattr(settings, 'PRODUCTOS_ANALITICA_DEMORA', 60))
+    productos = [pk for modelo, pk, _, relacionados in filas if modelo == 'producto' and relacionados]
+    if productos:
+        claves = [f'{min(productos)}-{max(productos)}'] if agrupar else productos
+        encolar('recalcular_relacionados', claves, demora=getattr(settings, 'PRODUCTOS_RELACIONADOS_DEMORA', 300))
+
+
+# Una petición que guarda un producto registra cambios desde varias señales
+# (producto, etiquetas, detalle, stock); dentro de cambios_agrupados() se
+# juntan y se escriben al salir, con un solo INSERT y una tarea de cada tipo.
+
+_agrupados = ContextVar('cambios_agrupados', default=None)
+
+
+@contextmanager
+def cambios_agrupados():
+    if _agrupados.get() is not None:
+        yield  # ya hay un bloque exterior que los escribirá
+        return
+    pendientes = {}
+    token = _agrupados.set(pendientes)
+    try:
+        yield
+    finally:
+        _agrupados.reset(token)
+    if pendientes:
+        _escribir_cambios([
+            (modelo, pk, accion, relacionados) for (modelo, pk), (accion, relacionados) in pendientes.items()
+        ])
+
+
+def limite_feed(valor):
+    por_defecto = getattr(settings, 'PRODUCTOS_CAMBIOS_LIMITE', 500)
+    maximo = getattr(settings, 'PRODUCTOS_CAMBIOS_LIMITE_MAX', 5000)
+    try:
+        limite = int(valor)
+    except (TypeError, ValueError):
+        return por_defecto
+    return max(1, min(limite, maximo))
+
+
+def _margen():
+    return getattr(settings, 'PRODUCTOS_CAMBIOS_MARGEN', 2)
+
+
+def _ventana():
+    return getattr(settings, 'PRODUCTOS_CAMBIOS_VENTANA', 300)
+
+
+# Los ids se asignan al insertar pero las transacciones confirman en otro
+# orden: un id menor puede hacerse visible cuando el cursor ya lo pasó. El
+# token guarda, además del último id entregado, los tramos de ids saltados
+# (huecos) con el momento en que se vieron; cada lectura vuelve a buscarlos
+# y entrega los que aparecieron. Un hueco se abandona pasada la ventana
+# (PRODUCTOS_CAMBIOS_VENTANA): los cambios de una transacción que tarde más
+# que eso en confirmar se pierden para quien ya pasó su id. La mayoría de
+# los huecos son ids de transacciones revertidas, que nunca aparecen.
+
+HUECOS_MAX = 100  # tramos por token; si hay más se conservan los más recientes
+
+
+def _huecos_entre(anterior, filas):
+    """Tramos [desde, hasta, segundos] de ids que faltan entre `anterior` y las `filas` (pk, momento) en orden."""
+    huecos = []
+    for pk, momento in filas:
+        if pk > anterior + 1:
+            huecos.append([anterior + 1, pk - 1, int(momento.timestamp())])
+        anterior = pk
+    return huecos
+
+
+def _sin_entregados(hueco, entregados):
+    desde, hasta, segundos = hueco
+    for pk in sorted(pk for pk in entregados if desde <= pk <= hasta):
+        if pk > desde:
+            yield [desde, pk - 1, segundos]
+        desde = pk + 1
+    if desde <= hasta:
+        yield [desde, hasta, segundos]
+
+
+def _codificar_token(ultimo, huecos):
+    vigentes = timezone.now().timestamp() - _ventana()
+    huecos = [h for h in huecos if h[2] >= vigentes][-HUECOS_MAX:]
+    return codificar_cursor([ultimo, huecos] if huecos else [ultimo])
+
+
+def _decodificar_token(token):
+    if not token:
+        return 0, []
+    valores = decodificar_cursor(token)
+    if valores and len(valores) in (1, 2) and isinstance(valores[0], int):
+        huecos = valores[1] if len(valores) == 2 else []
+        if isinstance(huecos, list) and all(
+            isinstance(h, list) and len(h) == 3 and all(isinstance(v, int) for v in h) for h in huecos
+        ):
+            return valores[0], huecos
+    raise ValueError('Token de cambios inválido.')
+
+
+def posicion_feed():
+    """
+    Token del último cambio que el feed ya entrega. Quien lo guarda antes de
+    leer el estado actual y después sigue el feed desde ahí no pierde cambios
+    (a lo sumo recibe algunos dos veces).
+    """
+    ahora = timezone.now()
+    # En una consulta: el último cambio anterior a la ventana y los de la
+    # ventana, para dar también sus huecos, como si se hubiera leído hasta aquí
+    antes_de_ventana = (
+        Cambio.objects.filter(momento__lt=ahora - timedelta(seconds=_ventana())).order_by('-pk').values('pk')[:1]
+    )
+    filas = list(
+        Cambio.objects.filter(pk__gte=Coalesce(Subquery(antes_de_ventana), 0))
+        .order_by('pk').values_list('pk', 'momento')
+    )
+    inicio = filas[0][0] if filas and filas[0][1] < ahora - timedelta(seconds=_ventana()) else 0
+    corte = ahora - timedelta(seconds=_margen())
+    ultimo = max((pk for pk, momento in filas if momento <= corte), default=inicio)
+    return _codificar_token(ultimo, _huecos_entre(inicio, [f for f in filas if inicio < f[0] <= ultimo]))
+
+
+def leer_feed(token=None, limite=500):
+    """
+    Devuelve (cambios, siguiente_token, hay_mas) a partir del token `desde`.
+
+    Lanza ValueError si el token no es válido. Los cambios nuevos se entregan
+    con una antigüedad mínima de PRODUCTOS_CAMBIOS_MARGEN segundos (así casi
+    todas las transacciones en curso ya confirmaron y no dejan huecos); los
+    de los huecos del token, en cuanto aparecen, antes que los nuevos.
+    """
+    ultimo, huecos = _decodificar_token(token)
+    pendientes = Q()
+    for desde, hasta, _ in huecos:
+        pendientes |= Q(pk__range=(desde, hasta))
+
+    cambios = list(
+        Cambio.objects
+        .filter(Q(pk__gt=ultimo, momento__lte=timezone.now() - timedelta(seconds=_margen())) | pendientes)
+        .order_by('pk')[:limite + 1]
+    )
+    hay_mas = len(cambios) > limite
+    cambios = cambios[:limite]
+
+    entregados = {c.pk for c in cambios}
+    huecos = [tramo for hueco in huecos for tramo in _sin_entregados(hueco, entregados)]
+    nuevos = [(c.pk, c.momento) for c in cambios if c.pk > ultimo]
+    huecos += _huecos_entre(ultimo, nuevos)
+    if nuevos:
+        ultimo = nuevos[-1][0]
+    return cambios, _codificar_token(ultimo, huecos), hay_mas
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+
+# GET condicional para las páginas del catálogo. El ETag sale de los tokens
+# de versión de la caché (versión del catálogo para el listado, versión del
+# producto para el detalle), así un 304 se responde sin consultar la base de
+# datos ni renderizar. No se envía Last-Modified: tiene resolución de un
+# segundo y dos cambios dentro del mismo segundo darían la misma fecha; el
+# token time_ns() del ETag los distingue.
+#
+# Solo las visitas anónimas sin cookies de sesión ni de mensajes son
+# compartibles: esas respuestas llevan ETag y Cache-Control
+# public, y un proxy local puede servirlas. Con sesión la página depende del
+# usuario ("Hola, ...", mensajes) y se marca private, como antes.
+
+COOKIE_MENSAJES = 'messages'
+
+
+def compartible(request):
+    return request.method in ('GET', 'HEAD') and not (
+        settings.SESSION_COOKIE_NAME in request.COOKIES or COOKIE_MENSAJES in request.COOKIES
+    )
+
+
+def validador(tipo, version):
+    """ETag a partir de un token de versión time_ns()."""
+    plantillas = getattr(settings, 'PRODUCTOS_VERSION_PLANTILLAS', '')
+    return f'W/"{tipo}-{version}-{plantillas}"'
+
+
+def no_modificado(request, etag):
+    """Un 304 si la copia del cliente sigue vigente, si no None."""
+    if not compartible(request):
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        encabezados_cache(request, response, etag)
+    return response
+
+
+def encabezados_cache(request, response, etag):
+    if not compartible(request):
+        patch_cache_control(response, private=True)
+        return response
+    response.headers['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'PRODUCTOS_HTTP_MAX_AGE', 30))
+    patch_vary_headers(response, ['Cookie'])
+    return response
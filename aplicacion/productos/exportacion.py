@@ -0,0 +1,113 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time
+
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Producto, Etiqueta
+
+
+# Exportación del catálogo en streaming: las filas salen de un cursor del
+# servidor (iterator) y se serializan una a una, así la memoria no crece con
+# el tamaño del catálogo. Las columnas coinciden con las de importar_catalogo.
+
+COLUMNAS = [
+    'id', 'nombre', 'descripcion', 'precio', 'stock', 'categoria_id', 'categoria',
+    'etiquetas', 'peso_kg', 'alto_cm', 'ancho_cm', 'largo_cm', 'actualizado',
+]
+
+
+def interpretar_fecha(valor):
+    """'2025-01-31' o '2025-01-31T10:00[:00][Z]' → datetime con zona; None si viene vacío."""
+    if not valor:
+        return None
+    fecha = parse_datetime(valor)
+    if fecha is None:
+        dia = parse_date(valor)
+        if dia is None:
+            raise ValueError(f'Fecha inválida: {valor!r}')
+        fecha = datetime.combine(dia, time.min)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
+
+
+def productos_exportables(desde=None):
+    productos = (
+        Producto.objects
+        .select_related('categoria', 'detalle')
+        .prefetch_related(Prefetch('etiquetas', queryset=Etiqueta.objects.only('nombre')))
+        .defer('vector_busqueda')
+        .order_by('pk')
+    )
+    if desde is not None:
+        productos = productos.filter(actualizado__gte=desde)
+    return productos
+
+
+def _registro(p):
+    d = getattr(p, 'detalle', None)
+    return {
+        'id': p.pk,
+        'nombre': p.nombre,
+        'descripcion': p.descripcion,
+        'precio': str(p.precio),
+        'stock': p.stock,
+        'categoria_id': p.categoria_id,
+        'categoria': p.categoria.nombre,
+        'etiquetas': sorted(e.nombre for e in p.etiquetas.all()),
+        'peso_kg': str(d.peso_kg) if d and d.peso_kg is not None else None,
+        'alto_cm': str(d.alto_cm) if d and d.alto_cm is not None else None,
+        'ancho_cm': str(d.ancho_cm) if d and d.ancho_cm is not None else None,
+        'largo_cm': str(d.largo_cm) if d and d.largo_cm is not None else None,
+        'actualizado': p.actualizado.isoformat(),
+    }
+
+
+class _Eco:
+    # Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla
+    def write(self, valor):
+        return valor
+
+
+def lineas(formato='csv', desde=None, chunk_size=2000):
+    """Genera el catálogo como líneas de texto CSV o JSONL."""
+    productos = productos_exportables(desde).iterator(chunk_size=chunk_size)
+    if formato == 'jsonl':
+        for p in productos:
+            yield json.dumps(_registro(p), ensure_ascii=False) + '\n'
+        return
+
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(COLUMNAS)
+    for p in productos:
+        r = _registro(p)
+        r['etiquetas'] = '|'.join(r['etiquetas'])
+        yield escritor.writerow(['' if r[c] is None else r[c] for c in COLUMNAS])
+
+
+def bloques(formato='csv', desde=None, comprimir=False, chunk_size=2000, tamano_bloque=64 * 1024):
+    """Agrupa las líneas en bloques de bytes (~64 KB), opcionalmente en gzip."""
+    compresor = zlib.compressobj(wbits=31) if comprimir else None  # 31 = formato gzip
+    pendiente = []
+    acumulado = 0
+    for linea in lineas(formato, desde, chunk_size):
+        datos = linea.encode('utf-8')
+        pendiente.append(datos)
+        acumulado += len(datos)
+        if acumulado >= tamano_bloque:
+            bloque = b''.join(pendiente)
+            pendiente, acumulado = [], 0
+            if compresor:
+                bloque = compresor.compress(bloque)
+            if bloque:
+                yield bloque
+
+    bloque = b''.join(pendiente)
+    if compresor:
+        bloque = compresor.compress(bloque) + compresor.flush()
+    if bloque:
+        yield bloque
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q
+
+from .models import Producto
+from .tablas import tabla_categorias, tabla_etiquetas
+
+
+# Filtros combinados y facetas con conteo para lista_productos.
+#
+# Cada faceta se cuenta con todos los filtros activos salvo el suyo
+# (faceta disyuntiva), así marcar una categoría no hace desaparecer las
+# demás. Los conteos salen de un número fijo de agregaciones (una por tipo
+# de faceta), nunca de una consulta por valor, y se guardan en la caché
+# compartida por versión del catálogo: las páginas siguientes y las mismas
+# búsquedas de otros visitantes no vuelven a agregar hasta el próximo cambio.
+
+Intermedia = Producto.etiquetas.through
+
+RANGOS_PRECIO = getattr(settings, 'PRODUCTOS_RANGOS_PRECIO', [
+    (0, 5000), (5000, 10000), (10000, 25000), (25000, None),
+])
+TOP_ETIQUETAS = 20
+
+
+def _enteros(valores):
+    ids = set()
+    for v in valores:
+        try:
+            ids.add(int(v))
+        except (TypeError, ValueError):
+            continue
+    return sorted(ids)
+
+
+def _q_rango(indice, campo='precio'):
+    minimo, maximo = RANGOS_PRECIO[indice]
+    q = Q(**{f'{campo}__gte': Decimal(minimo)})
+    if maximo is not None:
+        q &= Q(**{f'{campo}__lt': Decimal(maximo)})
+    return q
+
+
+class FiltrosCatalogo:
+    def __init__(self, params):
+        self.categorias = _enteros(params.getlist('categoria'))
+        self.etiquetas = _enteros(params.getlist('etiqueta'))
+        self.modo_etiquetas = 'alguna' if params.get('modo') == 'alguna' else 'todas'
+        self.rangos = [i for i in _enteros(params.getlist('precio')) if 0 <= i < len(RANGOS_PRECIO)]
+        self.disponible = params.get('disponible') in ('1', 'on', 'true')
+
+    def clave(self):
+        """Los filtros en forma canónica, para las claves de caché."""
+        return f'{self.categorias}|{self.etiquetas}|{self.modo_etiquetas}|{self.rangos}|{self.disponible}'
+
+    def aplicar(self, queryset, excepto=None):
+        """Aplica los filtros sobre un queryset de ProductoResumen, salvo la faceta `excepto`."""
+        if self.categorias and excepto != 'categoria':
+            queryset = queryset.filter(categoria_id__in=self.categorias)
+        if self.etiquetas and excepto != 'etiqueta':
+            queryset = queryset.filter(pk__in=self._productos_con_etiquetas())
+        if self.rangos and excepto != 'precio':
+            q = Q()
+            for i in self.rangos:
+                q |= _q_rango(i)
+            queryset = queryset.filter(q)
+        if self.disponible and excepto != 'disponible':
+            queryset = queryset.filter(stock__gt=0)
+        return queryset
+
+    def _productos_con_etiquetas(self):
+        filas = Intermedia.objects.filter(etiqueta_id__in=self.etiquetas)
+        if self.modo_etiquetas == 'todas' and len(self.etiquetas) > 1:
+            filas = (
+                filas.values('producto_id')
+                .annotate(n=Count('etiqueta_id'))
+                .filter(n=len(self.etiquetas))
+            )
+        return filas.values('producto_id')
+
+
+def _consultas_facetas(base, filtros):
+    """Las consultas independientes de las facetas, todavía sin evaluar."""
+    por_categoria = (
+        filtros.aplicar(base, excepto='categoria')
+        .order_by().values('categoria_id').annotate(n=Count('pk'))
+        .values_list('categoria_id', 'n')
+    )
+
+    # En modo "todas" las etiquetas profundizan (se cuentan con el filtro
+    # puesto); en modo "alguna" se cuentan como las demás facetas.
+    excepto = 'etiqueta' if filtros.modo_etiquetas == 'alguna' else None
+    por_etiqueta = (
+        Intermedia.objects
+        .filter(producto_id__in=filtros.aplicar(base, excepto=excepto).values('pk'))
+        .order_by().values('etiqueta_id').annotate(n=Count('producto_id'))
+        .values_list('etiqueta_id', 'n')
+    )
+
+    por_rango = filtros.aplicar(base, excepto='precio')
+    rangos = {f'r{i}': Count('pk', filter=_q_rango(i)) for i in range(len(RANGOS_PRECIO))}
+    disponibles = filtros.aplicar(base, excepto='disponible').filter(stock__gt=0)
+    return por_categoria, por_etiqueta, por_rango, rangos, disponibles
+
+
+def _etiquetas_visibles(por_etiqueta, filtros, etiquetas):
+    visibles = sorted(por_etiqueta, key=lambda pk: -por_etiqueta[pk])[:TOP_ETIQUETAS]
+    visibles = set(visibles) | set(filtros.etiquetas)
+    return [f for f in etiquetas if f.id in visibles]
+
+
+def nombre_rango(indice):
+    minimo, maximo = RANGOS_PRECIO[indice]
+    etiqueta = f'${minimo:,} – ${maximo:,}' if maximo is not None else f'${minimo:,} o más'
+    return etiqueta.replace(',', '.')
+
+
+def _armar_facetas(filtros, por_categoria, por_etiqueta, por_rango, disponibles, categorias, etiquetas):
+    precios = [
+        {'id': i, 'nombre': nombre_rango(i), 'n': por_rango[f'r{i}'], 'activo': i in filtros.rangos}
+        for i in range(len(RANGOS_PRECIO))
+    ]
+
+    return {
+        'categorias': [
+            {'id': pk, 'nombre': nombre, 'n': por_categoria.get(pk, 0), 'activo': pk in filtros.categorias}
+            for pk, nombre in categorias
+        ],
+        'etiquetas': [
+            {'id': pk, 'nombre': nombre, 'n': por_etiqueta.get(pk, 0), 'activo': pk in filtros.etiquetas}
+            for pk, nombre in etiquetas
+        ],
+        'precios': precios,
+        'disponibles': disponibles,
+    }
+
+
+def calcular_facetas(base, filtros):
+    """
+    Conteos por faceta sobre `base` (ProductoResumen ya filtrado por texto).
+
+    Cuatro agregaciones; los nombres salen de las tablas en memoria.
+    """
+    por_categoria, por_etiqueta, por_rango, rangos, disponibles = _consultas_facetas(base, filtros)
+    por_etiqueta = dict(por_etiqueta)
+    return _armar_facetas(
+        filtros, dict(por_categoria), por_etiqueta, por_rango.aggregate(**rangos),
+        disponibles.count(), tabla_categorias.filas(),
+        _etiquetas_visibles(por_etiqueta, filtros, tabla_etiquetas.filas()),
+    )
+
+
+async def _alista(queryset):
+    return [fila async for fila in queryset]
+
+
+async def _acontar(base, filtros):
+    por_categoria, por_etiqueta, por_rango, rangos, disponibles = _consultas_facetas(base, filtros)
+    por_categoria, por_etiqueta, por_rango, disponibles = await asyncio.gather(
+        _alista(por_categoria), _alista(por_etiqueta), por_rango.aaggregate(**rangos), disponibles.acount(),
+    )
+    return dict(por_categoria), dict(por_etiqueta), por_rango, disponibles
+
+
+async def acalcular_facetas(base, filtros, clave=None):
+    """
+    Versión async. Las agregaciones se piden con gather pero el ORM async
+    las ejecuta en serie (en el hilo del request), no en paralelo.
+
+    Con `clave` (versión del catálogo y texto buscado, lo que define `base`)
+    los conteos se leen de la caché compartida o se guardan en ella.
+    """
+    cache = caches[getattr(settings, 'PRODUCTOS_CACHE_ALIAS', 'default')]
+    conteos = None
+    if clave is not None:
+        clave = 'facetas:' + hashlib.md5(f'{clave}|{filtros.clave()}'.encode(), usedforsecurity=False).hexdigest()
+        conteos = await cache.aget(clave)
+    if conteos is None:
+        conteos = await _acontar(base, filtros)
+        if clave is not None:
+            await cache.aset(clave, conteos, getattr(settings, 'PRODUCTOS_FACETAS_TIMEOUT', 300))
+    por_categoria, por_etiqueta, por_rango, disponibles = conteos
+    categorias, etiquetas = await asyncio.gather(tabla_categorias.afilas(), tabla_etiquetas.afilas())
+    etiquetas = _etiquetas_visibles(por_etiqueta, filtros, etiquetas)
+    return _armar_facetas(
+        filtros, por_categoria, por_etiqueta, por_rango, disponibles, categorias, etiquetas,
+    )
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Producto, Categoria, Etiqueta
+from .tablas import tabla_categorias, tabla_etiquetas
 
 class ProductoForm(forms.ModelForm):
     # Campos extra del OneToOne (con nombres del modelo)
@@ -11,6 +12,9 @@ class ProductoForm(forms.ModelForm):
                                   widget=forms.NumberInput(attrs={'class': 'form-control', 'min': 0}))
     largo_cm = forms.DecimalField(required=False, min_value=0, max_digits=6, decimal_places=2, label='Largo (cm)',
                                   widget=forms.NumberInput(attrs={'class': 'form-control', 'min': 0}))
+    # Edición: stock que mostraba el formulario al abrirse; lo que cambió el
+    # usuario se aplica como diferencia con este valor (ver editar_producto)
+    stock_mostrado = forms.IntegerField(required=False, min_value=0, widget=forms.HiddenInput)
 
     class Meta:
         model = Producto
@@ -28,6 +32,14 @@ class ProductoForm(forms.ModelForm):
             'etiquetas': forms.SelectMultiple(attrs={'class': 'form-select'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Opciones desde las tablas en memoria: renderizar el formulario no
+        # consulta Categoria ni Etiqueta (la validación del POST sí lo hace)
+        categoria = self.fields['categoria']
+        categoria.choices = [('', categoria.empty_label), *tabla_categorias.opciones()]
+        self.fields['etiquetas'].choices = tabla_etiquetas.opciones()
+
 class CategoriaForm(forms.ModelForm):
     class Meta:
         model = Categoria
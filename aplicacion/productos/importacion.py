@@ -0,0 +1,253 @@
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.db import transaction
+
+from .models import Producto, Categoria, Etiqueta, DetalleProductos, ProductoResumen, CheckpointImportacion
+from .busqueda import obtener_backend
+from .cambios import registrar_cambios
+from .stock import registrar_stock_inicial
+from .tablas import tabla_categorias, tabla_etiquetas
+
+
+# Importación masiva del catálogo desde CSV o JSONL.
+#
+# Columnas / claves: nombre, descripcion, precio, stock, categoria (nombre),
+# etiquetas (lista en JSONL; separadas por "|" en CSV), peso_kg, alto_cm,
+# ancho_cm, largo_cm. Cada lote se escribe con bulk_create en una sola
+# transacción, junto con el checkpoint (CheckpointImportacion) de la última
+# fila procesada: tras un fallo, reanudar sigue justo después del último
+# lote confirmado, sin repetirlo. Las filas que no se pueden leer o validar
+# (JSON mal formado, números fuera de rango...) no detienen la importación:
+# quedan en `errores` con su número de fila.
+
+CAMPOS_DETALLE = ('peso_kg', 'alto_cm', 'ancho_cm', 'largo_cm')
+
+# PositiveIntegerField: el máximo que aceptan todas las bases de datos de Django
+_STOCK_MAXIMO = 2147483647
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+def leer_filas(ruta, formato=None):
+    """
+    Genera los registros del archivo como dicts, sin cargarlo entero en
+    memoria. Una línea JSONL ilegible se genera como FilaInvalida (no se
+    lanza) para que la importación siga con la siguiente.
+    """
+    formato = formato or ('jsonl' if ruta.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(ruta, encoding='utf-8', newline='') as f:
+        if formato == 'jsonl':
+            for linea in f:
+                if not linea.strip():
+                    continue
+                try:
+                    registro = json.loads(linea)
+                except ValueError as exc:
+                    yield FilaInvalida(f'JSON inválido: {exc}')
+                    continue
+                if not isinstance(registro, dict):
+                    yield FilaInvalida('la línea no es un objeto JSON')
+                    continue
+                yield registro
+        else:
+            for fila in csv.DictReader(f):
+                etiquetas = fila.get('etiquetas') or ''
+                fila['etiquetas'] = etiquetas.split('|')
+                yield fila
+
+
+def _decimal(valor, campo, modelo, requerido=False):
+    if valor in (None, ''):
+        if requerido:
+            raise FilaInvalida(f'falta {campo}')
+        return None
+    try:
+        numero = Decimal(str(valor))
+    except InvalidOperation:
+        raise FilaInvalida(f'{campo} no es un número: {valor!r}')
+    # Mismos dígitos y decimales que la columna: bulk_create no valida y la
+    # base de datos rechazaría (o recortaría) el lote entero
+    definicion = modelo._meta.get_field(campo)
+    try:
+        DecimalValidator(definicion.max_digits, definicion.decimal_places)(numero)
+    except ValidationError as exc:
+        raise FilaInvalida(f'{campo} {valor!r}: {exc.messages[0]}')
+    if numero < 0:
+        raise FilaInvalida(f'{campo} no puede ser negativo')
+    return numero
+
+
+def normalizar(fila):
+    nombre = (fila.get('nombre') or '').strip()
+    categoria = (fila.get('categoria') or '').strip()
+    if not nombre:
+        raise FilaInvalida('falta nombre')
+    if not categoria:
+        raise FilaInvalida('falta categoria')
+    try:
+        stock = int(fila.get('stock') or 0)
+    except (TypeError, ValueError):
+        raise FilaInvalida(f"stock no es un entero: {fila.get('stock')!r}")
+    if stock < 0:
+        raise FilaInvalida('stock no puede ser negativo')
+    # Como con los decimales: un stock fuera de la columna haría fallar el lote
+    if stock > _STOCK_MAXIMO:
+        raise FilaInvalida(f'stock no puede ser mayor que {_STOCK_MAXIMO}')
+    etiquetas = fila.get('etiquetas') or []
+    if isinstance(etiquetas, str):
+        etiquetas = etiquetas.split('|')
+    return {
+        'nombre': nombre[:255],
+        'descripcion': fila.get('descripcion') or '',
+        'precio': _decimal(fila.get('precio'), 'precio', Producto, requerido=True),
+        'stock': stock,
+        'categoria': categoria[:255],
+        'etiquetas': sorted({e.strip()[:255] for e in etiquetas if e.strip()}),
+        'detalle': {c: _decimal(fila.get(c), c, DetalleProductos) for c in CAMPOS_DETALLE},
+    }
+
+
+class ResolutorNombres:
+    """Cache nombre → id de Categoria/Etiqueta; crea en bloque los que falten."""
+
+    def __init__(self, modelo, tipo_cambio, tabla):
+        self.modelo = modelo
+        self.tipo_cambio = tipo_cambio
+        self.tabla = tabla
+        self.ids = dict(modelo.objects.values_list('nombre', 'pk'))
+
+    def resolver(self, nombres):
+        faltantes = {n for n in nombres if n not in self.ids}
+        if faltantes:
+            self.modelo.objects.bulk_create(
+                [self.modelo(nombre=n) for n in faltantes], ignore_conflicts=True
+            )
+            nuevos = dict(self.modelo.objects.filter(nombre__in=faltantes).values_list('nombre', 'pk'))
+            self.ids.update(nuevos)
+            registrar_cambios(self.tipo_cambio, nuevos.values(), 'crear')
+            # bulk_create no emite post_save
+            self.tabla.invalidar()
+        return self.ids
+
+
+def _archivo(ruta):
+    return os.path.abspath(ruta)
+
+
+def leer_checkpoint(ruta):
+    filas = CheckpointImportacion.objects.filter(archivo=_archivo(ruta)).values_list('filas', flat=True).first()
+    return filas or 0
+
+
+def guardar_checkpoint(ruta, filas):
+    CheckpointImportacion.objects.update_or_create(archivo=_archivo(ruta), defaults={'filas': filas})
+
+
+def borrar_checkpoint(ruta):
+    CheckpointImportacion.objects.filter(archivo=_archivo(ruta)).delete()
+
+
+class ImportadorCatalogo:
+    def __init__(self, lote=2000, informar=None):
+        self.lote = lote
+        self.informar = informar or (lambda mensaje: None)
+        self.categorias = ResolutorNombres(Categoria, 'categoria', tabla_categorias)
+        self.etiquetas = ResolutorNombres(Etiqueta, 'etiqueta', tabla_etiquetas)
+        self.creados = 0
+        self.errores = []
+
+    def _escribir_lote(self, registros):
+        categorias = self.categorias.resolver({r['categoria'] for r in registros})
+        etiquetas = self.etiquetas.resolver({e for r in registros for e in r['etiquetas']})
+
+        productos = Producto.objects.bulk_create([
+            Producto(
+                nombre=r['nombre'], descripcion=r['descripcion'], precio=r['precio'],
+                stock=r['stock'], categoria_id=categorias[r['categoria']],
+            )
+            for r in registros
+        ])
+        Intermedia = Producto.etiquetas.through
+        Intermedia.objects.bulk_create([
+            Intermedia(producto_id=p.pk, etiqueta_id=etiquetas[nombre])
+            for p, r in zip(productos, registros)
+            for nombre in r['etiquetas']
+        ], batch_size=self.lote)
+        DetalleProductos.objects.bulk_create([
+            DetalleProductos(producto_id=p.pk, **r['detalle'])
+            for p, r in zip(productos, registros)
+            if any(v is not None for v in r['detalle'].values())
+        ], batch_size=self.lote)
+
+        # bulk_create no dispara post_save: se actualizan a mano los derivados.
+        # La proyección se arma con los datos ya en memoria, sin releerlos.
+        ProductoResumen.objects.bulk_create([
+            ProductoResumen(
+                producto_id=p.pk, nombre=p.nombre, descripcion=p.descripcion,
+                precio=p.precio, stock=p.stock,
+                categoria_id=p.categoria_id, categoria_nombre=r['categoria'],
+                etiquetas=r['etiquetas'],
+                tiene_detalle=any(v is not None for v in r['detalle'].values()),
+                **r['detalle'],
+            )
+            for p, r in zip(productos, registros)
+        ], batch_size=self.lote)
+        registrar_stock_inicial(productos, referencia='importación')
+        ids = [p.pk for p in productos]
+        obtener_backend().indexar(ids)
+        # Un solo recálculo de relacionados por lote, no una tarea por fila
+        registrar_cambios('producto', ids, 'crear', lote=self.lote, agrupar=True)
+
+    def escribir(self, registros):
+        """Escribe una lista de registros ya normalizados en una transacción."""
+        if registros:
+            with transaction.atomic():
+                self._escribir_lote(registros)
+            self.creados += len(registros)
+
+    def importar(self, ruta, formato=None, reanudar=False):
+        """Importa el archivo; devuelve (ultima_fila, productos_creados, segundos)."""
+        saltar = leer_checkpoint(ruta) if reanudar else 0
+        if saltar:
+            self.informar(f'Reanudando desde la fila {saltar}.')
+
+        inicio = time.monotonic()
+        ultima = 0
+        pendientes = []
+        for numero, fila in enumerate(leer_filas(ruta, formato), start=1):
+            if numero <= saltar:
+                continue
+            ultima = numero
+            try:
+                if isinstance(fila, FilaInvalida):
+                    raise fila
+                pendientes.append(normalizar(fila))
+            except FilaInvalida as exc:
+                self.errores.append((numero, str(exc)))
+            if len(pendientes) >= self.lote:
+                self._confirmar(ruta, pendientes, numero, inicio)
+                pendientes = []
+
+        if pendientes:
+            self._confirmar(ruta, pendientes, ultima, inicio)
+        borrar_checkpoint(ruta)
+        return ultima, self.creados, time.monotonic() - inicio
+
+    def _confirmar(self, ruta, registros, numero, inicio):
+        # El checkpoint, en la transacción del lote: se confirman juntos o ninguno
+        with transaction.atomic():
+            self._escribir_lote(registros)
+            guardar_checkpoint(ruta, numero)
+        self.creados += len(registros)
+        transcurrido = max(time.monotonic() - inicio, 1e-6)
+        self.informar(
+            f'{self.creados} productos ({self.creados / transcurrido:,.0f} filas/s), fila {numero}.'
+        )
@@ -0,0 +1,226 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .plantillas import medir_render
+
+
+# Instrumentación de consultas por request: cuántas consultas hace cada vista,
+# cuánto tiempo pasa en la base de datos y qué consultas se repiten con la
+# misma forma (síntoma típico de N+1, p. ej. producto.etiquetas.all dentro
+# de un bucle de plantilla).
+
+logger = logging.getLogger('productos.consultas')
+
+_PLACEHOLDERS = re.compile(r'(%s, )+%s')
+_CONTROL_TRANSACCION = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def firma(sql):
+    """Forma de la consulta: iguala los IN (...) de distinto largo."""
+    return _PLACEHOLDERS.sub('%s, ...', sql)
+
+
+class RegistroConsultas:
+    """Context manager que registra las consultas de todas las conexiones."""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_db = 0.0
+        self.firmas = Counter()
+        self._pila = None
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_db += time.perf_counter() - inicio
+            self.consultas += 1
+            if not sql.startswith(_CONTROL_TRANSACCION):
+                self.firmas[firma(sql)] += 1
+
+    def __enter__(self):
+        self._pila = ExitStack()
+        for conexion in connections.all():
+            self._pila.enter_context(conexion.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc):
+        self._pila.close()
+        return False
+
+    @property
+    def duplicadas(self):
+        return {sql: n for sql, n in self.firmas.items() if n > 1}
+
+
+def presupuesto(nombre_vista, metodo='GET'):
+    """Presupuesto de 'vista:METODO' si existe, si no el de 'vista'."""
+    presupuestos = getattr(settings, 'PRODUCTOS_PRESUPUESTO_CONSULTAS', {})
+    return presupuestos.get(f'{nombre_vista}:{metodo}', presupuestos.get(nombre_vista))
+
+
+class EstadisticasVistas:
+    """Acumulado por vista, en memoria del proceso."""
+
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, vista, registro, total, metodo='GET', plantillas=0.0):
+        with self._lock:
+            d = self._datos.setdefault(vista, {
+                'requests': 0, 'consultas': 0, 'max_consultas': 0,
+                'db_ms': 0.0, 'plantillas_ms': 0.0, 'total_ms': 0.0, 'excesos': 0, 'duplicadas': Counter(),
+            })
+            d['requests'] += 1
+            d['consultas'] += registro.consultas
+            d['max_consultas'] = max(d['max_consultas'], registro.consultas)
+            d['db_ms'] += registro.tiempo_db * 1000
+            d['plantillas_ms'] += plantillas * 1000
+            d['total_ms'] += total * 1000
+            limite = presupuesto(vista, metodo)
+            if limite is not None and registro.consultas > limite:
+                d['excesos'] += 1
+            d['duplicadas'].update(registro.duplicadas.keys())
+
+    def resumen(self):
+        with self._lock:
+            salida = {}
+            for vista, d in sorted(self._datos.items()):
+                n = d['requests']
+                salida[vista] = {
+                    'requests': n,
+                    'consultas_promedio': round(d['consultas'] / n, 2),
+                    'max_consultas': d['max_consultas'],
+                    'presupuesto': presupuesto(vista),
+                    'excesos': d['excesos'],
+                    'db_ms_promedio': round(d['db_ms'] / n, 2),
+                    'plantillas_ms_promedio': round(d['plantillas_ms'] / n, 2),
+                    'resto_ms_promedio': round((d['total_ms'] - d['db_ms'] - d['plantillas_ms']) / n, 2),
+                    'consultas_repetidas': [
+                        {'sql': sql[:300], 'requests': veces}
+                        for sql, veces in d['duplicadas'].most_common(5)
+                    ],
+                }
+            return salida
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+estadisticas_vistas = EstadisticasVistas()
+
+
+class InstrumentacionConsultasMiddleware:
+    """
+    Mide consultas, tiempo en BD, tiempo de render de plantillas y tiempo
+    total por request,
+    lo acumula por vista y lo escribe en el log 'productos.consultas'.
+
+    Funciona en modo síncrono y async: un middleware solo síncrono obligaría
+    a Django a pasar las vistas async por un hilo, anulando la ventaja de ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'PRODUCTOS_INSTRUMENTACION', True):
+            return self.get_response(request)
+
+        inicio = time.perf_counter()
+        with RegistroConsultas() as registro, medir_render() as render:
+            response = self.get_response(request)
+            # El render de TemplateResponse/streaming ocurre después; las
+            # vistas de este proyecto devuelven HttpResponse ya renderizado.
+        self._registrar(request, registro, render, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'PRODUCTOS_INSTRUMENTACION', True):
+            return await self.get_response(request)
+
+        # El ORM async ejecuta las consultas en el hilo "thread sensitive" del
+        # request; el execute_wrapper se instala en las conexiones de ese hilo.
+        inicio = time.perf_counter()
+        registro = RegistroConsultas()
+        await sync_to_async(registro.__enter__)()
+        try:
+            with medir_render() as render:
+                response = await self.get_response(request)
+        finally:
+            await sync_to_async(registro.__exit__)(None, None, None)
+        self._registrar(request, registro, render, time.perf_counter() - inicio)
+        return response
+
+    def _registrar(self, request, registro, render, total):
+        match = getattr(request, 'resolver_match', None)
+        vista = match.view_name if match else request.path
+        estadisticas_vistas.registrar(vista, registro, total, request.method, render.segundos)
+
+        limite = presupuesto(vista, request.method)
+        # Las lecturas no deberían repetir consultas; en las escrituras los
+        # INSERT repetidos del registro de cambios son esperables.
+        repetidas = registro.duplicadas if request.method in ('GET', 'HEAD') else {}
+        nivel = logging.INFO
+        if repetidas or (limite is not None and registro.consultas > limite):
+            nivel = logging.WARNING
+        logger.log(
+            nivel,
+            '%s %s: %d consultas (presupuesto %s), %d repetidas, BD %.1f ms, plantillas %.1f ms, total %.1f ms',
+            request.method, vista, registro.consultas, limite,
+            sum(repetidas.values()), registro.tiempo_db * 1000, render.segundos * 1000, total * 1000,
+        )
+
+
+class verificar_presupuesto:
+    """
+    Para tests: falla si el bloque supera el presupuesto de la vista o repite
+    una consulta con la misma forma (N+1).
+
+        with verificar_presupuesto('detalle_producto'):
+            self.client.get(url)
+    """
+
+    def __init__(self, nombre_vista, maximo=None, permitir_repetidas=False, metodo='GET'):
+        self.nombre_vista = nombre_vista
+        self.maximo = maximo if maximo is not None else presupuesto(nombre_vista, metodo)
+        self.permitir_repetidas = permitir_repetidas
+        self.registro = RegistroConsultas()
+
+    def __enter__(self):
+        self.registro.__enter__()
+        return self.registro
+
+    def __exit__(self, tipo, *exc):
+        self.registro.__exit__(tipo, *exc)
+        if tipo is not None:
+            return False
+        errores = []
+        if self.maximo is not None and self.registro.consultas > self.maximo:
+            errores.append(
+                f'{self.nombre_vista}: {self.registro.consultas} consultas, presupuesto {self.maximo}'
+            )
+        if not self.permitir_repetidas and self.registro.duplicadas:
+            errores.append(f'{self.nombre_vista}: consultas repetidas (posible N+1):')
+            errores.extend(f'  {n}x {sql}' for sql, n in self.registro.duplicadas.items())
+        if errores:
+            raise AssertionError('\n'.join(errores))
+        return False
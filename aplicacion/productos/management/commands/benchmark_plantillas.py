@@ -0,0 +1,63 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from productos.benchmark import ComandoBenchmark, documento, resumir
+from productos.models import ProductoResumen
+from productos.paginacion import PaginaCursor
+from productos.plantillas import cache_filas, medir_render
+
+
+class Command(ComandoBenchmark):
+    help = ('Mide el render de productos/lista.html con muchas filas (sin base de datos): '
+            'con la caché de fragmentos vacía en cada repetición y ya caliente.')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--filas', type=int, default=1000)
+        parser.add_argument('--repeticiones', type=int, default=30)
+
+    def handle(self, *args, **options):
+        if options['filas'] < 1 or options['repeticiones'] < 1:
+            raise CommandError('--filas y --repeticiones deben ser positivos.')
+        if cache_filas.tamano < options['filas']:
+            raise CommandError(f'PRODUCTOS_FRAGMENTOS_LRU ({cache_filas.tamano}) es menor que --filas.')
+
+        request = RequestFactory().get('/productos/')
+        request.user = AnonymousUser()
+        productos = [
+            ProductoResumen(
+                producto_id=i, nombre=f'Producto {i}', precio=Decimal(1000 + i), stock=i % 7,
+                categoria_id=i % 20, categoria_nombre=f'Categoría {i % 20}',
+            )
+            for i in range(1, options['filas'] + 1)
+        ]
+        pagina = PaginaCursor(productos, ('-pk',), hay_siguiente=False, hay_anterior=False)
+        ctx = {
+            'productos': pagina, 'pagina': pagina, 'q': '', 'filtros': None,
+            'facetas': {'categorias': [], 'etiquetas': [], 'precios': [], 'disponibles': 0},
+        }
+
+        def medir(vaciar):
+            render_to_string('productos/lista.html', ctx, request)  # plantillas compiladas
+            muestras = []
+            for _ in range(options['repeticiones']):
+                if vaciar:
+                    cache_filas.clear()
+                with medir_render() as medicion:
+                    render_to_string('productos/lista.html', ctx, request)
+                muestras.append(medicion.segundos)
+            return resumir(muestras)
+
+        inicio = time.perf_counter()
+        resultados = {
+            f'lista_{options["filas"]}_sin_fragmentos': medir(vaciar=True),
+            f'lista_{options["filas"]}_con_fragmentos': medir(vaciar=False),
+        }
+        self.stdout.write(f'Render medido en {time.perf_counter() - inicio:.1f} s.')
+        parametros = {k: options[k] for k in ('filas', 'repeticiones')}
+        self.publicar(documento('plantillas', parametros, resultados), options)
@@ -0,0 +1,56 @@
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from productos.benchmark import ComandoBenchmark, documento, filas_sinteticas, resumir
+from productos.relacionados import ATRIBUTOS, LOTE, Catalogo
+
+
+class Command(ComandoBenchmark):
+    help = ('Mide el cálculo de productos relacionados sobre un catálogo sintético en memoria (sin '
+            'base de datos): construcción de las matrices y cada pasada vectorizada de --lote productos.')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--productos', type=int, default=1_000_000)
+        parser.add_argument('--lotes', type=int, default=20, help='Pasadas a medir (de --lote productos).')
+        parser.add_argument('--lote', type=int, default=LOTE)
+
+    def handle(self, *args, **options):
+        if min(options['productos'], options['lotes'], options['lote']) < 1:
+            raise CommandError('--productos, --lotes y --lote deben ser positivos.')
+
+        inicio = time.perf_counter()
+        productos, pares, categorias, etiquetas = [], [], {}, {}
+        for pk, fila in enumerate(filas_sinteticas(options['productos'], semilla=options['semilla']), 1):
+            categoria = categorias.setdefault(fila['categoria'], len(categorias) + 1)
+            productos.append((pk, categoria, *(fila[c] for c in ATRIBUTOS)))
+            pares.extend((pk, etiquetas.setdefault(e, len(etiquetas) + 1)) for e in fila['etiquetas'])
+        generado = time.perf_counter()
+        catalogo = Catalogo(productos, pares)
+        construido = time.perf_counter()
+        self.stdout.write(
+            f'{len(catalogo)} productos, {len(catalogo.claves)} pares producto-etiqueta: generados en '
+            f'{generado - inicio:.1f} s, matrices en {construido - generado:.1f} s.'
+        )
+
+        k = getattr(settings, 'PRODUCTOS_RELACIONADOS_K', 6)
+        rng = np.random.default_rng(options['semilla'])
+        muestras = []
+        for _ in range(options['lotes']):
+            inicio_lote = int(rng.integers(0, max(len(catalogo) - options['lote'], 0) + 1))
+            filas = np.arange(inicio_lote, min(inicio_lote + options['lote'], len(catalogo)))
+            t = time.perf_counter()
+            catalogo.vecinos(filas, k)
+            muestras.append(time.perf_counter() - t)
+        resultados = {'lote': resumir(muestras)}
+        por_producto = sum(muestras) / (options['lotes'] * options['lote'])
+        self.stdout.write(
+            f'{por_producto * 1e6:.0f} µs por producto: el catálogo completo en ~{por_producto * len(catalogo):.0f} s.'
+        )
+
+        parametros = {k: options[k] for k in ('productos', 'lotes', 'lote', 'semilla')}
+        parametros['construccion_s'] = round(construido - generado, 2)
+        self.publicar(documento('relacionados', parametros, resultados), options)
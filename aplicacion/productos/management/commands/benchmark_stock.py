@@ -0,0 +1,74 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from productos.models import Producto, Categoria, MovimientoStock
+from productos.stock import StockInsuficiente, reservar
+
+
+class Command(BaseCommand):
+    help = ('Mide el rendimiento de reservar() con muchos hilos compitiendo por el '
+            'mismo producto y verifica que no se pierdan ni se sobrevendan unidades.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--stock', type=int, default=2000,
+                            help='Stock inicial del producto caliente.')
+        parser.add_argument('--intentos', type=int, default=400,
+                            help='Reservas de 1 unidad que intenta cada hilo.')
+
+    def handle(self, *args, **options):
+        categoria, _ = Categoria.objects.get_or_create(nombre='Benchmark')
+        producto = Producto.objects.create(
+            nombre='Producto caliente (benchmark)', descripcion='', precio=1,
+            stock=options['stock'], categoria=categoria,
+        )
+        resultados = {'ok': 0, 'sin_stock': 0, 'bloqueos': 0}
+        lock = threading.Lock()
+
+        def trabajador():
+            locales = {'ok': 0, 'sin_stock': 0, 'bloqueos': 0}
+            try:
+                for _ in range(options['intentos']):
+                    try:
+                        reservar(producto.pk, 1, referencia='benchmark')
+                        locales['ok'] += 1
+                    except StockInsuficiente:
+                        locales['sin_stock'] += 1
+                    except OperationalError:
+                        # SQLite serializa las escrituras: "database is locked"
+                        locales['bloqueos'] += 1
+            finally:
+                connection.close()
+            with lock:
+                for clave, valor in locales.items():
+                    resultados[clave] += valor
+
+        hilos = [threading.Thread(target=trabajador) for _ in range(options['hilos'])]
+        inicio = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        segundos = time.perf_counter() - inicio
+
+        producto.refresh_from_db()
+        total = options['hilos'] * options['intentos']
+        consistente = (
+            producto.stock + producto.reservado == options['stock']
+            and producto.reservado == resultados['ok']
+            and MovimientoStock.objects.filter(producto=producto).count() == resultados['ok']
+        )
+        self.stdout.write(
+            f"{total} intentos en {segundos:.2f} s ({total / segundos:,.0f} op/s) con "
+            f"{options['hilos']} hilos: {resultados['ok']} reservas, "
+            f"{resultados['sin_stock']} rechazadas por stock, {resultados['bloqueos']} bloqueos."
+        )
+        self.stdout.write(f'Stock final {producto.stock}, reservado {producto.reservado}.')
+        if consistente:
+            self.stdout.write(self.style.SUCCESS('Sin actualizaciones perdidas ni sobreventa.'))
+        else:
+            self.stdout.write(self.style.ERROR('¡Inconsistencia de stock detectada!'))
+        producto.delete()
@@ -0,0 +1,61 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from productos.benchmark import ComandoBenchmark, documento, filas_sinteticas, resumir
+from productos.sugerencias import IndicePrefijos, _productos_bd
+
+
+class Command(ComandoBenchmark):
+    help = ('Mide el índice de prefijos de las sugerencias: lo construye en memoria con un catálogo '
+            'sintético (sin base de datos) y simula a usuarios escribiendo nombres letra por letra. '
+            'Con --bd mide también la alternativa sobre el índice de búsqueda de la base configurada.')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--productos', type=int, default=1_000_000)
+        parser.add_argument('--consultas', type=int, default=200,
+                            help='Nombres que se escriben letra por letra.')
+        parser.add_argument('--bd', action='store_true',
+                            help='Mide también las mismas pulsaciones contra la base de datos.')
+
+    def handle(self, *args, **options):
+        if options['productos'] < 1 or options['consultas'] < 1:
+            raise CommandError('--productos y --consultas deben ser positivos.')
+
+        inicio = time.perf_counter()
+        nombres = [f['nombre'] for f in filas_sinteticas(options['productos'], semilla=options['semilla'])]
+        generado = time.perf_counter()
+        indice = IndicePrefijos(enumerate(nombres, 1))
+        construido = time.perf_counter()
+        self.stdout.write(
+            f'{len(indice)} productos, {len(indice.terminos)} términos: generados en '
+            f'{generado - inicio:.1f} s, índice construido en {construido - generado:.1f} s.'
+        )
+
+        rng = random.Random(options['semilla'])
+        pulsaciones = [
+            nombre[:n]
+            for nombre in rng.sample(nombres, min(options['consultas'], len(nombres)))
+            for n in range(2, len(nombre) + 1)
+        ]
+        limite = getattr(settings, 'PRODUCTOS_SUGERENCIAS_LIMITE', 8)
+        escaneo = getattr(settings, 'PRODUCTOS_SUGERENCIAS_ESCANEO', 1000)
+
+        def medir(buscar):
+            muestras = []
+            for q in pulsaciones:
+                t = time.perf_counter()
+                buscar(q)
+                muestras.append(time.perf_counter() - t)
+            return resumir(muestras)
+
+        resultados = {'memoria': medir(lambda q: indice.buscar(q, limite, escaneo))}
+        if options['bd']:
+            resultados['bd'] = medir(lambda q: _productos_bd(q, limite))
+
+        parametros = {k: options[k] for k in ('productos', 'consultas', 'semilla')}
+        parametros['construccion_s'] = round(construido - generado, 2)
+        self.publicar(documento('sugerencias', parametros, resultados), options)
@@ -0,0 +1,58 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+from productos.benchmark import ComandoBenchmark, documento, limpiar_escrituras, preparar_escenarios, resumir
+
+
+class Command(ComandoBenchmark):
+    help = ('Micro-benchmark de cada vista del catálogo a través del cliente de '
+            'pruebas de Django, sin servidor ni red de por medio.')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--repeticiones', type=int, default=50)
+        parser.add_argument('--calentamiento', type=int, default=5,
+                            help='Peticiones sin medir antes de cada escenario.')
+        parser.add_argument('--escenarios', nargs='+', metavar='NOMBRE',
+                            help='Solo estos escenarios (por defecto todos).')
+        parser.add_argument('--escrituras', action='store_true',
+                            help='Incluye los POST de crear y editar producto.')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser mayor que 0.')
+        setup_test_environment()  # habilita el host 'testserver' del cliente
+        try:
+            escenarios = preparar_escenarios(options['semilla'], escrituras=options['escrituras'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options['escenarios']:
+            escenarios = [e for e in escenarios if e.nombre in options['escenarios']]
+
+        cliente = Client()
+        if options['escrituras']:
+            usuario, _ = User.objects.get_or_create(username='benchmark')
+            cliente.force_login(usuario)
+
+        resultados = {}
+        try:
+            for escenario in escenarios:
+                for i in range(options['calentamiento']):
+                    escenario.ejecutar(cliente, i)
+                muestras, errores = [], 0
+                for i in range(options['repeticiones']):
+                    inicio = time.perf_counter()
+                    response = escenario.ejecutar(cliente, options['calentamiento'] + i)
+                    muestras.append(time.perf_counter() - inicio)
+                    errores += response.status_code >= 400
+                resultados[escenario.nombre] = resumir(muestras, errores)
+        finally:
+            if options['escrituras']:
+                limpiar_escrituras()
+
+        parametros = {k: options[k] for k in ('semilla', 'repeticiones', 'calentamiento', 'escrituras')}
+        self.publicar(documento('vistas', parametros, resultados), options)
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.relacionados import LOTE, calcular
+
+
+class Command(BaseCommand):
+    help = ('Recalcula los productos relacionados de todo el catálogo (o solo de --ids). Los '
+            'cambios ya encolan el recálculo de cada producto; la pasada completa incorpora los '
+            'productos nuevos a las listas de los demás (pensado para cron, una vez por noche).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', type=lambda v: [int(i) for i in v.split(',') if i],
+                            help='Solo estos productos (y los que los tienen como relacionado).')
+        parser.add_argument('--k', type=int, default=getattr(settings, 'PRODUCTOS_RELACIONADOS_K', 6))
+        parser.add_argument('--lote', type=int, default=LOTE)
+
+    def handle(self, *args, **options):
+        if options['k'] < 1 or options['lote'] < 1:
+            raise CommandError('--k y --lote deben ser positivos.')
+        inicio = time.perf_counter()
+        cambiados = calcular(options['ids'], k=options['k'], lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{cambiados} productos con relacionados nuevos en {time.perf_counter() - inicio:.1f} s.'
+        ))
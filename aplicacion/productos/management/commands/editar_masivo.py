@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.masivo import LOTE, ErrorMasivo, OPERACIONES, aplicar, parametros, seleccionar
+
+
+def _lista(texto):
+    return [v for v in (texto or '').split(',') if v.strip()]
+
+
+class Command(BaseCommand):
+    help = ('Edita o elimina productos en bloque por lista de ids y/o filtros del '
+            'catálogo; con --simular solo informa cuántos productos tocaría.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('operacion', choices=sorted(OPERACIONES))
+        parser.add_argument('--valor',
+                            help='Porcentaje, monto, stock, id de categoría o ids de etiquetas '
+                                 'separados por comas, según la operación.')
+        parser.add_argument('--ids', help='Ids de productos separados por comas.')
+        parser.add_argument('--categoria', action='append', default=[], help='Filtro (repetible).')
+        parser.add_argument('--etiqueta', action='append', default=[], help='Filtro (repetible).')
+        parser.add_argument('--modo', choices=['todas', 'alguna'], default='todas',
+                            help='Con varias --etiqueta: todas o alguna.')
+        parser.add_argument('--precio', action='append', default=[],
+                            help='Índice de rango de precio (repetible), como en el listado.')
+        parser.add_argument('--disponible', action='store_true', help='Solo productos con stock.')
+        parser.add_argument('--todos', action='store_true',
+                            help='Sin --ids ni filtros, opera sobre todo el catálogo.')
+        parser.add_argument('--lote', type=int, default=LOTE,
+                            help=f'Productos por transacción (por defecto {LOTE}).')
+        parser.add_argument('--simular', action='store_true',
+                            help='No modifica nada: cuenta los productos seleccionados.')
+
+    def handle(self, *args, **options):
+        filtros = {
+            'categoria': options['categoria'], 'etiqueta': options['etiqueta'],
+            'modo': options['modo'], 'precio': options['precio'],
+            'disponible': options['disponible'],
+        }
+        try:
+            ids = [int(pk) for pk in _lista(options['ids'])] if options['ids'] else None
+        except ValueError:
+            raise CommandError('--ids debe ser una lista de enteros separados por comas.')
+        valor = options['valor']
+        if options['operacion'] in ('agregar_etiquetas', 'quitar_etiquetas'):
+            valor = _lista(valor)
+
+        seleccion = seleccionar(ids, parametros(filtros), todos=options['todos'])
+        try:
+            resultado = aplicar(options['operacion'], seleccion, valor,
+                                simular=options['simular'], lote=options['lote'])
+        except ErrorMasivo as exc:
+            raise CommandError(str(exc))
+
+        if resultado['simulado']:
+            mensaje = f"Simulación: {resultado['productos']} productos en {resultado['lotes']} lotes"
+            if 'protegidos' in resultado:
+                mensaje += f", {resultado['protegidos']} protegidos"
+            self.stdout.write(mensaje + '.')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{resultado['operacion']}: {resultado['productos']} productos en {resultado['lotes']} lotes."
+            ))
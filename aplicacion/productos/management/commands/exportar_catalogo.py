@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.exportacion import bloques, interpretar_fecha
+
+
+class Command(BaseCommand):
+    help = 'Exporta el catálogo en streaming como CSV o JSONL (opcionalmente gzip).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Comprime la salida en gzip.')
+        parser.add_argument('--desde', help='Solo productos actualizados desde esta fecha (ISO 8601).')
+        parser.add_argument('--salida', default='-', help='Archivo de salida ("-" = stdout).')
+        parser.add_argument('--chunk', type=int, default=2000,
+                            help='Filas por lectura del cursor (por defecto 2000).')
+
+    def handle(self, *args, **options):
+        try:
+            desde = interpretar_fecha(options['desde'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        generador = bloques(options['formato'], desde=desde, comprimir=options['gzip'],
+                            chunk_size=options['chunk'])
+        if options['salida'] == '-':
+            for bloque in generador:
+                sys.stdout.buffer.write(bloque)
+            sys.stdout.buffer.flush()
+            return
+        with open(options['salida'], 'wb') as f:
+            for bloque in generador:
+                f.write(bloque)
+        self.stderr.write(self.style.SUCCESS(f"Catálogo exportado en {options['salida']}."))
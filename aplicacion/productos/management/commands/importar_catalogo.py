@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.importacion import ImportadorCatalogo
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde un archivo CSV o JSONL con escrituras por lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .jsonl')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'],
+                            help='Formato del archivo (por defecto según la extensión).')
+        parser.add_argument('--lote', type=int, default=2000,
+                            help='Filas por lote/transacción (por defecto 2000).')
+        parser.add_argument('--reanudar', action='store_true',
+                            help='Continúa desde el último checkpoint del archivo.')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0.')
+        importador = ImportadorCatalogo(lote=options['lote'], informar=self.stdout.write)
+        try:
+            ultima, creados, segundos = importador.importar(
+                options['archivo'], formato=options['formato'], reanudar=options['reanudar'],
+            )
+        except FileNotFoundError:
+            raise CommandError(f"No existe el archivo {options['archivo']}.")
+
+        for numero, error in importador.errores[:20]:
+            self.stderr.write(f'Fila {numero}: {error}')
+        if len(importador.errores) > 20:
+            self.stderr.write(f'... y {len(importador.errores) - 20} errores más.')
+
+        velocidad = creados / segundos if segundos else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Importados {creados} productos hasta la fila {ultima} en {segundos:.1f} s '
+            f'({velocidad:,.0f} filas/s); {len(importador.errores)} filas con errores.'
+        ))
@@ -0,0 +1,88 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from productos.benchmark import ComandoBenchmark, documento, resumir
+
+FASES = ('importar_django', 'configuracion', 'apps', 'middleware', 'precarga', 'primera_peticion')
+
+IMPORTACION = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+class Command(ComandoBenchmark):
+    help = ('Mide el arranque de un worker en procesos nuevos: importar Django, configuración, '
+            'cada app (módulo, modelos, ready), middleware, precarga y la primera petición '
+            '(tiempo hasta la primera respuesta). Usa el DJANGO_SETTINGS_MODULE de este comando.')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--ruta', default='/', help='Ruta de la primera petición.')
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--importaciones', type=int, default=10,
+                            help='Cuántas importaciones más costosas listar (una pasada con -X importtime).')
+
+    def _hijo(self, options, *opciones_python):
+        comando = [sys.executable, *opciones_python, '-m', 'productos.medicion_arranque',
+                   options['ruta'], options['host']]
+        inicio = time.perf_counter()
+        proceso = subprocess.run(comando, cwd=settings.BASE_DIR, env=os.environ.copy(),
+                                 capture_output=True, text=True)
+        segundos = time.perf_counter() - inicio
+        if proceso.returncode:
+            raise CommandError(f'El proceso de medición falló:\n{proceso.stderr[-2000:]}')
+        return json.loads(proceso.stdout), segundos, proceso.stderr
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser positivo.')
+
+        muestras = {fase: [] for fase in FASES + ('proceso',)}
+        apps = {}
+        for _ in range(options['repeticiones']):
+            medicion, segundos, _ = self._hijo(options)
+            for fase in FASES:
+                muestras[fase].append(medicion['fases'][fase] / 1000)
+            # El proceso completo incluye arrancar el intérprete
+            muestras['proceso'].append(segundos)
+            for app, tiempos in medicion['apps'].items():
+                for clave, ms in tiempos.items():
+                    apps.setdefault(app, {}).setdefault(clave, []).append(ms)
+        if medicion['estado'] >= 400:
+            self.stdout.write(self.style.WARNING(f"{options['ruta']} respondió {medicion['estado']}."))
+
+        self.stdout.write('Por app (mediana, ms):')
+        for app, tiempos in sorted(apps.items(), key=lambda a: -sum(statistics.median(v) for v in a[1].values())):
+            detalle = '  '.join(f'{clave}={statistics.median(v):.1f}' for clave, v in sorted(tiempos.items()))
+            self.stdout.write(f'  {app:<16} {detalle}')
+
+        if options['importaciones']:
+            self._importaciones(options)
+
+        resultados = {fase: resumir(m) for fase, m in muestras.items()}
+        parametros = {
+            'settings': os.environ.get('DJANGO_SETTINGS_MODULE'),
+            **{k: options[k] for k in ('repeticiones', 'ruta')},
+        }
+        self.publicar(documento('arranque', parametros, resultados), options)
+
+    def _importaciones(self, options):
+        # Solo las de primer nivel: las que dispara el propio arranque y no
+        # otra importación (cada una ya incluye a las suyas)
+        _, _, stderr = self._hijo(options, '-X', 'importtime')
+        primer_nivel = []
+        for linea in stderr.splitlines():
+            coincidencia = IMPORTACION.match(linea)
+            if coincidencia and not coincidencia.group(3):
+                primer_nivel.append((int(coincidencia.group(2)), coincidencia.group(4)))
+        primer_nivel.sort(reverse=True)
+        self.stdout.write('Importaciones más costosas (acumulado, ms; -X importtime):')
+        for microsegundos, modulo in primer_nivel[:options['importaciones']]:
+            self.stdout.write(f'  {microsegundos / 1000:8.1f}  {modulo}')
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.tareas import ejecutar_lote, procesar_pendientes, purgar_ejecuciones, recuperar_vencidas, tipos
+
+
+class Command(BaseCommand):
+    help = ('Worker de la cola de tareas en segundo plano (índice de búsqueda, analítica): '
+            'toma lotes de tareas pendientes y los ejecuta hasta que se lo detiene.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa lo que esté disponible y termina (para cron o despliegues).')
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help='Segundos de pausa cuando la cola está vacía.')
+        parser.add_argument('--tipos', nargs='+', choices=tipos(),
+                            help='Solo estos tipos de tarea (por defecto, todos).')
+
+    def handle(self, *args, **options):
+        if options['espera'] <= 0:
+            raise CommandError('--espera debe ser positiva.')
+        tipos_tarea = options['tipos'] or tipos()
+
+        recuperadas = recuperar_vencidas()
+        if recuperadas:
+            self.stdout.write(f'{recuperadas} tareas abandonadas vuelven a la cola.')
+
+        if options['una_vez']:
+            total = procesar_pendientes(tipos_tarea)
+            purgar_ejecuciones()
+            self.stdout.write(self.style.SUCCESS(f'{total} tareas procesadas.'))
+            return
+
+        self.stdout.write(f'Procesando tareas ({", ".join(tipos_tarea)}); Ctrl+C para salir.')
+        ultima_limpieza = 0.0
+        try:
+            while True:
+                if time.monotonic() - ultima_limpieza > 60:
+                    recuperar_vencidas()
+                    purgar_ejecuciones()
+                    ultima_limpieza = time.monotonic()
+                if not sum(ejecutar_lote(tipo) for tipo in tipos_tarea):
+                    time.sleep(options['espera'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido.')
@@ -0,0 +1,165 @@
+import asyncio
+import http.client
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+from productos.benchmark import ComandoBenchmark, documento, llamar_asgi, preparar_escenarios, resumir
+
+
+class ClienteHTTP:
+    """Conexión keep-alive por hilo contra un servidor real (runserver, gunicorn...)."""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self.prefijo = partes.path.rstrip('/')
+        self.conectar = lambda: clase(partes.netloc, timeout=30)
+        self.conexion = self.conectar()
+
+    def get(self, ruta):
+        for intento in range(2):
+            try:
+                self.conexion.request('GET', self.prefijo + ruta)
+                respuesta = self.conexion.getresponse()
+                respuesta.read()
+                return respuesta.status
+            except (http.client.HTTPException, ConnectionError):
+                # El servidor cerró la conexión keep-alive: se reabre una vez
+                self.conexion.close()
+                self.conexion = self.conectar()
+                if intento:
+                    raise
+
+    def close(self):
+        self.conexion.close()
+
+
+class ClienteLocal:
+    """Mismo contrato que ClienteHTTP, pero dentro del proceso con el cliente de pruebas."""
+
+    def __init__(self):
+        self.cliente = Client(raise_request_exception=False)
+
+    def get(self, ruta):
+        return self.cliente.get(ruta).status_code
+
+    def close(self):
+        connection.close()
+
+
+class Medicion:
+    """Latencias y errores por escenario, compartidos entre hilos o corrutinas."""
+
+    def __init__(self, escenarios):
+        self.muestras = {e.nombre: [] for e in escenarios}
+        self.errores = {e.nombre: 0 for e in escenarios}
+        self._lock = threading.Lock()
+
+    def registrar(self, nombre, segundos, estado):
+        with self._lock:
+            self.muestras[nombre].append(segundos)
+            self.errores[nombre] += estado >= 400
+
+    def resultados(self, segundos):
+        resultados = {
+            nombre: resumir(valores, self.errores[nombre], segundos)
+            for nombre, valores in self.muestras.items() if valores
+        }
+        resultados['total'] = resumir(
+            [v for valores in self.muestras.values() for v in valores],
+            sum(self.errores.values()), segundos,
+        )
+        return resultados
+
+
+class Command(ComandoBenchmark):
+    help = ('Prueba de carga concurrente con una mezcla ponderada de lecturas del '
+            'catálogo; informa p50/p95/p99 y req/s por escenario y en total.')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--concurrencia', type=int, default=8,
+                            help='Clientes simultáneos (hilos en wsgi/http, corrutinas en asgi).')
+        parser.add_argument('--duracion', type=float, default=10, help='Segundos de carga.')
+        parser.add_argument('--modo', choices=['wsgi', 'asgi'], default='wsgi',
+                            help='Sin --url: wsgi usa hilos con el cliente de pruebas; asgi, '
+                                 'corrutinas en un solo event loop contra la aplicación ASGI.')
+        parser.add_argument('--url',
+                            help='URL base de un servidor en marcha (p. ej. http://127.0.0.1:8000). '
+                                 'Sin ella las peticiones se hacen dentro del proceso.')
+
+    def handle(self, *args, **options):
+        if options['concurrencia'] < 1 or options['duracion'] <= 0:
+            raise CommandError('--concurrencia y --duracion deben ser positivos.')
+        if not options['url']:
+            setup_test_environment()  # habilita el host 'testserver' del cliente
+        try:
+            escenarios = [e for e in preparar_escenarios(options['semilla']) if e.peso > 0]
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        medicion = Medicion(escenarios)
+        inicio = time.perf_counter()
+        if options['modo'] == 'asgi' and not options['url']:
+            asyncio.run(self.carga_asgi(escenarios, medicion, options))
+        else:
+            self.carga_hilos(escenarios, medicion, options)
+        segundos = time.perf_counter() - inicio
+
+        parametros = {
+            'semilla': options['semilla'], 'concurrencia': options['concurrencia'],
+            'duracion': options['duracion'], 'modo': 'http' if options['url'] else options['modo'],
+        }
+        self.publicar(documento('carga', parametros, medicion.resultados(segundos)), options)
+
+    def carga_hilos(self, escenarios, medicion, options):
+        pesos = [e.peso for e in escenarios]
+        fin = time.perf_counter() + options['duracion']
+
+        def trabajador(numero):
+            rng = random.Random(options['semilla'] + numero)
+            cliente = ClienteHTTP(options['url']) if options['url'] else ClienteLocal()
+            i = 0
+            try:
+                while time.perf_counter() < fin:
+                    escenario = rng.choices(escenarios, weights=pesos)[0]
+                    inicio = time.perf_counter()
+                    try:
+                        estado = cliente.get(escenario.ruta(i))
+                    except OSError:
+                        estado = 599
+                    medicion.registrar(escenario.nombre, time.perf_counter() - inicio, estado)
+                    i += 1
+            finally:
+                cliente.close()
+
+        hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(options['concurrencia'])]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+    async def carga_asgi(self, escenarios, medicion, options):
+        aplicacion = get_asgi_application()
+        pesos = [e.peso for e in escenarios]
+        fin = time.perf_counter() + options['duracion']
+
+        async def trabajador(numero):
+            rng = random.Random(options['semilla'] + numero)
+            i = 0
+            while time.perf_counter() < fin:
+                escenario = rng.choices(escenarios, weights=pesos)[0]
+                inicio = time.perf_counter()
+                estado = await llamar_asgi(aplicacion, escenario.ruta(i))
+                medicion.registrar(escenario.nombre, time.perf_counter() - inicio, estado or 599)
+                i += 1
+
+        await asyncio.gather(*(trabajador(n) for n in range(options['concurrencia'])))
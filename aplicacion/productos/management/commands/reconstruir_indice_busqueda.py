@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from productos.busqueda import obtener_backend
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero el índice de búsqueda de productos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Productos por transacción (por defecto 1000).')
+
+    def handle(self, *args, **options):
+        backend = obtener_backend()
+        total = backend.reconstruir(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruido con {type(backend).__name__}: {total} productos.'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from productos.proyeccion import reconstruir_proyeccion
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la proyección de lectura ProductoResumen.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Productos por lote (por defecto 1000).')
+
+    def handle(self, *args, **options):
+        total = reconstruir_proyeccion(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Proyección reconstruida: {total} productos.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from productos.analitica import refrescar
+
+
+class Command(BaseCommand):
+    help = ('Recalcula las tablas de resumen del tablero de analítica si hubo cambios '
+            'en el catálogo desde el último refresco (pensado para cron).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true',
+                            help='Recalcula aunque no haya cambios nuevos.')
+
+    def handle(self, *args, **options):
+        refresco = refrescar(forzar=options['forzar'])
+        if refresco is None:
+            self.stdout.write('Sin cambios desde el último refresco.')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Analítica al día hasta el cambio {refresco.ultimo_cambio}: '
+            f'{refresco.filas_escritas} filas escritas en {refresco.duracion_ms} ms.'
+        ))
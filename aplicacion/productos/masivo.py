@@ -0,0 +1,300 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.db import models, transaction
+from django.db.models import F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Greatest, Round
+from django.http import QueryDict
+from django.utils import timezone
+
+from .models import Producto, ProductoResumen, Categoria, Etiqueta, MovimientoStock
+from .cache import cache_detalle
+from .cambios import registrar_cambios
+from .facetas import FiltrosCatalogo
+from .proyeccion import actualizar_proyeccion
+
+
+# Ediciones y borrados masivos de productos. Cada operación se resuelve con
+# UPDATE/DELETE sobre conjuntos de ids (e inserciones en bloque en la tabla
+# intermedia de etiquetas), por lotes de ids en su propia transacción: un
+# cambio de precios sobre miles de productos no bloquea la tabla entera ni
+# carga un objeto por fila. Lo derivado (proyección, caché de detalle,
+# registro de cambios) se mantiene por lote, igual que en productos.stock.
+#
+#   precio_porcentaje: precio *= 1 + valor/100   (redondeado, nunca < 0)
+#   precio_monto:      precio += valor           (nunca < 0)
+#     (si el precio más alto de la selección quedaría fuera del campo, no se
+#     aplica ningún lote: ErrorMasivo)
+#   stock:             stock = valor             (con su ajuste en el libro)
+#   categoria:         categoria = valor (id)
+#   agregar_etiquetas / quitar_etiquetas: valor = [ids de etiquetas]
+#   eliminar
+
+LOTE = 500
+
+Intermedia = Producto.etiquetas.through
+
+
+class ErrorMasivo(Exception):
+    pass
+
+
+class BorradoProtegido(ErrorMasivo):
+    def __init__(self, protegidos):
+        super().__init__(f'{protegidos} productos tienen filas que los protegen del borrado.')
+        self.protegidos = protegidos
+
+
+def seleccionar(ids=None, params=None, todos=False):
+    """
+    Queryset de Producto con la selección: lista de ids, filtros del catálogo
+    (mismos parámetros que lista_productos: categoria, etiqueta, modo, precio,
+    disponible) o ambos. Sin ninguno no se selecciona nada, salvo con `todos`.
+    """
+    queryset = Producto.objects.all()
+    filtros = FiltrosCatalogo(params) if params is not None else None
+    if not todos and ids is None and not (filtros and _hay_filtros(filtros)):
+        return queryset.none()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=list(ids))
+    if filtros:
+        # Los campos de los filtros (pk, categoria_id, precio, stock) existen
+        # con el mismo nombre en Producto y en ProductoResumen
+        queryset = filtros.aplicar(queryset)
+    return queryset
+
+
+def parametros(filtros):
+    """QueryDict de filtros a partir de un dict {'categoria': [1, 2], 'disponible': True, ...}."""
+    params = QueryDict(mutable=True)
+    for clave, valores in (filtros or {}).items():
+        if not isinstance(valores, (list, tuple)):
+            valores = [valores]
+        params.setlist(clave, ['1' if v is True else str(v) for v in valores])
+    return params
+
+
+def _hay_filtros(filtros):
+    return bool(filtros.categorias or filtros.etiquetas or filtros.rangos or filtros.disponible)
+
+
+# ---- Validación de valores ----
+
+def _decimal(valor):
+    try:
+        valor = Decimal(str(valor))
+    except (InvalidOperation, ValueError, TypeError):
+        raise ErrorMasivo('Se esperaba un número.')
+    if not valor.is_finite():
+        raise ErrorMasivo('Se esperaba un número.')
+    return valor
+
+
+def _porcentaje(valor):
+    valor = _decimal(valor)
+    if valor <= -100:
+        raise ErrorMasivo('El porcentaje debe ser mayor que -100.')
+    return valor
+
+
+def _stock(valor):
+    try:
+        valor = int(valor)
+    except (ValueError, TypeError):
+        raise ErrorMasivo('El stock debe ser un entero.')
+    if valor < 0:
+        raise ErrorMasivo('El stock no puede ser negativo.')
+    return valor
+
+
+def _categoria(valor):
+    try:
+        return Categoria.objects.values_list('pk', 'nombre').get(pk=int(valor))
+    except (ValueError, TypeError, Categoria.DoesNotExist):
+        raise ErrorMasivo('La categoría no existe.')
+
+
+def _etiquetas(valor):
+    try:
+        ids = {int(v) for v in valor}
+    except (ValueError, TypeError):
+        raise ErrorMasivo('Se esperaba una lista de ids de etiquetas.')
+    existentes = set(Etiqueta.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    if not ids or existentes != ids:
+        raise ErrorMasivo('Alguna de las etiquetas no existe.')
+    return sorted(ids)
+
+
+def _precio_maximo():
+    campo = Producto._meta.get_field('precio')
+    return Decimal(10) ** (campo.max_digits - campo.decimal_places) - Decimal(10) ** -campo.decimal_places
+
+
+def _verificar_precio(operacion, seleccion, valor):
+    # Antes del primer lote: un precio fuera de max_digits haría fallar el
+    # UPDATE de un lote con los anteriores ya confirmados
+    if operacion not in ('precio_porcentaje', 'precio_monto') or valor <= 0:
+        return
+    actual = seleccion.order_by().aggregate(maximo=Max('precio'))['maximo']
+    if actual is None:
+        return
+    if operacion == 'precio_porcentaje':
+        nuevo = (actual * (1 + valor / 100)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    else:
+        nuevo = actual + valor
+    if nuevo > _precio_maximo():
+        raise ErrorMasivo(f'El precio más alto de la selección quedaría en {nuevo}; el máximo es {_precio_maximo()}.')
+
+
+# ---- Operaciones por lote (dentro de la transacción del lote) ----
+
+def _precio_resumen(ids):
+    # El resumen copia el precio ya redondeado por la base de datos
+    precio = Producto.objects.filter(pk=OuterRef('pk')).order_by().values('precio')[:1]
+    ProductoResumen.objects.filter(pk__in=ids).update(precio=Subquery(precio))
+
+
+def _precio_porcentaje(ids, valor, referencia):
+    factor = Value(1 + valor / 100, output_field=models.DecimalField(max_digits=12, decimal_places=6))
+    Producto.objects.filter(pk__in=ids).update(
+        precio=Greatest(Round(F('precio') * factor, 2), Value(Decimal('0'))),
+        actualizado=timezone.now(),
+    )
+    _precio_resumen(ids)
+
+
+def _precio_monto(ids, valor, referencia):
+    Producto.objects.filter(pk__in=ids).update(
+        precio=Greatest(F('precio') + valor, Value(Decimal('0'))),
+        actualizado=timezone.now(),
+    )
+    _precio_resumen(ids)
+
+
+def _fijar_stock(ids, valor, referencia):
+    # El libro de movimientos guarda cada diferencia como ajuste: se leen
+    # (id, stock) bloqueando las filas del lote para que ninguna reserva
+    # concurrente se cuele entre la lectura y el UPDATE.
+    actuales = Producto.objects.select_for_update().filter(pk__in=ids).values_list('pk', 'stock')
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(producto_id=pk, tipo='ajuste', cantidad=valor - stock, referencia=referencia)
+        for pk, stock in actuales if stock != valor
+    ])
+    Producto.objects.filter(pk__in=ids).update(stock=valor, actualizado=timezone.now())
+    ProductoResumen.objects.filter(pk__in=ids).update(stock=valor)
+
+
+def _cambiar_categoria(ids, valor, referencia):
+    pk, nombre = valor
+    Producto.objects.filter(pk__in=ids).update(categoria_id=pk, actualizado=timezone.now())
+    ProductoResumen.objects.filter(pk__in=ids).update(categoria_id=pk, categoria_nombre=nombre)
+
+
+def _agregar_etiquetas(ids, valor, referencia):
+    Intermedia.objects.bulk_create(
+        [Intermedia(producto_id=p, etiqueta_id=e) for p in ids for e in valor],
+        ignore_conflicts=True,
+    )
+    Producto.objects.filter(pk__in=ids).update(actualizado=timezone.now())
+    actualizar_proyeccion(ids)
+
+
+def _quitar_etiquetas(ids, valor, referencia):
+    Intermedia.objects.filter(producto_id__in=ids, etiqueta_id__in=valor).delete()
+    Producto.objects.filter(pk__in=ids).update(actualizado=timezone.now())
+    actualizar_proyeccion(ids)
+
+
+def _relaciones_borrado():
+    """(queryset de filas dependientes por producto_id, on_delete) de cada relación hacia Producto."""
+    relaciones = [
+        (rel.related_model, rel.field.name, rel.on_delete)
+        for rel in Producto._meta.related_objects
+    ]
+    relaciones.append((Intermedia, 'producto', models.CASCADE))
+    return relaciones
+
+
+def _protegidos(ids):
+    """Cuántos de los productos tienen filas PROTECT/RESTRICT apuntándolos (una consulta por relación)."""
+    total = 0
+    for modelo, campo, on_delete in _relaciones_borrado():
+        if on_delete in (models.PROTECT, models.RESTRICT):
+            total += (
+                modelo._base_manager.filter(**{f'{campo}__in': ids})
+                .values(campo).distinct().count()
+            )
+    return total
+
+
+def _eliminar(ids, valor, referencia):
+    protegidos = _protegidos(ids)
+    if protegidos:
+        raise BorradoProtegido(protegidos)
+    # Los borrados en cascada se hacen a mano con un DELETE por tabla:
+    # QuerySet.delete() cargaría cada producto para emitir post_delete, que
+    # aquí se reemplaza por el registro de cambios del lote.
+    for modelo, campo, on_delete in _relaciones_borrado():
+        dependientes = modelo._base_manager.filter(**{f'{campo}__in': ids})
+        if on_delete is models.SET_NULL:
+            dependientes.update(**{campo: None})
+        elif on_delete is models.CASCADE:
+            dependientes._raw_delete(dependientes.db)
+    productos = Producto._base_manager.filter(pk__in=ids)
+    productos._raw_delete(productos.db)
+
+
+OPERACIONES = {
+    # nombre: (validación del valor, operación por lote, acción en el registro de cambios)
+    'precio_porcentaje': (_porcentaje, _precio_porcentaje, 'actualizar'),
+    'precio_monto': (_decimal, _precio_monto, 'actualizar'),
+    'stock': (_stock, _fijar_stock, 'actualizar'),
+    'categoria': (_categoria, _cambiar_categoria, 'actualizar'),
+    'agregar_etiquetas': (_etiquetas, _agregar_etiquetas, 'actualizar'),
+    'quitar_etiquetas': (_etiquetas, _quitar_etiquetas, 'actualizar'),
+    'eliminar': (lambda valor: None, _eliminar, 'eliminar'),
+}
+
+
+def aplicar(operacion, seleccion, valor=None, simular=False, lote=LOTE, referencia='masivo'):
+    """
+    Aplica `operacion` a los productos del queryset `seleccion` por lotes de
+    `lote` ids, cada lote en su transacción. Con `simular` solo cuenta.
+
+    Devuelve {'operacion', 'productos', 'lotes', 'simulado'} (y 'protegidos'
+    al simular un borrado). Lanza ErrorMasivo si el valor no es válido o
+    deja algún precio fuera del campo (antes de tocar ningún lote), y
+    BorradoProtegido si un lote tiene productos protegidos; los lotes
+    anteriores quedan aplicados.
+    """
+    if operacion not in OPERACIONES:
+        raise ErrorMasivo(f'Operación desconocida: {operacion}.')
+    if lote < 1:
+        raise ErrorMasivo('El tamaño de lote debe ser positivo.')
+    validar, ejecutar, accion = OPERACIONES[operacion]
+    valor = validar(valor)
+    _verificar_precio(operacion, seleccion, valor)
+
+    if simular:
+        resultado = {'operacion': operacion, 'productos': seleccion.count(), 'simulado': True}
+        resultado['lotes'] = -(-resultado['productos'] // lote)
+        if operacion == 'eliminar':
+            resultado['protegidos'] = _protegidos(seleccion.values('pk'))
+        return resultado
+
+    total = lotes = 0
+    ultimo = 0
+    seleccion = seleccion.order_by('pk').values_list('pk', flat=True)
+    while True:
+        # Por clave (pk > último): lo ya procesado no se vuelve a elegir
+        # aunque la operación lo saque o lo meta en el filtro.
+        ids = list(seleccion.filter(pk__gt=ultimo)[:lote])
+        if not ids:
+            break
+        with transaction.atomic():
+            ejecutar(ids, valor, referencia)
+            registrar_cambios('producto', ids, accion, relacionados=operacion != 'stock')
+            transaction.on_commit(lambda ids=ids: cache_detalle.invalidar(ids))
+        total += len(ids)
+        lotes += 1
+        ultimo = ids[-1]
+    return {'operacion': operacion, 'productos': total, 'lotes': lotes, 'simulado': False}
@@ -0,0 +1,105 @@
+import io
+import json
+import sys
+import time
+
+# Proceso hijo de `manage.py informe_arranque`: arranca Django desde cero,
+# como un worker recién creado, y mide cada fase hasta responder la primera
+# petición. No importa nada de Django al cargarse: la importación también se
+# mide.
+#
+#   python -m productos.medicion_arranque /ruta/ host
+#
+# Imprime un JSON con los milisegundos de cada fase y, por app, los de
+# importar su módulo, sus modelos y su ready().
+
+
+def _ms(desde):
+    return round((time.perf_counter() - desde) * 1000, 3)
+
+
+def _medir_apps(detalle):
+    """Envuelve AppConfig.create para medir cada app durante apps.populate()."""
+    from django.apps import AppConfig
+
+    crear = AppConfig.create.__func__
+
+    def medido(metodo, app, clave):
+        def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return metodo(*args, **kwargs)
+            finally:
+                detalle[app][clave] = _ms(inicio)
+        return envoltura
+
+    def create(cls, entry):
+        inicio = time.perf_counter()
+        config = crear(cls, entry)
+        detalle[config.label] = {'importar_ms': _ms(inicio)}
+        config.import_models = medido(config.import_models, config.label, 'modelos_ms')
+        config.ready = medido(config.ready, config.label, 'ready_ms')
+        return config
+
+    AppConfig.create = classmethod(create)
+
+
+def _peticion(handler, ruta, host):
+    entorno = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host, 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+    }
+    estado = []
+    cuerpo = handler(entorno, lambda status, headers, exc_info=None: estado.append(status))
+    try:
+        for _ in cuerpo:
+            pass
+    finally:
+        cuerpo.close()
+    return int(estado[0].split()[0])
+
+
+def main(ruta='/', host='localhost'):
+    fases = {}
+    apps = {}
+
+    inicio = time.perf_counter()
+    import django
+    from django.core.handlers.wsgi import WSGIHandler
+    fases['importar_django'] = _ms(inicio)
+
+    inicio = time.perf_counter()
+    from django.conf import settings
+    settings.INSTALLED_APPS
+    fases['configuracion'] = _ms(inicio)
+
+    _medir_apps(apps)
+    inicio = time.perf_counter()
+    django.setup(set_prefix=False)
+    fases['apps'] = _ms(inicio)
+
+    inicio = time.perf_counter()
+    handler = WSGIHandler()
+    fases['middleware'] = _ms(inicio)
+
+    # Lo mismo que hace wsgi.py después de crear la aplicación
+    from productos.arranque import precargar_si_corresponde
+    inicio = time.perf_counter()
+    precargar_si_corresponde()
+    fases['precarga'] = _ms(inicio)
+
+    inicio = time.perf_counter()
+    estado = _peticion(handler, ruta, host)
+    fases['primera_peticion'] = _ms(inicio)
+
+    inicio = time.perf_counter()
+    _peticion(handler, ruta, host)
+    fases['segunda_peticion'] = _ms(inicio)
+
+    json.dump({'fases': fases, 'apps': apps, 'estado': estado}, sys.stdout)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
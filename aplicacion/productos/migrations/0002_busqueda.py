@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:38
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# El índice GIN solo existe en PostgreSQL; en SQLite (tests) se registra en
+# el estado de las migraciones pero no se crea en la base de datos.
+INDICE_GIN = django.contrib.postgres.indexes.GinIndex(fields=['vector_busqueda'], name='producto_vector_gin')
+
+
+def crear_indice_gin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('productos', 'Producto'), INDICE_GIN)
+
+
+def eliminar_indice_gin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('productos', 'Producto'), INDICE_GIN)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=64)),
+                ('peso', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='vector_busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='producto',
+                    index=INDICE_GIN,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(crear_indice_gin, eliminar_indice_gin),
+            ],
+        ),
+        migrations.AddField(
+            model_name='indicebusqueda',
+            name='producto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='productos.producto'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='indicebusqueda',
+            unique_together={('termino', 'producto')},
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_resumen(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    ProductoResumen = apps.get_model('productos', 'ProductoResumen')
+    filas = []
+    for p in Producto.objects.select_related('categoria', 'detalle').prefetch_related('etiquetas').iterator(chunk_size=1000):
+        d = getattr(p, 'detalle', None)
+        filas.append(ProductoResumen(
+            producto_id=p.pk, nombre=p.nombre, descripcion=p.descripcion,
+            precio=p.precio, stock=p.stock,
+            categoria_id=p.categoria_id, categoria_nombre=p.categoria.nombre,
+            etiquetas=sorted(e.nombre for e in p.etiquetas.all()),
+            tiene_detalle=d is not None,
+            peso_kg=d.peso_kg if d else None, alto_cm=d.alto_cm if d else None,
+            ancho_cm=d.ancho_cm if d else None, largo_cm=d.largo_cm if d else None,
+        ))
+        if len(filas) >= 1000:
+            ProductoResumen.objects.bulk_create(filas)
+            filas = []
+    ProductoResumen.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoResumen',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='productos.producto')),
+                ('nombre', models.CharField(max_length=255)),
+                ('descripcion', models.TextField()),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stock', models.PositiveIntegerField(default=0)),
+                ('categoria_id', models.BigIntegerField(db_index=True)),
+                ('categoria_nombre', models.CharField(max_length=255)),
+                ('etiquetas', models.JSONField(default=list)),
+                ('tiene_detalle', models.BooleanField(default=False)),
+                ('peso_kg', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('alto_cm', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('ancho_cm', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('largo_cm', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de producto',
+                'verbose_name_plural': 'Resúmenes de productos',
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
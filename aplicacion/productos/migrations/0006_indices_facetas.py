@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_cambios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productoresumen',
+            name='categoria_id',
+            field=models.BigIntegerField(),
+        ),
+        migrations.AddIndex(
+            model_name='productoresumen',
+            index=models.Index(fields=['categoria_id', 'producto'], name='resumen_categoria_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoresumen',
+            index=models.Index(fields=['categoria_id', 'precio'], name='resumen_categoria_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoresumen',
+            index=models.Index(fields=['precio'], name='resumen_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoresumen',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['precio'], name='resumen_disponible_precio_idx'),
+        ),
+        # Tabla intermedia automática de Producto.etiquetas: índice etiqueta →
+        # producto para que los filtros y conteos por etiqueta se resuelvan
+        # solo con el índice.
+        migrations.RunSQL(
+            'CREATE INDEX productos_producto_etiquetas_etiqueta_producto_idx '
+            'ON productos_producto_etiquetas (etiqueta_id, producto_id);',
+            'DROP INDEX productos_producto_etiquetas_etiqueta_producto_idx;',
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_stock_reservas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefrescoAnalitica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_cambio', models.BigIntegerField()),
+                ('filas_escritas', models.PositiveIntegerField(default=0)),
+                ('duracion_ms', models.PositiveIntegerField(default=0)),
+                ('momento', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenCategoria',
+            fields=[
+                ('categoria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='productos.categoria')),
+                ('productos', models.PositiveIntegerField(default=0)),
+                ('unidades', models.PositiveBigIntegerField(default=0)),
+                ('valor_inventario', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('sin_stock', models.PositiveIntegerField(default=0)),
+                ('stock_bajo', models.PositiveIntegerField(default=0)),
+                ('precio_minimo', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('precio_maximo', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('rangos', models.JSONField(default=list)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Resúmenes de categorías',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenEtiqueta',
+            fields=[
+                ('etiqueta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='productos.etiqueta')),
+                ('productos', models.PositiveIntegerField(default=0)),
+                ('con_stock', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Resúmenes de etiquetas',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productoresumen',
+            index=models.Index(fields=['stock', 'producto'], name='resumen_stock_idx'),
+        ),
+    ]
@@ -1,8 +1,13 @@
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator #Valida que el precio sea mayor a 0
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 class Categoria(models.Model):
     nombre = models.CharField(max_length=255, unique=True)
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['nombre']
@@ -14,6 +19,8 @@ class Categoria(models.Model):
     
 class Etiqueta(models.Model):
     nombre = models.CharField(max_length=255, unique=True)
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['nombre']
@@ -25,7 +32,8 @@ class Producto(models.Model):
     nombre = models.CharField(max_length=255)
     descripcion = models.TextField()
     precio = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
-    stock = models.PositiveIntegerField(default=0)
+    stock = models.PositiveIntegerField(default=0)   # disponible para vender
+    reservado = models.PositiveIntegerField(default=0)  # apartado en carritos/pedidos (productos.stock)
 
     # Relaciones
     #Muchos a Uno: Varios productos a 1 categoria
@@ -35,10 +43,17 @@ class Producto(models.Model):
     #Muchos a Muchos: Varios productos a muchos etiquetas
     etiquetas = models.ManyToManyField(Etiqueta, related_name='productos', blank=True)
 
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Búsqueda full-text (solo PostgreSQL): lo mantiene productos.busqueda
+    vector_busqueda = SearchVectorField(null=True, editable=False)
+
     class Meta:
         ordering = ['nombre']
         indexes = [
-            models.Index(fields=['nombre', 'precio'])
+            models.Index(fields=['nombre', 'precio']),
+            GinIndex(fields=['vector_busqueda'], name='producto_vector_gin'),
         ]
     def __str__(self):
         return self.nombre
@@ -50,6 +65,225 @@ class DetalleProductos(models.Model):
     alto_cm = models.DecimalField(max_digits=6, decimal_places=2, null = True, blank = True, validators=[MinValueValidator(0)])
     ancho_cm = models.DecimalField(max_digits=6, decimal_places=2, null = True, blank = True, validators=[MinValueValidator(0)])
     largo_cm = models.DecimalField(max_digits=6, decimal_places=2, null = True, blank = True, validators=[MinValueValidator(0)])
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Detalles de {self.producto.nombre}"
+
+class IndiceBusqueda(models.Model):
+    # Índice invertido término → producto para el backend en Python puro
+    termino = models.CharField(max_length=64)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='terminos')
+    peso = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = [('termino', 'producto')]
+
+    def __str__(self):
+        return f"{self.termino} → {self.producto_id}"
+
+
+class MovimientoStock(models.Model):
+    # Libro de movimientos de stock: toda variación pasa por productos.stock
+    TIPOS = [
+        ('reserva', 'Reserva'),
+        ('liberacion', 'Liberación'),
+        ('confirmacion', 'Confirmación'),
+        ('ajuste', 'Ajuste'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    cantidad = models.IntegerField()  # unidades; en los ajustes, con signo
+    referencia = models.CharField(max_length=100, blank=True, db_index=True)  # pedido, carrito, usuario...
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['producto', 'creado']),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} {self.cantidad} de {self.producto_id}"
+
+
+class ProductoResumen(models.Model):
+    # Proyección desnormalizada de lectura (lista y detalle en una sola fila).
+    # La mantiene productos.proyeccion; se puede reconstruir con
+    # `manage.py reconstruir_proyeccion`.
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    nombre = models.CharField(max_length=255)
+    descripcion = models.TextField()
+    precio = models.DecimalField(max_digits=10, decimal_places=2)
+    stock = models.PositiveIntegerField(default=0)
+    categoria_id = models.BigIntegerField()
+    categoria_nombre = models.CharField(max_length=255)
+    etiquetas = models.JSONField(default=list)  # nombres, ordenados
+    tiene_detalle = models.BooleanField(default=False)
+    peso_kg = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    alto_cm = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    ancho_cm = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    largo_cm = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Resumen de producto'
+        verbose_name_plural = 'Resúmenes de productos'
+        # Índices para los filtros/facetas de lista_productos (productos.facetas)
+        indexes = [
+            models.Index(fields=['categoria_id', 'producto'], name='resumen_categoria_idx'),
+            models.Index(fields=['categoria_id', 'precio'], name='resumen_categoria_precio_idx'),
+            models.Index(fields=['precio'], name='resumen_precio_idx'),
+            models.Index(fields=['precio'], condition=models.Q(stock__gt=0), name='resumen_disponible_precio_idx'),
+            # Listado de stock bajo del tablero (productos.analitica)
+            models.Index(fields=['stock', 'producto'], name='resumen_stock_idx'),
+        ]
+
+    def __str__(self):
+        return self.nombre
+
+
+class Cambio(models.Model):
+    # Registro append-only de cambios del catálogo; el id es el cursor del
+    # feed /productos/cambios/. Los cambios de DetalleProductos y de las
+    # etiquetas de un producto se registran como cambios del producto.
+    MODELOS = [('producto', 'Producto'), ('categoria', 'Categoría'), ('etiqueta', 'Etiqueta')]
+    ACCIONES = [('crear', 'Crear'), ('actualizar', 'Actualizar'), ('eliminar', 'Eliminar')]
+
+    modelo = models.CharField(max_length=20, choices=MODELOS)
+    objeto_id = models.BigIntegerField()
+    accion = models.CharField(max_length=20, choices=ACCIONES)
+    momento = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name_plural = 'Cambios'
+
+    def __str__(self):
+        return f"{self.accion} {self.modelo} {self.objeto_id}"
+
+
+# ---- Agregados del tablero de analítica (los mantiene productos.analitica) ----
+
+class ResumenCategoria(models.Model):
+    categoria = models.OneToOneField(Categoria, on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    productos = models.PositiveIntegerField(default=0)
+    unidades = models.PositiveBigIntegerField(default=0)  # suma del stock
+    valor_inventario = models.DecimalField(max_digits=18, decimal_places=2, default=0)  # suma de precio * stock
+    sin_stock = models.PositiveIntegerField(default=0)
+    stock_bajo = models.PositiveIntegerField(default=0)  # 0 < stock <= PRODUCTOS_STOCK_BAJO
+    precio_minimo = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    precio_maximo = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    rangos = models.JSONField(default=list)  # productos por rango de precio (facetas.RANGOS_PRECIO)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Resúmenes de categorías'
+
+    def __str__(self):
+        return f"Resumen de la categoría {self.categoria_id}"
+
+
+class ResumenEtiqueta(models.Model):
+    etiqueta = models.OneToOneField(Etiqueta, on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    productos = models.PositiveIntegerField(default=0)
+    con_stock = models.PositiveIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Resúmenes de etiquetas'
+
+    def __str__(self):
+        return f"Resumen de la etiqueta {self.etiqueta_id}"
+
+
+class RefrescoAnalitica(models.Model):
+    # Una fila por refresco; la última guarda hasta qué Cambio están al día los agregados
+    ultimo_cambio = models.BigIntegerField()
+    filas_escritas = models.PositiveIntegerField(default=0)
+    duracion_ms = models.PositiveIntegerField(default=0)
+    momento = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"Refresco hasta el cambio {self.ultimo_cambio}"
+
+
+class Tarea(models.Model):
+    # Cola de tareas en segundo plano (productos.tareas). Las completadas se
+    # borran; las que agotan los reintentos quedan como 'fallida'.
+    ESTADOS = [('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('fallida', 'Fallida')]
+
+    tipo = models.CharField(max_length=50)
+    clave = models.CharField(max_length=100, blank=True)  # p. ej. id del producto
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    tomada_en = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            # Fusión: una sola pendiente por (tipo, clave)
+            models.UniqueConstraint(fields=['tipo', 'clave'], condition=models.Q(estado='pendiente'),
+                                    name='tarea_pendiente_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['estado', 'tipo', 'disponible_desde'], name='tarea_disponible_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo}:{self.clave} ({self.estado})"
+
+
+class EjecucionTarea(models.Model):
+    # Un registro por lote ejecutado: métricas de latencia de la cola
+    tipo = models.CharField(max_length=50)
+    tareas = models.PositiveIntegerField()
+    exito = models.BooleanField()
+    duracion_ms = models.PositiveIntegerField()
+    latencia_media_ms = models.PositiveIntegerField()  # desde que estaba disponible hasta que terminó
+    latencia_max_ms = models.PositiveIntegerField()
+    momento = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f"{self.tipo}: {self.tareas} tareas"
+
+
+class ProductoRelacionado(models.Model):
+    # Los productos más similares a cada uno, en orden (productos.relacionados).
+    # `relacionado` sin restricción de clave foránea: al borrar un producto sus
+    # filas quedan hasta el recálculo, que así encuentra a quién le faltará
+    # (el detalle las descarta al unirlas con ProductoResumen).
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='relacionados')
+    relacionado = models.ForeignKey(Producto, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    posicion = models.PositiveSmallIntegerField()
+    similitud = models.FloatField()
+
+    class Meta:
+        ordering = ['producto', 'posicion']
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'posicion'], name='relacionado_posicion_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} → {self.relacionado_id}"
+
+
+class CheckpointImportacion(models.Model):
+    # Última fila importada de cada archivo (productos.importacion); se guarda
+    # en la misma transacción que el lote, así reanudar no repite ni salta filas
+    archivo = models.CharField(max_length=1024, unique=True)  # ruta absoluta
+    filas = models.PositiveBigIntegerField()
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.archivo}: fila {self.filas}"
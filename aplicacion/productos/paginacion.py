@@ -0,0 +1,136 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+
+
+# Paginación por cursor (keyset): en vez de OFFSET/COUNT(*) se filtra por el
+# último valor visto de las columnas de orden, así la página 5.000 cuesta lo
+# mismo que la primera (solo recorre el índice desde el cursor).
+
+def tamano_pagina(valor):
+    """Convierte ?por_pagina= en un tamaño válido, acotado por la configuración."""
+    por_defecto = getattr(settings, 'PRODUCTOS_POR_PAGINA', 25)
+    maximo = getattr(settings, 'PRODUCTOS_POR_PAGINA_MAX', 100)
+    try:
+        tamano = int(valor)
+    except (TypeError, ValueError):
+        return por_defecto
+    return max(1, min(tamano, maximo))
+
+
+def codificar_cursor(valores):
+    crudo = json.dumps(valores, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """Devuelve la lista de valores del cursor, o None si el token no es válido."""
+    if not token:
+        return None
+    try:
+        relleno = '=' * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno))
+    except (ValueError, TypeError):
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+def _filtro_keyset(orden, valores, invertir=False):
+    # (a, b) > (va, vb)  ==>  a > va OR (a = va AND b > vb), respetando
+    # el sentido de cada columna del orden.
+    filtro = Q()
+    iguales = Q()
+    for campo, valor in zip(orden, valores):
+        descendente = campo.startswith('-')
+        nombre = campo.lstrip('-')
+        if descendente != invertir:
+            paso = Q(**{f'{nombre}__lt': valor})
+        else:
+            paso = Q(**{f'{nombre}__gt': valor})
+        filtro |= iguales & paso
+        iguales &= Q(**{nombre: valor})
+    return filtro
+
+
+def _invertir_orden(orden):
+    return [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+
+
+class PaginaCursor:
+    def __init__(self, objetos, orden, hay_siguiente, hay_anterior):
+        self.objetos = objetos
+        self.orden = orden
+        self.siguiente = self._cursor(objetos[-1]) if objetos and hay_siguiente else None
+        self.anterior = self._cursor(objetos[0]) if objetos and hay_anterior else None
+
+    def _cursor(self, obj):
+        return codificar_cursor([getattr(obj, campo.lstrip('-')) for campo in self.orden])
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+def _valores_cursor(token, orden):
+    """Valores de un cursor para `orden`; None sin token. ValueError si no es válido."""
+    if not token:
+        return None
+    valores = decodificar_cursor(token)
+    if (
+        valores is None or len(valores) != len(orden)
+        or not all(v is None or isinstance(v, (str, int, float)) for v in valores)
+    ):
+        raise ValueError('Cursor de paginación inválido.')
+    return valores
+
+
+def _consulta_pagina(queryset, after, before, tamano, orden):
+    """Devuelve (queryset recortado, hacia_atras, hay_anterior) sin evaluarlo; ValueError si un cursor no es válido."""
+    valores_after = _valores_cursor(after, orden)
+    valores_before = _valores_cursor(before, orden) if valores_after is None else None
+
+    if valores_before is not None:
+        # Hacia atrás: se recorre en orden inverso y se da vuelta el resultado.
+        qs = queryset.filter(_filtro_keyset(orden, valores_before, invertir=True))
+        return qs.order_by(*_invertir_orden(orden))[:tamano + 1], True, None
+
+    qs = queryset
+    if valores_after is not None:
+        qs = qs.filter(_filtro_keyset(orden, valores_after))
+    return qs.order_by(*orden)[:tamano + 1], False, valores_after is not None
+
+
+def _armar_pagina(filas, orden, tamano, hacia_atras, hay_anterior):
+    if hacia_atras:
+        hay_anterior = len(filas) > tamano
+        filas = filas[:tamano]
+        filas.reverse()
+        return PaginaCursor(filas, orden, hay_siguiente=True, hay_anterior=hay_anterior)
+    return PaginaCursor(filas[:tamano], orden, hay_siguiente=len(filas) > tamano,
+                        hay_anterior=hay_anterior)
+
+
+def paginar_por_cursor(queryset, after=None, before=None, tamano=25, orden=('-id',)):
+    """
+    Devuelve una PaginaCursor con a lo sumo `tamano` objetos.
+
+    `after` y `before` son tokens opacos generados por la página anterior
+    (ValueError si no lo son); el último campo de `orden` debe ser único
+    (normalmente el id) y los valores deben compararse exactamente después
+    de pasar por JSON (enteros o texto, no floats) para que el cursor sea
+    estable.
+    """
+    orden = list(orden)
+    qs, hacia_atras, hay_anterior = _consulta_pagina(queryset, after, before, tamano, orden)
+    return _armar_pagina(list(qs), orden, tamano, hacia_atras, hay_anterior)
+
+
+async def apaginar_por_cursor(queryset, after=None, before=None, tamano=25, orden=('-id',)):
+    """Versión async de paginar_por_cursor para las vistas ASGI."""
+    orden = list(orden)
+    qs, hacia_atras, hay_anterior = _consulta_pagina(queryset, after, before, tamano, orden)
+    return _armar_pagina([obj async for obj in qs], orden, tamano, hacia_atras, hay_anterior)
@@ -0,0 +1,97 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template import loader
+from django.template.backends.django import DjangoTemplates
+from django.utils.safestring import mark_safe
+
+from .cache import CacheLRU
+
+
+# Render de plantillas: tiempo medido por request y filas del listado
+# cacheadas como fragmentos.
+#
+# DjangoTemplatesMedidas es el backend de plantillas de Django con una
+# medición del tiempo de render; InstrumentacionConsultasMiddleware la
+# acumula por vista junto a las consultas (/productos/estadisticas/).
+#
+# Cada fila de productos/lista.html se guarda ya renderizada en un LRU del
+# proceso. La clave es el id del producto más una huella de los campos que
+# la fila muestra: cuando el producto cambia, cambia la huella y la fila
+# vieja simplemente deja de pedirse, sin invalidaciones.
+
+_medicion = ContextVar('productos_render', default=None)
+
+
+class MedicionRender:
+    def __init__(self):
+        self.segundos = 0.0
+        self.profundidad = 0  # los render anidados (filas, includes) ya cuentan en el exterior
+
+
+@contextmanager
+def medir_render():
+    medicion = MedicionRender()
+    token = _medicion.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _medicion.reset(token)
+
+
+class PlantillaMedida:
+    def __init__(self, plantilla):
+        self.plantilla = plantilla
+
+    def __getattr__(self, nombre):
+        return getattr(self.plantilla, nombre)
+
+    def render(self, context=None, request=None):
+        medicion = _medicion.get()
+        if medicion is None or medicion.profundidad:
+            return self.plantilla.render(context, request)
+        medicion.profundidad += 1
+        inicio = time.perf_counter()
+        try:
+            return self.plantilla.render(context, request)
+        finally:
+            medicion.segundos += time.perf_counter() - inicio
+            medicion.profundidad -= 1
+
+
+class DjangoTemplatesMedidas(DjangoTemplates):
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name))
+
+
+# ---- Fragmentos de filas del listado ----
+
+PLANTILLA_FILA = 'productos/fila.html'
+
+cache_filas = CacheLRU(getattr(settings, 'PRODUCTOS_FRAGMENTOS_LRU', 5000))
+
+
+def _clave_fila(p):
+    version = getattr(settings, 'PRODUCTOS_VERSION_PLANTILLAS', '')
+    return (version, p.pk, p.nombre, p.categoria_nombre, p.precio, p.stock)
+
+
+def filas_productos(productos):
+    """HTML de las filas del listado; solo se renderizan las que no estaban en caché."""
+    plantilla = None
+    partes = []
+    for p in productos:
+        clave = _clave_fila(p)
+        html = cache_filas.get(clave)
+        if html is None:
+            if plantilla is None:
+                plantilla = loader.get_template(PLANTILLA_FILA)
+            html = plantilla.render({'p': p})
+            cache_filas.set(clave, html)
+        partes.append(html)
+    return mark_safe(''.join(partes))
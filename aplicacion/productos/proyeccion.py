@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import Prefetch
+
+from .models import Producto, ProductoResumen, Etiqueta
+
+
+# Mantiene ProductoResumen, la proyección de lectura que usan lista_productos
+# y detalle_producto. Todas las funciones trabajan por lotes de ids para que
+# los caminos masivos puedan reutilizarlas.
+
+CAMPOS_RESUMEN = [
+    'nombre', 'descripcion', 'precio', 'stock', 'categoria_id', 'categoria_nombre',
+    'etiquetas', 'tiene_detalle', 'peso_kg', 'alto_cm', 'ancho_cm', 'largo_cm',
+]
+
+
+def _construir_resumen(p):
+    d = getattr(p, 'detalle', None)
+    return ProductoResumen(
+        producto_id=p.pk,
+        nombre=p.nombre,
+        descripcion=p.descripcion,
+        precio=p.precio,
+        stock=p.stock,
+        categoria_id=p.categoria_id,
+        categoria_nombre=p.categoria.nombre,
+        etiquetas=sorted(e.nombre for e in p.etiquetas.all()),
+        tiene_detalle=d is not None,
+        peso_kg=d.peso_kg if d else None,
+        alto_cm=d.alto_cm if d else None,
+        ancho_cm=d.ancho_cm if d else None,
+        largo_cm=d.largo_cm if d else None,
+    )
+
+
+def actualizar_proyeccion(producto_ids, lote=1000):
+    """Recalcula (upsert) el resumen de los productos indicados: 3 consultas por lote."""
+    producto_ids = list(producto_ids)
+    for i in range(0, len(producto_ids), lote):
+        ids = producto_ids[i:i + lote]
+        productos = (
+            Producto.objects
+            .filter(pk__in=ids)
+            .select_related('categoria', 'detalle')
+            .prefetch_related(Prefetch('etiquetas', queryset=Etiqueta.objects.only('nombre')))
+            .defer('vector_busqueda')
+        )
+        # Un solo INSERT ... ON CONFLICT por lote: ya es atómico, sin SAVEPOINT
+        ProductoResumen.objects.bulk_create(
+            [_construir_resumen(p) for p in productos],
+            update_conflicts=True,
+            unique_fields=['producto'],
+            update_fields=CAMPOS_RESUMEN,
+        )
+
+
+# Las señales (productos.signals) proyectan cada producto que se guarda,
+# también desde el admin o la shell. Un formulario dispara varias (producto,
+# etiquetas, detalle): dentro de proyeccion_diferida() se juntan y se
+# proyectan una sola vez al salir del bloque.
+
+_diferidos = ContextVar('proyeccion_diferida', default=None)
+
+
+@contextmanager
+def proyeccion_diferida():
+    if _diferidos.get() is not None:
+        yield  # ya hay un bloque exterior que proyectará
+        return
+    ids = set()
+    token = _diferidos.set(ids)
+    try:
+        yield
+    finally:
+        _diferidos.reset(token)
+    actualizar_proyeccion(sorted(ids))
+
+
+def proyectar(producto_ids):
+    """
+    Proyecta los productos ahora, o al salir del proyeccion_diferida() en
+    curso; devuelve True si los proyectó ahora.
+    """
+    diferidos = _diferidos.get()
+    if diferidos is not None:
+        diferidos.update(producto_ids)
+        return False
+    actualizar_proyeccion(producto_ids)
+    return True
+
+
+def renombrar_categoria(categoria):
+    # Un solo UPDATE: el nombre de la categoría es una columna plana
+    ProductoResumen.objects.filter(categoria_id=categoria.pk).update(categoria_nombre=categoria.nombre)
+
+
+def reconstruir_proyeccion(lote=1000):
+    """
+    Reescribe la proyección completa sobre las filas existentes (upsert por
+    lotes) y al final borra las que no tienen producto; devuelve cuántos
+    productos escribió. Mientras corre, la lista sigue mostrando el catálogo
+    completo.
+    """
+    total = 0
+    ultimo = 0
+    while True:
+        ids = list(
+            Producto.objects.filter(pk__gt=ultimo)
+            .order_by('pk').values_list('pk', flat=True)[:lote]
+        )
+        if not ids:
+            ProductoResumen.objects.exclude(producto__in=Producto.objects.values('pk')).delete()
+            return total
+        actualizar_proyeccion(ids, lote=lote)
+        total += len(ids)
+        ultimo = ids[-1]
@@ -0,0 +1,265 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .cache import cache_detalle
+from .models import Producto, ProductoRelacionado, ProductoResumen
+
+
+# Productos relacionados del detalle: los k más similares a cada producto,
+# precalculados fuera de las peticiones y guardados en ProductoRelacionado.
+#
+# Similitud = PESOS ponderando
+# - etiquetas: coseno entre los vectores tf-idf de etiquetas (una etiqueta
+#   rara en común pesa más que una que tiene medio catálogo),
+# - categoria: 1 si es la misma,
+# - atributos: cercanía de precio y dimensiones (logaritmo estandarizado).
+#
+# El catálogo se carga en arrays de NumPy: la matriz dispersa producto ×
+# etiqueta en formato CSR (y su traspuesta, etiqueta → productos) y una
+# matriz densa de atributos. Los vecinos se calculan por lotes de productos
+# con operaciones vectorizadas: candidatos (los de precio más cercano
+# dentro de cada una de sus etiquetas y dentro de su categoría, así que son
+# a lo sumo unos cientos por producto sea cual sea el tamaño del catálogo),
+# similitud exacta de cada par y top-k con un solo ordenamiento. Nada de
+# esto corre en los workers web: el detalle solo lee la tabla.
+#
+# Cada cambio de un producto que toca la similitud o lo que muestran las
+# listas (cambios.CAMPOS_RELACIONADOS, etiquetas, dimensiones; no el stock)
+# encola su recálculo (tarea 'recalcular_relacionados'), que también
+# recalcula a los productos que lo tenían como relacionado e invalida su
+# detalle: el nombre y el precio nuevos aparecen en sus listas cuando pasa
+# la tarea (tras PRODUCTOS_RELACIONADOS_DEMORA). Un producto nuevo aparece en las listas de
+# los demás con el recálculo completo: `manage.py calcular_relacionados`.
+
+LOTE = 1000  # productos por pasada vectorizada
+VENTANA = 15  # candidatos por precio a cada lado, en cada etiqueta y en la categoría
+PESOS = {'etiquetas': 0.6, 'categoria': 0.25, 'atributos': 0.15}
+ATRIBUTOS = ('precio', 'peso_kg', 'alto_cm', 'ancho_cm', 'largo_cm')
+
+Intermedia = Producto.etiquetas.through
+
+
+def _tramos(inicios, largos):
+    """Posiciones de los tramos [inicio, inicio + largo) concatenados y a qué tramo pertenece cada una."""
+    tramo = np.repeat(np.arange(len(largos)), largos)
+    base = np.repeat(np.cumsum(largos) - largos, largos)
+    return np.repeat(inicios, largos) + np.arange(len(tramo)) - base, tramo
+
+
+def _ventana(centro, primero, ultimo):
+    """Posiciones a ±VENTANA de cada centro dentro de [primero, ultimo], una fila por centro."""
+    desplazamientos = np.concatenate((np.arange(-VENTANA, 0), np.arange(1, VENTANA + 1)))
+    return np.clip(centro[:, None] + desplazamientos, primero[:, None], ultimo[:, None])
+
+
+def _unicos(x):
+    # np.unique de NumPy 2 usa una tabla hash para enteros: ordenar es bastante más rápido
+    x = np.sort(x)
+    return x[np.concatenate(([True], x[1:] != x[:-1]))] if len(x) else x
+
+
+def _estandarizar(x):
+    # Los valores que faltan quedan en la media (0)
+    validos = ~np.isnan(x)
+    cuenta = np.maximum(validos.sum(axis=0), 1)
+    x = np.where(validos, x, 0)
+    media = x.sum(axis=0) / cuenta
+    desvio = np.sqrt((np.where(validos, x - media, 0) ** 2).sum(axis=0) / cuenta)
+    desvio[desvio == 0] = 1
+    return np.where(validos, (x - media) / desvio, 0).astype(np.float32)
+
+
+class Catalogo:
+    """
+    Arrays del catálogo para calcular similitudes, una fila por producto en
+    orden de id. `productos`: (id, categoria_id, *ATRIBUTOS); `pares`:
+    (producto_id, etiqueta_id).
+    """
+
+    def __init__(self, productos, pares):
+        filas = sorted(productos)
+        n = len(filas)
+        self.ids = np.array([f[0] for f in filas], dtype=np.int64)
+        self.categorias = np.array([f[1] for f in filas], dtype=np.int64)
+        valores = np.array(
+            [[np.nan if v is None else float(v) for v in f[2:]] for f in filas], dtype=np.float64,
+        ).reshape(n, len(ATRIBUTOS))
+        self.atributos = _estandarizar(np.log1p(valores))
+
+        pares = np.array(list(pares), dtype=np.int64).reshape(-1, 2)
+        fila_par = self.filas(pares[:, 0], todas=True)
+        pares, fila_par = pares[fila_par >= 0], fila_par[fila_par >= 0]
+        _, codigos = np.unique(pares[:, 1], return_inverse=True)
+        self.n_etiquetas = t = max(int(codigos.max(initial=-1)) + 1, 1)
+        # CSR producto → etiquetas como claves ordenadas fila * t + etiqueta:
+        # también sirven para buscar un par (producto, etiqueta) con searchsorted
+        self.claves = _unicos(fila_par * t + codigos.reshape(-1))
+        fila_clave = self.claves // t
+        self.etiquetas = self.claves % t
+        self.indptr = np.searchsorted(fila_clave, np.arange(n + 1))
+        # Traspuesta (etiqueta → productos), cada etiqueta en orden de precio,
+        # y la posición de cada clave en ella
+        precio = self.atributos[:, 0]
+        self.frecuencia = np.bincount(self.etiquetas, minlength=t)
+        self.inicio_etiqueta = np.cumsum(self.frecuencia) - self.frecuencia
+        orden = np.lexsort((precio[fila_clave], self.etiquetas))
+        self.productos_etiqueta = fila_clave[orden]
+        self.posicion_clave = np.empty(len(orden), dtype=np.int64)
+        self.posicion_clave[orden] = np.arange(len(orden))
+        # idf² por etiqueta y norma del vector de etiquetas de cada producto
+        self.idf2 = (np.log((n + 1) / (self.frecuencia + 1)) + 1) ** 2
+        self.normas = np.sqrt(np.bincount(fila_clave, weights=self.idf2[self.etiquetas], minlength=n))
+        # Lo mismo por categoría
+        self.orden = np.lexsort((precio, self.categorias))
+        self.posicion = np.empty(n, dtype=np.int64)
+        self.posicion[self.orden] = np.arange(n)
+        categorias = self.categorias[self.orden]
+        self.inicio_categoria = np.searchsorted(categorias, self.categorias)
+        self.fin_categoria = np.searchsorted(categorias, self.categorias, side='right') - 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def filas(self, ids, todas=False):
+        """Filas de `ids`; los que no están se omiten (o quedan en -1 con `todas`)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        filas = np.minimum(np.searchsorted(self.ids, ids), max(len(self.ids) - 1, 0))
+        presentes = self.ids[filas] == ids if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        if todas:
+            return np.where(presentes, filas, -1)
+        return np.unique(filas[presentes])
+
+    def _candidatos(self, filas):
+        """Pares (origen, candidato): origen es el índice en `filas`, candidato una fila del catálogo."""
+        n = len(self)
+        # Los de precio más cercano en cada etiqueta de la fila
+        pos, origen = _tramos(self.indptr[filas], self.indptr[filas + 1] - self.indptr[filas])
+        etiquetas = self.etiquetas[pos]
+        inicio = self.inicio_etiqueta[etiquetas]
+        cercanos = self.productos_etiqueta[
+            _ventana(self.posicion_clave[pos], inicio, inicio + self.frecuencia[etiquetas] - 1)
+        ]
+        origenes = [np.repeat(origen, cercanos.shape[1])]
+        candidatos = [cercanos.reshape(-1)]
+        # Y en su categoría
+        cercanos = self.orden[_ventana(self.posicion[filas], self.inicio_categoria[filas], self.fin_categoria[filas])]
+        origenes.append(np.repeat(np.arange(len(filas)), cercanos.shape[1]))
+        candidatos.append(cercanos.reshape(-1))
+
+        # Sin repetidos (la ventana se recorta en los extremos) ni la propia fila
+        claves = _unicos(np.concatenate(origenes) * n + np.concatenate(candidatos))
+        origen, candidato = claves // n, claves % n
+        distintos = candidato != filas[origen]
+        return origen[distintos], candidato[distintos]
+
+    def similitud(self, fila, candidato):
+        """Similitud de cada par (fila[i], candidato[i])."""
+        # Producto escalar de etiquetas: cada etiqueta de la fila se busca entre las del candidato
+        pos, par = _tramos(self.indptr[fila], self.indptr[fila + 1] - self.indptr[fila])
+        etiquetas = self.etiquetas[pos]
+        buscadas = candidato[par] * self.n_etiquetas + etiquetas
+        # Buscarlas en orden recorre `claves` casi secuencialmente
+        orden = np.argsort(buscadas)
+        encontradas = np.empty(len(buscadas), dtype=np.int64)
+        encontradas[orden] = np.searchsorted(self.claves, buscadas[orden])
+        comunes = self.claves[np.minimum(encontradas, len(self.claves) - 1)] == buscadas
+        escalar = np.bincount(par, weights=comunes * self.idf2[etiquetas], minlength=len(fila))
+        normas = self.normas[fila] * self.normas[candidato]
+        coseno = np.divide(escalar, normas, out=np.zeros(len(fila)), where=normas > 0)
+
+        distancia = ((self.atributos[fila] - self.atributos[candidato]) ** 2).sum(axis=1)
+        return (
+            PESOS['etiquetas'] * coseno
+            + PESOS['categoria'] * (self.categorias[fila] == self.categorias[candidato])
+            + PESOS['atributos'] * np.exp(-distancia / self.atributos.shape[1])
+        )
+
+    def vecinos(self, filas, k):
+        """(fila, vecino, similitud, posicion) de los k vecinos de cada una de `filas`, por fila y posición."""
+        filas = np.asarray(filas, dtype=np.int64)
+        if not len(filas) or len(self) < 2:
+            vacio = np.zeros(0, dtype=np.int64)
+            return vacio, vacio, np.zeros(0), vacio
+        origen, candidato = self._candidatos(filas)
+        similitud = self.similitud(filas[origen], candidato)
+        # Top-k: un solo ordenamiento por (origen, -similitud) y el rango de
+        # cada par dentro de su origen. La similitud (entre 0 y 1) se redondea a 1e-6
+        # para formar una sola clave entera; los empates quedan por candidato
+        # (los pares llegan ordenados y el ordenamiento es estable)
+        clave = origen * 2 ** 32 + np.round((1 - similitud) * 1e6).astype(np.int64)
+        orden = np.argsort(clave, kind='stable')
+        origen_ordenado = origen[orden]
+        rango = np.arange(len(orden)) - np.searchsorted(origen_ordenado, origen_ordenado)
+        elegidos = orden[rango < k]
+        return filas[origen[elegidos]], candidato[elegidos], similitud[elegidos], rango[rango < k]
+
+
+def cargar_catalogo():
+    productos = (
+        ProductoResumen.objects.order_by()
+        .values_list('producto_id', 'categoria_id', *ATRIBUTOS).iterator(chunk_size=5000)
+    )
+    pares = Intermedia.objects.order_by().values_list('producto_id', 'etiqueta_id').iterator(chunk_size=5000)
+    return Catalogo(productos, pares)
+
+
+def _guardar(catalogo, filas, k):
+    """Reescribe las listas de `filas` que cambiaron; devuelve los ids de esos productos."""
+    fila, vecino, similitud, posicion = catalogo.vecinos(filas, k)
+    nuevas = {pk: [] for pk in catalogo.ids[filas].tolist()}
+    for pk, relacionado, valor, pos in zip(
+        catalogo.ids[fila].tolist(), catalogo.ids[vecino].tolist(), similitud.tolist(), posicion.tolist(),
+    ):
+        nuevas[pk].append((relacionado, round(valor, 4), pos))
+
+    actuales = {}
+    for pk, relacionado in (
+        ProductoRelacionado.objects.filter(producto_id__in=list(nuevas))
+        .order_by('producto_id', 'posicion').values_list('producto_id', 'relacionado_id')
+    ):
+        actuales.setdefault(pk, []).append(relacionado)
+    # Solo cuenta el orden de los relacionados: una similitud que se movió
+    # en el cuarto decimal no justifica reescribir ni invalidar el detalle
+    cambiados = [pk for pk, lista in nuevas.items() if actuales.get(pk, []) != [r[0] for r in lista]]
+    if cambiados:
+        ProductoRelacionado.objects.filter(producto_id__in=cambiados).delete()
+        ProductoRelacionado.objects.bulk_create(
+            [
+                ProductoRelacionado(producto_id=pk, relacionado_id=relacionado, posicion=pos, similitud=valor)
+                for pk in cambiados for relacionado, valor, pos in nuevas[pk]
+            ],
+            batch_size=1000,
+        )
+    return cambiados
+
+
+def calcular(ids=None, k=None, lote=LOTE):
+    """
+    Recalcula los relacionados de los productos `ids` y de los que los tienen
+    como relacionado, o de todo el catálogo si `ids` es None. Devuelve
+    cuántos productos cambiaron su lista.
+    """
+    k = k or getattr(settings, 'PRODUCTOS_RELACIONADOS_K', 6)
+    catalogo = cargar_catalogo()
+    if ids is None:
+        filas = np.arange(len(catalogo))
+        # Los que ya no están en el catálogo (p. ej. sin proyección) no tienen lista
+        ProductoRelacionado.objects.exclude(producto_id__in=ProductoResumen.objects.values('pk')).delete()
+    else:
+        ids = set(ids)
+        ids.update(
+            ProductoRelacionado.objects.filter(relacionado_id__in=ids)
+            .values_list('producto_id', flat=True).distinct()
+        )
+        filas = catalogo.filas(sorted(ids))
+
+    cambiados = []
+    for inicio in range(0, len(filas), lote):
+        with transaction.atomic():
+            cambiados += _guardar(catalogo, filas[inicio:inicio + lote], k)
+    # El detalle cachea los relacionados (nombre y precio) junto con el
+    # producto: en el recálculo incremental se invalidan también los que
+    # conservan su lista, porque un relacionado pudo cambiar de nombre o precio
+    cache_detalle.invalidar(cambiados if ids is None else sorted(ids))
+    return len(cambiados)
@@ -0,0 +1,113 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.urls import Resolver404, resolve
+
+
+# Lecturas en réplicas: EnrutamientoLecturasMiddleware elige una réplica para
+# los GET de las vistas de solo lectura (PRODUCTOS_VISTAS_REPLICA) y la deja
+# en una variable de contexto; RouterReplicas la usa para las lecturas de la
+# app productos. Todo lo demás (escrituras, sesiones, usuarios y cualquier
+# lectura fuera de esas vistas) va al primario.
+#
+# Lectura tras escritura: después de un POST/PUT/DELETE el navegador recibe
+# una cookie que lo fija al primario durante PRODUCTOS_REPLICA_RETRASO
+# segundos, así quien acaba de guardar no ve datos anteriores a su cambio
+# mientras la réplica se pone al día.
+
+COOKIE_PRIMARIO = 'productos_primario'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+_lecturas = ContextVar('productos_lecturas', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'PRODUCTOS_REPLICAS', []))
+
+
+@contextmanager
+def leer_del_primario():
+    """Fuerza las lecturas del bloque al primario (p. ej. antes de cachear)."""
+    token = _lecturas.set(None)
+    try:
+        yield
+    finally:
+        _lecturas.reset(token)
+
+
+class RouterReplicas:
+    apps_replicadas = {'productos'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.apps_replicadas:
+            return _lecturas.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplicas tienen los mismos datos
+        return True
+
+
+class EnrutamientoLecturasMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _lecturas.set(self.elegir_destino(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _lecturas.reset(token)
+        return self.fijar_primario(request, response)
+
+    async def __acall__(self, request):
+        token = _lecturas.set(self.elegir_destino(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _lecturas.reset(token)
+        return self.fijar_primario(request, response)
+
+    def elegir_destino(self, request):
+        """Alias de réplica para este request, o None si debe leer del primario."""
+        alias = replicas()
+        if not alias or request.method not in METODOS_SEGUROS:
+            return None
+        try:
+            fijado_hasta = float(request.COOKIES.get(COOKIE_PRIMARIO, 0))
+        except ValueError:
+            fijado_hasta = 0
+        if fijado_hasta > time.time():
+            return None
+        try:
+            vista = resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+        if vista not in getattr(settings, 'PRODUCTOS_VISTAS_REPLICA', ()):
+            return None
+        # La misma réplica para todas las consultas del request
+        return random.choice(alias)
+
+    def fijar_primario(self, request, response):
+        if replicas() and request.method not in METODOS_SEGUROS:
+            retraso = getattr(settings, 'PRODUCTOS_REPLICA_RETRASO', 5)
+            response.set_cookie(
+                COOKIE_PRIMARIO, str(int(time.time() + retraso)),
+                max_age=retraso, httponly=True, samesite='Lax',
+            )
+        return response
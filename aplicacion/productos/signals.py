@@ -0,0 +1,185 @@
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Producto, Categoria, Etiqueta, DetalleProductos, ProductoResumen
+from .proyeccion import actualizar_proyeccion, proyectar, renombrar_categoria
+from .cache import cache_detalle
+from .cambios import CAMPOS_RELACIONADOS, registrar_cambios
+from .stock import registrar_stock_inicial
+from .tablas import tabla_categorias, tabla_etiquetas
+from .tareas import encolar
+
+
+@receiver(post_save, sender=Producto)
+def reindexar_producto(sender, instance, raw=False, **kwargs):
+    # Mantiene al día el índice de búsqueda (tsvector o índice invertido)
+    # desde el worker de tareas; guardar varias veces el mismo producto
+    # antes de que pase el worker lo reindexa una sola vez
+    if raw:
+        return
+    encolar('indexar_busqueda', [instance.pk])
+
+
+# ---- Tablas de referencia en memoria ----
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def refrescar_tabla_categorias(sender, raw=False, **kwargs):
+    if not raw:
+        tabla_categorias.invalidar()
+
+
+@receiver(post_save, sender=Etiqueta)
+@receiver(post_delete, sender=Etiqueta)
+def refrescar_tabla_etiquetas(sender, raw=False, **kwargs):
+    if not raw:
+        tabla_etiquetas.invalidar()
+
+
+# ---- Proyección de lectura (ProductoResumen) ----
+
+@receiver(post_save, sender=Categoria)
+def proyectar_categoria(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    # El detalle cacheado no guarda el nombre (lo lee de tabla_categorias, cuya
+    # versión ya cambió): no hace falta invalidar cada producto de la categoría
+    renombrar_categoria(instance)
+
+
+@receiver(post_save, sender=Etiqueta)
+def proyectar_etiqueta(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    ids = list(instance.productos.values_list('pk', flat=True))
+    actualizar_proyeccion(ids)
+    cache_detalle.invalidar(ids)
+
+
+@receiver(pre_delete, sender=Etiqueta)
+def recordar_productos_etiqueta(sender, instance, **kwargs):
+    # Tras el borrado ya no quedan filas en la tabla intermedia
+    instance._productos_afectados = list(instance.productos.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Etiqueta)
+def proyectar_etiqueta_eliminada(sender, instance, **kwargs):
+    ids = getattr(instance, '_productos_afectados', [])
+    actualizar_proyeccion(ids)
+    cache_detalle.invalidar(ids)
+
+
+# Cualquier guardado de un producto, su detalle o sus etiquetas (vistas,
+# admin, shell) vuelve a proyectarlo e invalida su detalle cacheado. Las
+# vistas lo agrupan con proyeccion_diferida() e invalidan al confirmar.
+
+def _proyectar_productos(ids):
+    ids = list(ids)
+    if ids and proyectar(ids):
+        cache_detalle.invalidar(ids)
+
+
+@receiver(post_save, sender=Producto)
+def proyectar_producto(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _proyectar_productos([instance.pk])
+
+
+@receiver(post_save, sender=DetalleProductos)
+def proyectar_detalle(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _proyectar_productos([instance.producto_id])
+
+
+@receiver(post_delete, sender=DetalleProductos)
+def proyectar_detalle_eliminado(sender, instance, **kwargs):
+    # Un UPDATE directo y no proyectar(): si se está borrando el producto,
+    # volver a crear su resumen dejaría una fila huérfana
+    ProductoResumen.objects.filter(pk=instance.producto_id).update(
+        tiene_detalle=False, peso_kg=None, alto_cm=None, ancho_cm=None, largo_cm=None,
+    )
+    cache_detalle.invalidar([instance.producto_id])
+
+
+@receiver(m2m_changed, sender=Producto.etiquetas.through)
+def proyectar_etiquetas_producto(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # etiqueta.productos.clear(): post_clear no informa qué productos perdió
+        instance._productos_afectados = list(instance.productos.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _proyectar_productos([instance.pk])
+    elif pk_set:
+        _proyectar_productos(pk_set)
+    elif action == 'post_clear':
+        _proyectar_productos(getattr(instance, '_productos_afectados', []))
+
+
+# ---- Registro de cambios (feed /productos/cambios/) ----
+
+def _modelo_cambio(sender):
+    return {Producto: 'producto', Categoria: 'categoria', Etiqueta: 'etiqueta'}[sender]
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Etiqueta)
+def registrar_guardado(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Con update_fields se sabe qué cambió: guardar solo el stock no recalcula relacionados
+    relacionados = update_fields is None or not CAMPOS_RELACIONADOS.isdisjoint(update_fields)
+    registrar_cambios(
+        _modelo_cambio(sender), [instance.pk], 'crear' if created else 'actualizar', relacionados=relacionados,
+    )
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Etiqueta)
+def registrar_eliminacion(sender, instance, **kwargs):
+    registrar_cambios(_modelo_cambio(sender), [instance.pk], 'eliminar')
+    if sender is Etiqueta:
+        # El borrado en cascada de la tabla intermedia no emite m2m_changed
+        ids = getattr(instance, '_productos_afectados', [])
+        Producto.objects.filter(pk__in=ids).update(actualizado=timezone.now())
+        registrar_cambios('producto', ids, 'actualizar')
+
+
+@receiver(post_save, sender=DetalleProductos)
+def registrar_detalle(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Las dimensiones cuentan para la similitud; un detalle nuevo sin ninguna, no
+    dimensiones = (instance.peso_kg, instance.alto_cm, instance.ancho_cm, instance.largo_cm)
+    relacionados = not created or any(v is not None for v in dimensiones)
+    registrar_cambios('producto', [instance.producto_id], 'actualizar', relacionados=relacionados)
+
+
+@receiver(m2m_changed, sender=Producto.etiquetas.through)
+def registrar_etiquetas_producto(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        ids = [instance.pk]
+    elif pk_set:
+        ids = list(pk_set)
+    else:
+        ids = getattr(instance, '_productos_afectados', [])
+    if not ids:
+        return
+    # Las etiquetas son parte del producto: también cuenta para updated_since
+    Producto.objects.filter(pk__in=ids).update(actualizado=timezone.now())
+    registrar_cambios('producto', ids, 'actualizar')
+
+
+# ---- Libro de stock ----
+
+@receiver(post_save, sender=Producto)
+def stock_inicial(sender, instance, created, raw=False, **kwargs):
+    # Después, cada variación la registra productos.stock
+    if created and not raw:
+        registrar_stock_inicial([instance])
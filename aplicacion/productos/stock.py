@@ -0,0 +1,129 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Producto, ProductoResumen, MovimientoStock
+from .cache import cache_detalle
+from .cambios import registrar_cambios
+
+
+# Operaciones de stock sin lectura-modificación-escritura: cada una es un
+# UPDATE condicional con F() que la base de datos resuelve de forma atómica,
+# así dos operaciones concurrentes sobre el mismo producto nunca se pisan ni
+# dejan el stock en negativo.
+#
+#   reservar:   stock -= n, reservado += n   (si stock >= n)
+#   liberar:    stock += n, reservado -= n   (si reservado >= n)
+#   confirmar:  reservado -= n               (si reservado >= n; venta hecha)
+#   ajustar:    stock += delta               (si el resultado no queda negativo)
+#
+# El stock con que se crea o importa un producto entra al libro como un
+# ajuste inicial (registrar_stock_inicial): la suma de los movimientos de un
+# producto siempre coincide con su stock.
+
+
+class ErrorStock(Exception):
+    def __init__(self, producto_id, cantidad, mensaje):
+        super().__init__(mensaje)
+        self.producto_id = producto_id
+        self.cantidad = cantidad
+
+
+class StockInsuficiente(ErrorStock):
+    def __init__(self, producto_id, cantidad):
+        super().__init__(producto_id, cantidad, f'Stock insuficiente para el producto {producto_id}.')
+
+
+class ReservaInsuficiente(ErrorStock):
+    def __init__(self, producto_id, cantidad):
+        super().__init__(producto_id, cantidad, f'No hay {cantidad} unidades reservadas del producto {producto_id}.')
+
+
+OPERACIONES = {
+    # tipo: (condición, cambios en stock, cambios en reservado, error)
+    'reserva': ('stock', -1, +1, StockInsuficiente),
+    'liberacion': ('reservado', +1, -1, ReservaInsuficiente),
+    'confirmacion': ('reservado', 0, -1, ReservaInsuficiente),
+}
+
+
+def _mover(producto_id, cantidad, tipo, referencia):
+    if cantidad <= 0:
+        raise ValueError('La cantidad debe ser positiva.')
+    campo, signo_stock, signo_reservado, error = OPERACIONES[tipo]
+    cambios = {'actualizado': timezone.now()}
+    if signo_stock:
+        cambios['stock'] = F('stock') + signo_stock * cantidad
+    if signo_reservado:
+        cambios['reservado'] = F('reservado') + signo_reservado * cantidad
+    filas = Producto.objects.filter(pk=producto_id, **{f'{campo}__gte': cantidad}).update(**cambios)
+    if not filas:
+        raise error(producto_id, cantidad)
+    if signo_stock:
+        ProductoResumen.objects.filter(pk=producto_id).update(stock=F('stock') + signo_stock * cantidad)
+    return MovimientoStock(producto_id=producto_id, tipo=tipo, cantidad=cantidad, referencia=referencia)
+
+
+def _despues_de_confirmar(ids):
+    ids = list(ids)
+    transaction.on_commit(lambda: cache_detalle.invalidar(ids))
+    # El stock no cuenta para la similitud: sin recálculo de relacionados
+    registrar_cambios('producto', ids, 'actualizar', relacionados=False)
+
+
+def procesar_lote(tipo, items, referencia=''):
+    """
+    Aplica `tipo` a todos los items [(producto_id, cantidad), ...] en una sola
+    transacción: o se aplican todos o ninguno (se relanza el ErrorStock).
+    """
+    agrupados = {}
+    for producto_id, cantidad in items:
+        agrupados[producto_id] = agrupados.get(producto_id, 0) + cantidad
+    with transaction.atomic():
+        # Orden fijo por id: dos carritos con los mismos productos bloquean
+        # las filas en el mismo orden y no se producen interbloqueos.
+        movimientos = [
+            _mover(producto_id, cantidad, tipo, referencia)
+            for producto_id, cantidad in sorted(agrupados.items())
+        ]
+        MovimientoStock.objects.bulk_create(movimientos)
+        _despues_de_confirmar(agrupados)
+    return movimientos
+
+
+def reservar(producto_id, cantidad, referencia=''):
+    return procesar_lote('reserva', [(producto_id, cantidad)], referencia)[0]
+
+
+def liberar(producto_id, cantidad, referencia=''):
+    return procesar_lote('liberacion', [(producto_id, cantidad)], referencia)[0]
+
+
+def confirmar(producto_id, cantidad, referencia=''):
+    return procesar_lote('confirmacion', [(producto_id, cantidad)], referencia)[0]
+
+
+def ajustar(producto_id, delta, referencia=''):
+    """Suma `delta` (positivo o negativo) al stock disponible sin bajar de cero."""
+    if not delta:
+        return None
+    with transaction.atomic():
+        qs = Producto.objects.filter(pk=producto_id)
+        if delta < 0:
+            qs = qs.filter(stock__gte=-delta)
+        if not qs.update(stock=F('stock') + delta, actualizado=timezone.now()):
+            raise StockInsuficiente(producto_id, -delta)
+        ProductoResumen.objects.filter(pk=producto_id).update(stock=F('stock') + delta)
+        movimiento = MovimientoStock.objects.create(
+            producto_id=producto_id, tipo='ajuste', cantidad=delta, referencia=referencia,
+        )
+        _despues_de_confirmar([producto_id])
+    return movimiento
+
+
+def registrar_stock_inicial(productos, referencia='stock inicial'):
+    """Un ajuste por cada producto recién creado con stock; sin tocar Producto (ya lo tiene)."""
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(producto_id=p.pk, tipo='ajuste', cantidad=p.stock, referencia=referencia)
+        for p in productos if p.stock > 0
+    ])
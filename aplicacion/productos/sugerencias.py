@@ -0,0 +1,273 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.urls import reverse
+
+from .busqueda import obtener_backend, tokenizar
+from .cambios import leer_feed, posicion_feed
+from .models import Producto
+from .routers import leer_del_primario
+from .tablas import tabla_categorias, tabla_etiquetas
+
+
+# Sugerencias mientras se escribe en el buscador (/productos/sugerencias/?q=).
+#
+# Cada palabra del nombre (normalizada con busqueda.tokenizar) es un término
+# de un vocabulario ordenado; un prefijo se resuelve con dos bisect sobre el
+# vocabulario y cada término apunta a un array ordenado de ids. La primera
+# petición del proceso carga los productos; después el índice se mantiene
+# siguiendo el registro de cambios (como cualquier otro consumidor del feed)
+# cada PRODUCTOS_SUGERENCIAS_SINCRONIZACION segundos, sin recargar todo.
+# Categorías y etiquetas usan el mismo índice, rehecho cuando cambian sus
+# tablas de referencia.
+#
+# Mientras el índice de productos no está cargado (o con
+# PRODUCTOS_SUGERENCIAS_EN_MEMORIA = False) se consulta el índice de búsqueda
+# de la base de datos.
+
+FIN = '\uffff'
+
+
+class IndicePrefijos:
+    def __init__(self, filas=()):
+        self.nombres = {}
+        self.ids = {}  # término → array ordenado de ids
+        self.terminos = []  # ordenado, para bisect
+        for pk, nombre in filas:
+            self.nombres[pk] = nombre
+            for t in set(tokenizar(nombre)):
+                self.ids.setdefault(t, []).append(pk)
+        self.ids = {t: array('q', sorted(ids)) for t, ids in self.ids.items()}
+        self.terminos = sorted(self.ids)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def poner(self, pk, nombre):
+        anterior = self.nombres.get(pk)
+        if anterior == nombre:
+            return
+        if anterior is not None:
+            self.quitar(pk)
+        self.nombres[pk] = nombre
+        for t in set(tokenizar(nombre)):
+            ids = self.ids.get(t)
+            if ids is None:
+                ids = self.ids[t] = array('q')
+                insort(self.terminos, t)
+            i = bisect_left(ids, pk)
+            if i == len(ids) or ids[i] != pk:
+                ids.insert(i, pk)
+
+    def quitar(self, pk):
+        nombre = self.nombres.pop(pk, None)
+        if nombre is None:
+            return
+        for t in set(tokenizar(nombre)):
+            ids = self.ids.get(t)
+            if ids is None:
+                continue
+            i = bisect_left(ids, pk)
+            if i < len(ids) and ids[i] == pk:
+                del ids[i]
+            if not ids:
+                del self.ids[t]
+                del self.terminos[bisect_left(self.terminos, t)]
+
+    def _rango(self, prefijo):
+        inicio = bisect_left(self.terminos, prefijo)
+        return self.terminos[inicio:bisect_left(self.terminos, prefijo + FIN, inicio)]
+
+    def _candidatos(self, terminos, tope):
+        """Ids con alguno de `terminos`; None en cuanto pasan de `tope`."""
+        total = 0
+        for t in terminos:
+            total += len(self.ids.get(t, ()))
+            if total > tope:
+                return None
+        return total
+
+    def buscar(self, q, limite=8, escaneo=1000):
+        """
+        [(id, nombre), ...] con un término que empiece por cada palabra de
+        `q`, por término y luego por id. Revisa a lo sumo `escaneo` candidatos.
+        """
+        prefijos = list(dict.fromkeys(tokenizar(q)))
+        if not prefijos:
+            return []
+        rangos = sorted(((p, self._rango(p)) for p in prefijos), key=lambda r: len(r[1]))
+        if not rangos[0][1]:
+            return []
+        # Los candidatos salen del prefijo con menos ids (cada término tiene
+        # al menos uno, así que los rangos con más términos que el mejor ni
+        # se cuentan)
+        principal, mejor = rangos[0], self._candidatos(rangos[0][1], float('inf'))
+        for rango in rangos[1:]:
+            if len(rango[1]) >= mejor:
+                break
+            n = self._candidatos(rango[1], mejor)
+            if n is not None and n < mejor:
+                principal, mejor = rango, n
+        # El resto se comprueba por candidato: un prefijo de un solo término,
+        # con bisect en su array de ids; de pocos términos, en cualquiera de
+        # sus arrays; de muchos (un prefijo corto), en las palabras del nombre
+        requeridos = []
+        alternativos = []
+        por_nombre = []
+        for rango in rangos:
+            prefijo, terminos = rango
+            if rango is principal:
+                continue
+            if len(terminos) == 1:
+                requeridos.append(self.ids.get(terminos[0], ()))
+            elif len(terminos) <= 8:
+                alternativos.append([self.ids.get(t, ()) for t in terminos])
+            else:
+                por_nombre.append(prefijo)
+
+        resultados = []
+        vistos = set()
+        # .get(): otro hilo puede estar aplicando cambios mientras se recorre
+        for t in principal[1]:
+            for pk in self.ids.get(t, ()):
+                if pk in vistos:
+                    continue
+                if len(vistos) >= escaneo:
+                    return resultados
+                vistos.add(pk)
+                for ids in requeridos:
+                    i = bisect_left(ids, pk)
+                    if i == len(ids) or ids[i] != pk:
+                        break
+                else:
+                    if not all(any(_contiene(ids, pk) for ids in arrays) for arrays in alternativos):
+                        continue
+                    nombre = self.nombres.get(pk)
+                    if nombre is None:
+                        continue
+                    if por_nombre:
+                        palabras = tokenizar(nombre)
+                        if not all(any(w.startswith(p) for w in palabras) for p in por_nombre):
+                            continue
+                    resultados.append((pk, nombre))
+                    if len(resultados) == limite:
+                        return resultados
+        return resultados
+
+
+def _contiene(ids, pk):
+    i = bisect_left(ids, pk)
+    return i < len(ids) and ids[i] == pk
+
+
+class IndiceProductos:
+    """IndicePrefijos de Producto.nombre compartido por los hilos del proceso, al día con el feed."""
+
+    def __init__(self):
+        self.indice = None
+        self.token = None
+        self.sincronizado = 0.0
+        self._cerrojo = threading.Lock()
+
+    def limpiar(self):
+        with self._cerrojo:
+            self.indice = None
+            self.token = None
+
+    def cargar(self):
+        # Primero la posición del feed: lo que cambie durante la carga se
+        # vuelve a aplicar en la siguiente sincronización
+        with leer_del_primario():
+            token = posicion_feed()
+            filas = Producto.objects.order_by().values_list('pk', 'nombre').iterator(chunk_size=5000)
+            indice = IndicePrefijos(filas)
+        self.indice, self.token, self.sincronizado = indice, token, time.monotonic()
+        return indice
+
+    def sincronizar(self):
+        ids = set()
+        while True:
+            with leer_del_primario():
+                cambios, self.token, hay_mas = leer_feed(self.token, limite=5000)
+            ids.update(c.objeto_id for c in cambios if c.modelo == 'producto')
+            if not hay_mas:
+                break
+        self.sincronizado = time.monotonic()
+        if not ids:
+            return
+        with leer_del_primario():
+            nombres = dict(Producto.objects.filter(pk__in=ids).values_list('pk', 'nombre'))
+        for pk in ids:
+            if pk in nombres:
+                self.indice.poner(pk, nombres[pk])
+            else:
+                self.indice.quitar(pk)
+
+    def obtener(self):
+        """El índice al día, o None si otro hilo lo está cargando."""
+        intervalo = getattr(settings, 'PRODUCTOS_SUGERENCIAS_SINCRONIZACION', 5)
+        if self.indice is not None and time.monotonic() - self.sincronizado < intervalo:
+            return self.indice
+        # Un solo hilo carga o sincroniza; los demás no esperan: usan el
+        # índice como está, o la base de datos si aún no hay índice
+        if not self._cerrojo.acquire(blocking=False):
+            return self.indice
+        try:
+            if self.indice is None:
+                self.cargar()
+            else:
+                self.sincronizar()
+            return self.indice
+        finally:
+            self._cerrojo.release()
+
+
+indice_productos = IndiceProductos()
+
+_indices_referencia = {}
+
+
+def _indice_referencia(tabla):
+    # Se rehace cuando la tabla recarga sus filas (otra lista)
+    filas = tabla.filas()
+    cargado = _indices_referencia.get(tabla.clave_version)
+    if cargado is None or cargado[0] is not filas:
+        cargado = _indices_referencia[tabla.clave_version] = (filas, IndicePrefijos(filas))
+    return cargado[1]
+
+
+def _productos_bd(q, limite):
+    productos = obtener_backend().sugerir(Producto.objects.all(), q)
+    return list(productos.order_by('nombre', 'pk').values_list('pk', 'nombre')[:limite])
+
+
+def sugerir(q, limite=8):
+    """Sugerencias para `q`: {'productos', 'categorias', 'etiquetas', 'fuente'}."""
+    indice = None
+    if getattr(settings, 'PRODUCTOS_SUGERENCIAS_EN_MEMORIA', True):
+        indice = indice_productos.obtener()
+    escaneo = getattr(settings, 'PRODUCTOS_SUGERENCIAS_ESCANEO', 1000)
+    if indice is not None:
+        productos = indice.buscar(q, limite, escaneo)
+    else:
+        productos = _productos_bd(q, limite)
+
+    lista = reverse('lista_productos')
+    return {
+        'productos': [
+            {'id': pk, 'nombre': nombre, 'url': reverse('detalle_producto', args=[pk])}
+            for pk, nombre in productos
+        ],
+        'categorias': [
+            {'id': pk, 'nombre': nombre, 'url': f'{lista}?categoria={pk}'}
+            for pk, nombre in _indice_referencia(tabla_categorias).buscar(q, limite, escaneo)
+        ],
+        'etiquetas': [
+            {'id': pk, 'nombre': nombre, 'url': f'{lista}?etiqueta={pk}'}
+            for pk, nombre in _indice_referencia(tabla_etiquetas).buscar(q, limite, escaneo)
+        ],
+        'fuente': 'memoria' if indice is not None else 'bd',
+    }
@@ -0,0 +1,96 @@
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Categoria, Etiqueta
+from .routers import leer_del_primario
+
+
+# Tablas de referencia en memoria del proceso para Categoria y Etiqueta:
+# son chicas y cambian poco, pero se leen en casi todas las páginas (facetas,
+# desplegables de ProductoForm, listados). Cada tabla guarda sus filas junto
+# con un token de versión que vive en la caché compartida; las señales de
+# guardado/borrado cambian el token y todos los procesos recargan en la
+# siguiente lectura.
+
+Fila = namedtuple('Fila', ['id', 'nombre'])
+
+
+class TablaReferencia:
+    def __init__(self, modelo, nombre, alias=None):
+        self.modelo = modelo
+        self.clave_version = f'tabla:{nombre}:v'
+        self.alias = alias or getattr(settings, 'PRODUCTOS_CACHE_ALIAS', 'default')
+        self._cargada = None  # (version, filas ordenadas por nombre, {id: nombre})
+
+    @property
+    def compartida(self):
+        return caches[self.alias]
+
+    def _consulta(self):
+        return self.modelo.objects.order_by('nombre').values_list('pk', 'nombre')
+
+    def _guardar(self, version, filas):
+        filas = [Fila(*f) for f in filas]
+        self._cargada = (version, filas, dict(filas))
+        return self._cargada
+
+    def _vigente(self):
+        version = self.compartida.get(self.clave_version)
+        if version is None:
+            self.compartida.add(self.clave_version, time.time_ns())
+            version = self.compartida.get(self.clave_version)
+        if self._cargada is not None and self._cargada[0] == version:
+            return self._cargada
+        # Del primario: una réplica atrasada quedaría guardada con la versión nueva
+        with leer_del_primario():
+            return self._guardar(version, list(self._consulta()))
+
+    async def _avigente(self):
+        version = await self.compartida.aget(self.clave_version)
+        if version is None:
+            await self.compartida.aadd(self.clave_version, time.time_ns())
+            version = await self.compartida.aget(self.clave_version)
+        if self._cargada is not None and self._cargada[0] == version:
+            return self._cargada
+        with leer_del_primario():
+            return self._guardar(version, [f async for f in self._consulta()])
+
+    async def aversion(self):
+        """Token de versión vigente (cambia con cada guardado o borrado)."""
+        return (await self._avigente())[0]
+
+    def filas(self):
+        """[Fila(id, nombre), ...] ordenadas por nombre."""
+        return self._vigente()[1]
+
+    async def afilas(self):
+        return (await self._avigente())[1]
+
+    def nombres(self):
+        """{id: nombre}"""
+        return self._vigente()[2]
+
+    async def anombres(self):
+        return (await self._avigente())[2]
+
+    def opciones(self):
+        """Choices para un campo de formulario: [(id, nombre), ...]."""
+        return [tuple(f) for f in self.filas()]
+
+    def invalidar(self):
+        # Este proceso recarga en la próxima lectura; los demás, cuando cambie
+        # el token, que se cambia al confirmar la transacción: si otro proceso
+        # recargara antes, leería los datos viejos y los guardaría con el
+        # token nuevo.
+        self._cargada = None
+        transaction.on_commit(
+            lambda: self.compartida.set(self.clave_version, time.time_ns())
+        )
+
+
+tabla_categorias = TablaReferencia(Categoria, 'categorias')
+tabla_etiquetas = TablaReferencia(Etiqueta, 'etiquetas')
@@ -0,0 +1,255 @@
+import logging
+import random
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .analitica import refrescar
+from .busqueda import obtener_backend
+from .models import EjecucionTarea, Producto, Tarea
+
+
+# Cola de tareas en segundo plano guardada en la base de datos: sin broker
+# externo, la procesa `manage.py procesar_tareas`.
+#
+# - Se encola dentro de la transacción de la escritura: si la escritura se
+#   revierte, la tarea también desaparece.
+# - Fusión: solo puede haber una tarea pendiente por (tipo, clave); encolar
+#   otra vez la misma es un INSERT ignorado.
+# - Lotes: el worker toma hasta `lote` tareas del mismo tipo y llama al
+#   manejador una sola vez con todas sus claves.
+# - Reintentos: si el manejador falla, el lote vuelve a la cola con espera
+#   exponencial; tras `reintentos` fallos queda como 'fallida'.
+#
+# Sin un worker en marcha las tareas se quedan en la cola: los productos
+# nuevos no aparecen en la búsqueda ni en los relacionados, y la analítica no
+# se refresca. Con PRODUCTOS_TAREAS_INMEDIATAS se ejecutan al confirmar la
+# transacción, en el mismo proceso (lo que hace settings.py, para desarrollo
+# sin worker; settings_produccion.py usa la cola); si una falla se registra
+# en el log y la petición sigue, sin reintentos.
+
+logger = logging.getLogger('productos.tareas')
+
+TipoTarea = namedtuple('TipoTarea', ['funcion', 'lote', 'reintentos'])
+
+_tipos = {}
+
+
+def tarea(tipo, lote=100, reintentos=5):
+    """Registra `funcion(claves)` como manejador de las tareas `tipo`."""
+    def decorador(funcion):
+        _tipos[tipo] = TipoTarea(funcion, lote, reintentos)
+        return funcion
+    return decorador
+
+
+def tipos():
+    return sorted(_tipos)
+
+
+def _inmediatas():
+    return getattr(settings, 'PRODUCTOS_TAREAS_INMEDIATAS', False)
+
+
+def encolar(tipo, claves=('',), demora=0):
+    """Encola una tarea `tipo` por cada clave; las que ya estaban pendientes se fusionan."""
+    if tipo not in _tipos:
+        raise KeyError(f'Tipo de tarea desconocido: {tipo}')
+    claves = [str(c) for c in claves]
+    if not claves:
+        return
+    if _inmediatas():
+        transaction.on_commit(lambda: _ejecutar_inmediata(tipo, claves))
+        return
+    disponible = timezone.now() + timedelta(seconds=demora)
+    Tarea.objects.bulk_create(
+        [Tarea(tipo=tipo, clave=c, disponible_desde=disponible) for c in dict.fromkeys(claves)],
+        ignore_conflicts=True,
+    )
+
+
+def _ejecutar_inmediata(tipo, claves):
+    # La escritura ya se confirmó: un fallo del derivado no convierte la
+    # respuesta en un 500
+    try:
+        _tipos[tipo].funcion(claves)
+    except Exception:
+        logger.exception('Falló la tarea inmediata %s (%d claves)', tipo, len(claves))
+
+
+# ---- Worker ----
+
+def _espera_reintento(intentos):
+    base = getattr(settings, 'PRODUCTOS_TAREAS_ESPERA_BASE', 2)
+    espera = min(base * 2 ** (intentos - 1), getattr(settings, 'PRODUCTOS_TAREAS_ESPERA_MAX', 300))
+    return espera * random.uniform(1, 1.1)  # algo de dispersión entre tareas que fallaron juntas
+
+
+def _descartar_duplicadas(tareas):
+    """
+    Borra de `tareas` (queryset) las que ya tienen otra pendiente con la misma
+    (tipo, clave): esa hará el trabajo, y devolverlas a la cola violaría la
+    unicidad de las pendientes.
+    """
+    for tipo in set(tareas.values_list('tipo', flat=True)):
+        pendientes = Tarea.objects.filter(estado='pendiente', tipo=tipo).values('clave')
+        tareas.filter(tipo=tipo, clave__in=pendientes).delete()
+
+
+def recuperar_vencidas():
+    """Devuelve a la cola las tareas 'en_curso' de un worker que murió sin terminarlas."""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'PRODUCTOS_TAREAS_VENCIMIENTO', 300))
+    with transaction.atomic():
+        vencidas = Tarea.objects.filter(estado='en_curso', tomada_en__lt=limite)
+        if not vencidas.exists():
+            return 0
+        _descartar_duplicadas(vencidas)
+        return vencidas.update(estado='pendiente', tomada_en=None)
+
+
+def _tomar(tipo, lote):
+    ahora = timezone.now()
+    with transaction.atomic():
+        # En PostgreSQL varios workers no toman las mismas filas (SKIP LOCKED)
+        tareas = list(
+            Tarea.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente', tipo=tipo, disponible_desde__lte=ahora)
+            .order_by('disponible_desde', 'pk')
+            .values_list('pk', 'clave', 'intentos', 'disponible_desde')[:lote]
+        )
+        if tareas:
+            Tarea.objects.filter(pk__in=[t[0] for t in tareas]).update(estado='en_curso', tomada_en=ahora)
+    return tareas
+
+
+def _fallo(tipo, tareas, exc):
+    definicion = _tipos[tipo]
+    ids = [t[0] for t in tareas]
+    intentos = max(t[2] for t in tareas) + 1
+    logger.warning('Falló un lote de %d tareas %s (intento %d): %s', len(ids), tipo, intentos, exc)
+    with transaction.atomic():
+        lote = Tarea.objects.filter(pk__in=ids)
+        if intentos >= definicion.reintentos:
+            lote.update(estado='fallida', intentos=intentos, error=repr(exc)[:2000], tomada_en=None)
+            return
+        _descartar_duplicadas(lote)
+        lote.update(
+            estado='pendiente', intentos=intentos, error=repr(exc)[:2000], tomada_en=None,
+            disponible_desde=timezone.now() + timedelta(seconds=_espera_reintento(intentos)),
+        )
+
+
+def ejecutar_lote(tipo):
+    """Toma y ejecuta un lote de tareas `tipo`; devuelve cuántas tomó."""
+    definicion = _tipos[tipo]
+    tareas = _tomar(tipo, definicion.lote)
+    if not tareas:
+        return 0
+    inicio = time.perf_counter()
+    exito = True
+    try:
+        definicion.funcion([t[1] for t in tareas])
+    except Exception as exc:
+        exito = False
+        _fallo(tipo, tareas, exc)
+    else:
+        Tarea.objects.filter(pk__in=[t[0] for t in tareas]).delete()
+
+    # Latencia: desde que la tarea quedó disponible (tras su demora o su
+    # espera de reintento) hasta que terminó
+    ahora = timezone.now()
+    latencias = [(ahora - t[3]).total_seconds() * 1000 for t in tareas]
+    EjecucionTarea.objects.create(
+        tipo=tipo, tareas=len(tareas), exito=exito,
+        duracion_ms=round((time.perf_counter() - inicio) * 1000),
+        latencia_media_ms=round(sum(latencias) / len(latencias)),
+        latencia_max_ms=round(max(latencias)),
+    )
+    return len(tareas)
+
+
+def procesar_pendientes(tipos=None):
+    """Ejecuta lotes hasta que no quede ninguna tarea disponible; devuelve cuántas procesó."""
+    total = 0
+    while True:
+        procesadas = sum(ejecutar_lote(tipo) for tipo in (tipos or sorted(_tipos)))
+        if not procesadas:
+            return total
+        total += procesadas
+
+
+def purgar_ejecuciones():
+    dias = getattr(settings, 'PRODUCTOS_TAREAS_HISTORIA_DIAS', 7)
+    EjecucionTarea.objects.filter(momento__lt=timezone.now() - timedelta(days=dias)).delete()
+
+
+# ---- Métricas ----
+
+def metricas(ventana=3600):
+    """Profundidad de la cola por tipo y estado, y latencia de las tareas en la última `ventana`."""
+    profundidad = {}
+    for tipo, estado, n, mas_antigua in (
+        Tarea.objects.order_by().values_list('tipo', 'estado')
+        .annotate(n=Count('pk'), mas_antigua=Min('creado'))
+    ):
+        d = profundidad.setdefault(tipo, {'pendiente': 0, 'en_curso': 0, 'fallida': 0, 'antiguedad_s': 0})
+        d[estado] = n
+        if estado == 'pendiente':
+            d['antiguedad_s'] = round((timezone.now() - mas_antigua).total_seconds(), 1)
+
+    recientes = {}
+    desde = timezone.now() - timedelta(seconds=ventana)
+    for fila in (
+        EjecucionTarea.objects.filter(momento__gte=desde).order_by().values('tipo')
+        .annotate(
+            lotes=Count('pk'), total=Sum('tareas'), fallos=Count('pk', filter=Q(exito=False)),
+            latencia_ponderada=Sum(F('latencia_media_ms') * F('tareas')), latencia_max_ms=Max('latencia_max_ms'),
+            duracion_max_ms=Max('duracion_ms'),
+        )
+    ):
+        tipo = fila.pop('tipo')
+        fila['tareas'] = fila.pop('total')
+        ponderada = fila.pop('latencia_ponderada') or 0
+        fila['latencia_media_ms'] = round(ponderada / fila['tareas']) if fila['tareas'] else None
+        recientes[tipo] = fila
+    return {'cola': profundidad, 'recientes': recientes, 'ventana_s': ventana}
+
+
+# ---- Tareas del catálogo ----
+
+@tarea('indexar_busqueda', lote=500)
+def indexar_busqueda(claves):
+    obtener_backend().indexar([int(c) for c in claves])
+
+
+@tarea('refrescar_analitica', lote=1)
+def refrescar_analitica(claves):
+    refrescar()
+
+
+def _ids_claves(claves):
+    """Claves '<id>' o '<desde>-<hasta>' (rango de ids de un lote importado) → ids."""
+    ids = set()
+    rangos = Q()
+    for clave in claves:
+        desde, _, hasta = clave.partition('-')
+        if hasta:
+            rangos |= Q(pk__range=(int(desde), int(hasta)))
+        else:
+            ids.add(int(desde))
+    if rangos:
+        ids.update(Producto.objects.filter(rangos).values_list('pk', flat=True))
+    return ids
+
+
+@tarea('recalcular_relacionados', lote=5000)
+def recalcular_relacionados(claves):
+    # Aquí y no al principio del módulo: NumPy solo se carga en el worker,
+    # no en los procesos web que encolan
+    from .relacionados import calcular
+    calcular(_ids_claves(claves))
@@ -0,0 +1,11 @@
+from django import template
+
+from productos.plantillas import filas_productos as _filas_productos
+
+register = template.Library()
+
+
+@register.simple_tag
+def filas_productos(productos):
+    """Filas de la tabla de productos/lista.html, cacheadas por producto (productos.plantillas)."""
+    return _filas_productos(productos)
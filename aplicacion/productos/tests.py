@@ -1,3 +1,1255 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from collections import Counter
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import get_resolver, reverse
+
+from .analitica import refrescar
+from .arranque import compilar_plantillas, resolver_urls
+from .benchmark import comparar, filas_sinteticas, generar_catalogo, preparar_escenarios, resumir
+from .busqueda import InvertidoBackend, PostgresBackend, obtener_backend, tokenizar
+from .cache import cache_detalle
+from .cambios import leer_feed, posicion_feed
+from .exportacion import lineas
+from .importacion import ImportadorCatalogo, guardar_checkpoint, leer_checkpoint
+from .instrumentacion import estadisticas_vistas, verificar_presupuesto
+from .masivo import ErrorMasivo, aplicar, parametros, seleccionar
+from .models import (
+    Producto, Categoria, Etiqueta, DetalleProductos, IndiceBusqueda, MovimientoStock, ProductoResumen,
+    Cambio, CheckpointImportacion, ProductoRelacionado, ResumenCategoria, ResumenEtiqueta, Tarea,
+)
+from .paginacion import codificar_cursor, paginar_por_cursor
+from .plantillas import cache_filas
+from .proyeccion import actualizar_proyeccion, reconstruir_proyeccion
+from .relacionados import Catalogo, calcular
+from .routers import COOKIE_PRIMARIO, EnrutamientoLecturasMiddleware, RouterReplicas
+from .stock import ReservaInsuficiente, StockInsuficiente, ajustar, confirmar, liberar, reservar
+from .sugerencias import IndicePrefijos, indice_productos
+from .tablas import tabla_categorias, tabla_etiquetas
+from .tareas import _tipos, ejecutar_lote, encolar, metricas, procesar_pendientes, tarea
+
+
+CACHES_TEST = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'productos': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'productos-test'},
+}
+
+
+@override_settings(CACHES=CACHES_TEST, PRODUCTOS_TAREAS_INMEDIATAS=False)
+class PresupuestoConsultasTests(TestCase):
+    """Cada vista debe mantenerse dentro de PRODUCTOS_PRESUPUESTO_CONSULTAS y sin N+1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('clerk', 'clerk@example.com', 'clave-segura-123')
+        categorias = [Categoria.objects.create(nombre=f'Categoría {i}') for i in range(3)]
+        etiquetas = [Etiqueta.objects.create(nombre=f'Etiqueta {i}') for i in range(4)]
+        for i in range(30):
+            p = Producto.objects.create(
+                nombre=f'Figura {i}', descripcion=f'Figura de colección número {i}',
+                precio=1000 * (i + 1), stock=i % 4, categoria=categorias[i % 3],
+            )
+            p.etiquetas.set(etiquetas[:i % 4 + 1])
+            DetalleProductos.objects.create(producto=p, peso_kg=1, alto_cm=10)
+        reconstruir_proyeccion()
+        procesar_pendientes()  # índice de búsqueda al día, como con el worker en marcha
+        calcular()
+        cls.producto = Producto.objects.order_by('pk').first()
+        cls.categoria = categorias[0]
+        cls.etiqueta = etiquetas[0]
+
+    def setUp(self):
+        cache_detalle.local.clear()
+        # Tablas de referencia cargadas, como en un proceso ya en marcha
+        tabla_categorias.filas()
+        tabla_etiquetas.filas()
+
+    def test_index(self):
+        with verificar_presupuesto('index'):
+            self.client.get(reverse('index'))
+
+    def test_lista_productos(self):
+        consultas = [
+            {},
+            {'q': 'figura'},
+            {'categoria': [self.categoria.pk], 'etiqueta': [self.etiqueta.pk], 'precio': [1, 2]},
+            {'etiqueta': [self.etiqueta.pk], 'modo': 'alguna', 'disponible': '1', 'q': 'colección'},
+        ]
+        for params in consultas:
+            with self.subTest(params=params), verificar_presupuesto('lista_productos'):
+                response = self.client.get(reverse('lista_productos'), params)
+            self.assertEqual(response.status_code, 200)
+
+    def test_facetas_por_version_del_catalogo(self):
+        params = {'categoria': [self.categoria.pk], 'q': 'figura', 'por_pagina': 5}
+        self.client.get(reverse('lista_productos'), params)
+        # Otra página de la misma búsqueda: los conteos salen de la caché
+        with verificar_presupuesto('lista_productos', maximo=1):
+            response = self.client.get(reverse('lista_productos'), {**params, 'por_pagina': 10})
+        disponibles = response.context['facetas']['disponibles']
+
+        # Un cambio del catálogo cambia la versión y los conteos se recalculan
+        producto = Producto.objects.filter(categoria=self.categoria, stock__gt=0).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            ajustar(producto.pk, -producto.stock)
+        response = self.client.get(reverse('lista_productos'), params)
+        self.assertEqual(response.context['facetas']['disponibles'], disponibles - 1)
+
+    def test_detalle_producto(self):
+        url = reverse('detalle_producto', args=[self.producto.pk])
+        with verificar_presupuesto('detalle_producto'):
+            self.client.get(url)
+        # Con la caché caliente no debería consultarse la base de datos
+        with verificar_presupuesto('detalle_producto', maximo=0):
+            self.client.get(url)
+
+    def test_listas_categorias_y_etiquetas(self):
+        for vista in ('lista_categorias', 'lista_etiquetas'):
+            with self.subTest(vista=vista), verificar_presupuesto(vista):
+                self.client.get(reverse(vista))
+
+    def test_vistas_autenticado(self):
+        # Con sesión, cada vista suma la sesión y el usuario: los presupuestos
+        # las incluyen (con las tablas de referencia y los conteos ya en caché)
+        with self.captureOnCommitCallbacks(execute=True):
+            refrescar(forzar=True)
+        self.client.force_login(self.usuario)
+        vistas = [
+            ('index', []), ('lista_productos', []), ('detalle_producto', [self.producto.pk]),
+            ('lista_categorias', []), ('lista_etiquetas', []), ('crear_producto', []),
+            ('editar_producto', [self.producto.pk]), ('eliminar_producto', [self.producto.pk]),
+        ]
+        for vista, args in vistas:
+            with self.subTest(vista=vista), verificar_presupuesto(vista):
+                response = self.client.get(reverse(vista, args=args))
+            self.assertEqual(response.status_code, 200)
+
+    def test_feed_cambios(self):
+        with verificar_presupuesto('feed_cambios'):
+            self.client.get(reverse('feed_cambios'))
+
+    def test_formularios_producto(self):
+        self.client.force_login(self.usuario)
+        with verificar_presupuesto('crear_producto'):
+            self.client.get(reverse('crear_producto'))
+        with verificar_presupuesto('editar_producto'):
+            self.client.get(reverse('editar_producto', args=[self.producto.pk]))
+        with verificar_presupuesto('eliminar_producto'):
+            self.client.get(reverse('eliminar_producto', args=[self.producto.pk]))
+
+    def test_escrituras_producto(self):
+        self.client.force_login(self.usuario)
+        datos = {
+            'nombre': 'Figura nueva', 'descripcion': 'Edición limitada', 'precio': '15000',
+            'stock': '5', 'categoria': self.categoria.pk, 'etiquetas': [self.etiqueta.pk],
+            'peso_kg': '0.5',
+        }
+        with verificar_presupuesto('crear_producto', metodo='POST', permitir_repetidas=True):
+            response = self.client.post(reverse('crear_producto'), datos)
+        self.assertEqual(response.status_code, 302)
+        nuevo = Producto.objects.get(nombre='Figura nueva')
+
+        datos.update(nombre='Figura editada', stock='7')
+        with verificar_presupuesto('editar_producto', metodo='POST', permitir_repetidas=True):
+            response = self.client.post(reverse('editar_producto', args=[nuevo.pk]), datos)
+        self.assertEqual(response.status_code, 302)
+        nuevo.refresh_from_db()
+        self.assertEqual((nuevo.nombre, nuevo.stock), ('Figura editada', 7))
+        # El libro cuadra con el stock: el inicial y la edición son ajustes
+        self.assertEqual(
+            list(nuevo.movimientos.order_by('pk').values_list('tipo', 'cantidad')), [('ajuste', 5), ('ajuste', 2)],
+        )
+
+    def test_api_productos_por_lotes(self):
+        ids = list(Producto.objects.order_by('-pk').values_list('pk', flat=True))
+        url = reverse('api_productos')
+        # Mismas consultas (productos, etiquetas, detalles) para 2 ids que para 30
+        for pedidos in (ids[:2], ids):
+            with verificar_presupuesto('api_productos'):
+                response = self.client.get(url, {
+                    'ids': ','.join(map(str, pedidos)), 'fields': 'nombre,precio',
+                    'include': 'categoria,etiquetas,detalle',
+                })
+            productos = response.json()['productos']
+            self.assertEqual([p['id'] for p in productos], pedidos)
+
+        producto = Producto.objects.get(pk=ids[0])
+        self.assertEqual(productos[0], {
+            'id': producto.pk, 'nombre': producto.nombre, 'precio': str(producto.precio),
+            'categoria': {'id': producto.categoria_id, 'nombre': producto.categoria.nombre},
+            'etiquetas': [{'id': e.pk, 'nombre': e.nombre} for e in producto.etiquetas.order_by('nombre')],
+            'detalle': {'peso_kg': '1.00', 'alto_cm': '10.00', 'ancho_cm': None, 'largo_cm': None},
+        })
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'ids': f'{ids[0]},999999', 'fields': 'stock'})
+        self.assertEqual(response.json(), {
+            'productos': [{'id': ids[0], 'stock': producto.stock}], 'no_encontrados': [999999],
+        })
+        for params in ({}, {'ids': 'a,b'}, {'ids': '1', 'fields': 'costo'}, {'ids': '1', 'include': 'proveedor'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_fragmentos_de_filas_y_tiempo_de_render(self):
+        cache_filas.clear()
+        estadisticas_vistas.limpiar()
+        url = reverse('lista_productos')
+        self.client.get(url)
+        self.assertEqual(len(cache_filas), 25)
+
+        # Un cambio de precio cambia la clave de su fila: se vuelve a renderizar solo esa
+        ultimo = Producto.objects.order_by('-pk').first()
+        ProductoResumen.objects.filter(pk=ultimo.pk).update(precio=123456)
+        response = self.client.get(url)
+        self.assertContains(response, '$123456.00')
+        self.assertEqual(len(cache_filas), 26)
+        self.assertGreater(estadisticas_vistas.resumen()['lista_productos']['plantillas_ms_promedio'], 0)
+
+    def test_tablas_de_referencia_se_refrescan(self):
+        self.client.force_login(self.usuario)
+        self.client.get(reverse('crear_producto'))  # carga las tablas
+        nueva = Categoria.objects.create(nombre='Categoría recién creada')
+        self.etiqueta.nombre = 'Etiqueta renombrada'
+        self.etiqueta.save()
+        with verificar_presupuesto('crear_producto', maximo=4):
+            response = self.client.get(reverse('crear_producto'))
+        self.assertContains(response, f'<option value="{nueva.pk}">Categoría recién creada</option>', html=True)
+        self.assertContains(response, 'Etiqueta renombrada')
+        nueva.delete()
+        self.assertNotContains(self.client.get(reverse('lista_categorias')), 'Categoría recién creada')
+
+    def test_get_condicional_anonimo(self):
+        for url in (reverse('lista_productos'), reverse('detalle_producto', args=[self.producto.pk])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                # Solo ETag: Last-Modified (1 s de resolución) no distingue dos cambios en el mismo segundo
+                self.assertNotIn('Last-Modified', response)
+                with verificar_presupuesto('sin consultas', maximo=0):
+                    no_modificado = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(no_modificado.status_code, 304)
+                self.assertEqual(no_modificado['ETag'], response['ETag'])
+
+                # Cualquier cambio del producto cambia el ETag
+                with self.captureOnCommitCallbacks(execute=True):
+                    ajustar(self.producto.pk, 1)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_get_condicional_autenticado(self):
+        url = reverse('lista_productos')
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.usuario)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('ETag', response)
+
+    async def test_vistas_async(self):
+        # Mismas vistas a través del handler ASGI (AsyncClient)
+        urls = [
+            reverse('lista_productos'),
+            reverse('lista_productos') + f'?q=figura&categoria={self.categoria.pk}',
+            reverse('detalle_producto', args=[self.producto.pk]),
+            reverse('lista_categorias'),
+            reverse('lista_etiquetas'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get(reverse('detalle_producto', args=[10 ** 9]))
+        self.assertEqual(response.status_code, 404)
+
+        # Usuario autenticado: la sesión se carga con el ORM async antes del render
+        await self.async_client.aforce_login(self.usuario)
+        response = await self.async_client.get(reverse('lista_productos'))
+        self.assertContains(response, 'Hola, clerk')
+
+
+@override_settings(CACHES=CACHES_TEST)
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Figuras')
+        datos = [
+            ('Dragón rojo', 'Figura pintada a mano'),
+            ('Samurái', 'Con un dragón en la armadura'),
+            ('Dragón dorado', 'Edición dorada del dragón'),
+            ('Peluche gato', 'Suave'),
+        ]
+        cls.productos = {
+            nombre: Producto.objects.create(
+                nombre=nombre, descripcion=descripcion, precio=1000, stock=1, categoria=categoria,
+            )
+            for nombre, descripcion in datos
+        }
+
+    def backend(self):
+        if connection.vendor == 'postgresql':
+            return PostgresBackend()
+        return InvertidoBackend()
+
+    def nombres(self, queryset):
+        return [p.nombre for p in queryset.order_by('-rango', 'pk')]
+
+    def test_tokenizar(self):
+        self.assertEqual(tokenizar('El Dragón de la Ñandú-Montaña, 2 x'), ['dragon', 'nandu', 'montana'])
+
+    def test_buscar_relevancia_y_todos_los_terminos(self):
+        backend = self.backend()
+        backend.reconstruir()
+        # En el nombre pesa más que en la descripción; repetido, más todavía
+        self.assertEqual(
+            self.nombres(backend.buscar(Producto.objects.all(), 'dragón')),
+            ['Dragón dorado', 'Dragón rojo', 'Samurái'],
+        )
+        self.assertEqual(self.nombres(backend.buscar(Producto.objects.all(), 'dragon DORADO')), ['Dragón dorado'])
+        self.assertEqual(self.nombres(backend.buscar(Producto.objects.all(), 'unicornio')), [])
+        # También desde la proyección (lista_productos)
+        reconstruir_proyeccion()
+        self.assertEqual(backend.buscar(ProductoResumen.objects.all(), 'samurái').get().nombre, 'Samurái')
+
+    def test_indexar_reemplaza_los_terminos(self):
+        backend = self.backend()
+        backend.reconstruir()
+        gato = self.productos['Peluche gato']
+        gato.nombre = 'Peluche dragón'
+        gato.save()
+        self.assertNotIn('Peluche dragón', self.nombres(backend.buscar(Producto.objects.all(), 'dragón')))
+        backend.indexar([gato.pk])
+        self.assertIn('Peluche dragón', self.nombres(backend.buscar(Producto.objects.all(), 'dragón')))
+        self.assertEqual(list(backend.buscar(Producto.objects.all(), 'gato')), [])
+
+    def test_sugerir_por_prefijos(self):
+        backend = self.backend()
+        backend.reconstruir()
+        self.assertCountEqual(
+            backend.sugerir(Producto.objects.all(), 'drag ro').values_list('nombre', flat=True), ['Dragón rojo'],
+        )
+        self.assertFalse(backend.sugerir(Producto.objects.all(), 'de').exists())
+
+    @skipUnless(connection.vendor == 'postgresql', 'tsvector solo existe en PostgreSQL')
+    def test_postgres_rango_entero(self):
+        PostgresBackend().reconstruir()
+        rangos = PostgresBackend().buscar(Producto.objects.all(), 'dragón').values_list('rango', flat=True)
+        self.assertTrue(all(isinstance(r, int) for r in rangos))
+
+    def test_comando_reconstruir(self):
+        IndiceBusqueda.objects.all().delete()
+        salida = StringIO()
+        call_command('reconstruir_indice_busqueda', lote=2, stdout=salida)
+        self.assertIn('4 productos', salida.getvalue())
+        self.assertEqual(len(self.nombres(obtener_backend().buscar(Producto.objects.all(), 'dragón'))), 3)
+
+
+@override_settings(CACHES=CACHES_TEST)
+class PaginacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre='Figuras')
+        cls.productos = [
+            Producto.objects.create(
+                nombre='Figura dragón' if i % 2 else 'Figura', descripcion='Dragón de colección',
+                precio=1000, stock=1, categoria=categoria,
+            )
+            for i in range(7)
+        ]
+        obtener_backend().indexar([p.pk for p in cls.productos])
+
+    def recorrer(self, queryset, orden, tamano=3):
+        """Páginas hacia adelante y, desde la última, de vuelta hacia atrás."""
+        adelante, after = [], None
+        while True:
+            pagina = paginar_por_cursor(queryset, after=after, tamano=tamano, orden=orden)
+            adelante.append([p.pk for p in pagina])
+            if pagina.siguiente is None:
+                break
+            after = pagina.siguiente
+        atras, before = [adelante[-1]], pagina.anterior
+        while before is not None:
+            pagina = paginar_por_cursor(queryset, before=before, tamano=tamano, orden=orden)
+            atras.insert(0, [p.pk for p in pagina])
+            before = pagina.anterior
+        return adelante, atras
+
+    def test_adelante_y_atras(self):
+        ids = sorted((p.pk for p in self.productos), reverse=True)
+        adelante, atras = self.recorrer(Producto.objects.all(), ('-pk',))
+        self.assertEqual(adelante, [ids[:3], ids[3:6], ids[6:]])
+        self.assertEqual(atras, adelante)
+
+    def test_orden_por_rango_sin_saltos_ni_repetidos(self):
+        # Con `q` el orden es ('-rango', '-pk'), con muchos empates de rango
+        encontrados = obtener_backend().buscar(Producto.objects.all(), 'dragón')
+        esperado = list(encontrados.order_by('-rango', '-pk').values_list('pk', flat=True))
+        adelante, atras = self.recorrer(encontrados, ('-rango', '-pk'), tamano=2)
+        self.assertEqual(sum(adelante, []), esperado)
+        self.assertEqual(atras, adelante)
+
+    def test_cursor_invalido(self):
+        with self.assertRaises(ValueError):
+            paginar_por_cursor(Producto.objects.all(), after='no-es-un-cursor', orden=('-pk',))
+        url = reverse('lista_productos')
+        for params in ({'after': 'no-es-un-cursor'}, {'before': codificar_cursor([1, 2])},
+                       {'after': codificar_cursor([{'pk': 1}])}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+@override_settings(CACHES=CACHES_TEST)
+class BenchmarkTests(TestCase):
+    def test_catalogo_sintetico_reproducible(self):
+        primera = list(filas_sinteticas(200, semilla=7))
+        self.assertEqual(primera, list(filas_sinteticas(200, semilla=7)))
+        self.assertNotEqual(primera, list(filas_sinteticas(200, semilla=8)))
+        # Distribución sesgada: la etiqueta más popular es la primera
+        usos = Counter(e for fila in primera for e in fila['etiquetas'])
+        self.assertEqual(usos.most_common(1)[0][0], 'etiqueta-0001')
+
+    def test_generar_catalogo_y_escenarios(self):
+        creados, _ = generar_catalogo(120, semilla=3, categorias=5, etiquetas=20, lote=50)
+        self.assertEqual(creados, 120)
+        self.assertEqual(ProductoResumen.objects.count(), 120)
+        for escenario in preparar_escenarios(semilla=3, muestras=10):
+            with self.subTest(escenario=escenario.nombre):
+                self.assertEqual(escenario.ejecutar(self.client, 0).status_code, 200)
+
+    def test_percentiles_y_regresiones(self):
+        resumen = resumir([i / 1000 for i in range(1, 101)])
+        self.assertEqual((resumen['p50_ms'], resumen['p95_ms'], resumen['p99_ms']), (50, 95, 99))
+        base = {'resultados': {'lista': {'p95_ms': 40.0}, 'detalle': {'p95_ms': 2.0}}}
+        actual = {'resultados': {'lista': {'p95_ms': 60.0}, 'detalle': {'p95_ms': 2.5}}}
+        regresiones = {f['escenario'] for f in comparar(actual, base) if f['regresion']}
+        self.assertEqual(regresiones, {'lista'})
+
+
+@override_settings(CACHES=CACHES_TEST)
+class ProyeccionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre='Figuras')
+        cls.etiqueta = Etiqueta.objects.create(nombre='Dragones')
+
+    def setUp(self):
+        cache_detalle.local.clear()
+
+    def test_cambios_fuera_de_las_vistas(self):
+        # Como desde el admin o la shell: cada guardado proyecta
+        p = Producto.objects.create(nombre='Dragón', precio=1000, stock=1, categoria=self.categoria)
+        self.assertEqual(ProductoResumen.objects.get(pk=p.pk).nombre, 'Dragón')
+        url = reverse('detalle_producto', args=[p.pk])
+        self.assertContains(self.client.get(url), 'Sin etiquetas')  # queda en caché
+
+        p.nombre = 'Dragón rojo'
+        p.save()
+        p.etiquetas.add(self.etiqueta)
+        DetalleProductos.objects.create(producto=p, peso_kg=2)
+        resumen = ProductoResumen.objects.get(pk=p.pk)
+        self.assertEqual((resumen.nombre, resumen.etiquetas, resumen.peso_kg), ('Dragón rojo', ['Dragones'], 2))
+        response = self.client.get(url)
+        self.assertContains(response, 'Dragón rojo')
+        self.assertContains(response, 'Dragones')
+
+        self.etiqueta.productos.clear()
+        p.detalle.delete()
+        resumen = ProductoResumen.objects.get(pk=p.pk)
+        self.assertEqual((resumen.etiquetas, resumen.tiene_detalle), ([], False))
+
+        p.delete()
+        self.assertFalse(ProductoResumen.objects.exists())
+
+    def test_renombrar_categoria_sin_invalidar_cada_detalle(self):
+        p = Producto.objects.create(nombre='Dragón', precio=1000, stock=1, categoria=self.categoria)
+        url = reverse('detalle_producto', args=[p.pk])
+        etag = self.client.get(url)['ETag']
+        invalidaciones = cache_detalle.estadisticas()['invalidaciones']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.nombre = 'Estatuas'
+            self.categoria.save()
+        self.assertEqual(cache_detalle.estadisticas()['invalidaciones'], invalidaciones)
+        self.assertEqual(ProductoResumen.objects.get(pk=p.pk).categoria_nombre, 'Estatuas')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Estatuas')
+
+    def test_reconstruir_sobre_las_filas_existentes(self):
+        productos = [
+            Producto.objects.create(nombre=f'Figura {i}', precio=1000, stock=1, categoria=self.categoria)
+            for i in range(3)
+        ]
+        ProductoResumen.objects.filter(pk=productos[0].pk).update(nombre='desactualizado')
+        ProductoResumen.objects.filter(pk=productos[1].pk).delete()
+        self.assertEqual(reconstruir_proyeccion(lote=2), 3)
+        self.assertEqual(
+            sorted(ProductoResumen.objects.values_list('nombre', flat=True)), ['Figura 0', 'Figura 1', 'Figura 2'],
+        )
+
+
+@override_settings(CACHES=CACHES_TEST, PRODUCTOS_TAREAS_INMEDIATAS=False)
+class OperacionesMasivasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorias = [Categoria.objects.create(nombre=f'Categoría {i}') for i in range(2)]
+        cls.etiquetas = [Etiqueta.objects.create(nombre=f'Etiqueta {i}') for i in range(2)]
+        for i in range(12):
+            p = Producto.objects.create(
+                nombre=f'Figura {i}', descripcion='Figura', precio=1000 * (i + 1),
+                stock=i, categoria=cls.categorias[i % 2],
+            )
+            p.etiquetas.set(cls.etiquetas[:1])
+            DetalleProductos.objects.create(producto=p, peso_kg=1)
+        reconstruir_proyeccion()
+
+    def resumenes_al_dia(self):
+        for p in Producto.objects.prefetch_related('etiquetas').select_related('categoria', 'resumen'):
+            r = p.resumen
+            self.assertEqual(
+                (r.precio, r.stock, r.categoria_id, r.categoria_nombre, r.etiquetas),
+                (p.precio, p.stock, p.categoria_id, p.categoria.nombre, sorted(e.nombre for e in p.etiquetas.all())),
+            )
+
+    def test_precio_stock_categoria_y_etiquetas_por_lotes(self):
+        pares = seleccionar(params=parametros({'categoria': [self.categorias[0].pk]}))
+        Cambio.objects.all().delete()
+        self.assertEqual(aplicar('precio_porcentaje', pares, -10, simular=True)['productos'], 6)
+        self.assertFalse(Cambio.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = aplicar('precio_porcentaje', pares, '-12.5', lote=4)
+        self.assertEqual((resultado['productos'], resultado['lotes']), (6, 2))
+        self.assertEqual(Producto.objects.get(nombre='Figura 0').precio, Decimal('875.00'))
+        self.assertEqual(Producto.objects.get(nombre='Figura 1').precio, Decimal('2000.00'))
+        aplicar('precio_monto', seleccionar(ids=Producto.objects.values_list('pk', flat=True)[:2]), -1500)
+        self.assertEqual(Producto.objects.get(nombre='Figura 0').precio, 0)
+
+        todos = seleccionar(ids=Producto.objects.values_list('pk', flat=True))
+        aplicar('stock', todos, 5)
+        self.assertEqual(set(Producto.objects.values_list('stock', flat=True)), {5})
+        # Cada diferencia queda en el libro como ajuste (Figura 5 ya tenía 5)
+        self.assertEqual(MovimientoStock.objects.filter(tipo='ajuste', referencia='masivo').count(), 11)
+
+        aplicar('categoria', pares, self.categorias[1].pk)
+        aplicar('agregar_etiquetas', todos, [e.pk for e in self.etiquetas])
+        aplicar('quitar_etiquetas', todos, [self.etiquetas[0].pk])
+        self.assertEqual(Producto.etiquetas.through.objects.filter(etiqueta=self.etiquetas[1]).count(), 12)
+        self.resumenes_al_dia()
+        self.assertEqual(Cambio.objects.filter(modelo='producto', accion='actualizar').count(), 6 + 2 + 12 * 3 + 6)
+
+    def test_consultas_por_lote_no_dependen_de_los_productos(self):
+        todos = seleccionar(ids=Producto.objects.values_list('pk', flat=True))
+        # Por lote: ids, SAVEPOINT, UPDATE, UPDATE del resumen, INSERT de cambios,
+        # INSERT de la tarea de analítica, INSERT de las de relacionados,
+        # RELEASE; más el precio máximo previo y la selección final vacía.
+        # Igual con 12 que con 12.000.
+        with self.assertNumQueries(2 * 8 + 2):
+            aplicar('precio_monto', todos, 10, lote=6)
+
+    def test_precio_fuera_del_campo_no_toca_ningun_lote(self):
+        Producto.objects.filter(nombre='Figura 11').update(precio=Decimal('9999999.99'))
+        todos = seleccionar(ids=Producto.objects.values_list('pk', flat=True))
+        precios = dict(Producto.objects.values_list('pk', 'precio'))
+        for operacion, valor in (('precio_porcentaje', 1000), ('precio_monto', '90000000.01')):
+            with self.subTest(operacion=operacion), self.assertRaisesMessage(ErrorMasivo, '99999999.99'):
+                aplicar(operacion, todos, valor, lote=4)
+        self.assertEqual(dict(Producto.objects.values_list('pk', 'precio')), precios)
+        # Hasta el máximo sí se aplica
+        aplicar('precio_monto', todos, 90000000, lote=4)
+        self.assertEqual(Producto.objects.get(nombre='Figura 11').precio, Decimal('99999999.99'))
+
+        staff = User.objects.create_user('jefe', password='clave-segura-123', is_staff=True)
+        self.client.force_login(staff)
+        cuerpo = {'operacion': 'precio_porcentaje', 'valor': 1000, 'ids': list(precios)}
+        response = self.client.post(reverse('operacion_masiva'), cuerpo, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_eliminar_por_filtro_y_vista(self):
+        staff = User.objects.create_user('jefe', password='clave-segura-123', is_staff=True)
+        self.client.force_login(staff)
+        cuerpo = {'operacion': 'eliminar', 'filtros': {'categoria': [self.categorias[1].pk]}, 'simular': True}
+        response = self.client.post(reverse('operacion_masiva'), cuerpo, content_type='application/json')
+        self.assertEqual(response.json(), {
+            'operacion': 'eliminar', 'productos': 6, 'lotes': 1, 'simulado': True, 'protegidos': 0,
+        })
+        self.assertEqual(Producto.objects.count(), 12)
+
+        ajustar(Producto.objects.filter(categoria=self.categorias[1]).first().pk, 3)
+        del cuerpo['simular']
+        response = self.client.post(reverse('operacion_masiva'), cuerpo, content_type='application/json')
+        self.assertEqual(response.json()['productos'], 6)
+        self.assertFalse(Producto.objects.filter(categoria=self.categorias[1]).exists())
+        self.assertEqual(
+            [ProductoResumen.objects.count(), DetalleProductos.objects.count(),
+             Producto.etiquetas.through.objects.count(), MovimientoStock.objects.count()],
+            [6, 6, 6, 5],  # quedan los stocks iniciales de los otros 6 (uno empezó en 0)
+        )
+        self.assertEqual(Cambio.objects.filter(accion='eliminar').count(), 6)
+
+        response = self.client.post(reverse('operacion_masiva'), {'operacion': 'renombrar'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_login(User.objects.create_user('clerk', password='clave-segura-123'))
+        response = self.client.post(reverse('operacion_masiva'), cuerpo, content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(CACHES=CACHES_TEST, PRODUCTOS_TAREAS_INMEDIATAS=False)
+class ImportacionTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+
+    def archivo(self, nombre, contenido):
+        ruta = os.path.join(self.directorio, nombre)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        return ruta
+
+    def exportar(self, formato):
+        sin_ids = ('id', 'categoria_id', 'actualizado')
+        registros = [json.loads(linea) for linea in lineas('jsonl')]
+        return [{k: v for k, v in r.items() if k not in sin_ids} for r in registros], ''.join(lineas(formato))
+
+    def test_ida_y_vuelta_csv_y_jsonl(self):
+        figuras = Categoria.objects.create(nombre='Figuras')
+        dragones = Etiqueta.objects.create(nombre='Dragones')
+        for i, precio in enumerate(['1000.00', '25.50', '99999999.99']):
+            p = Producto.objects.create(
+                nombre=f'Dragón {i}', descripcion='Con "comillas", y comas', precio=precio,
+                stock=i, categoria=figuras,
+            )
+            p.etiquetas.set([dragones] if i else [])
+        DetalleProductos.objects.create(producto=p, peso_kg=Decimal('1.25'), alto_cm=Decimal('9999.99'))
+
+        for formato in ('csv', 'jsonl'):
+            with self.subTest(formato=formato):
+                originales, contenido = self.exportar(formato)
+                ruta = self.archivo(f'catalogo.{formato}', contenido)
+                Producto.objects.all().delete()
+                Tarea.objects.all().delete()
+
+                importador = ImportadorCatalogo(lote=2)
+                self.assertEqual(importador.importar(ruta)[:2], (3, 3))
+                self.assertEqual(importador.errores, [])
+                self.assertEqual(self.exportar(formato)[0], originales)
+                self.assertFalse(CheckpointImportacion.objects.exists())
+                # El stock importado entra al libro como ajuste inicial
+                self.assertEqual(
+                    sorted(MovimientoStock.objects.filter(referencia='importación').values_list('cantidad', flat=True)),
+                    [1, 2],
+                )
+                # Un recálculo de relacionados por lote, no uno por fila
+                self.assertEqual(Tarea.objects.filter(tipo='recalcular_relacionados').count(), 2)
+
+    def test_exportar_solo_personal(self):
+        Producto.objects.create(nombre='Dragón', precio=1000, stock=1, categoria=Categoria.objects.create(nombre='Figuras'))
+        url = reverse('exportar_productos') + '?formato=jsonl'
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user('clerk', password='clave-segura-123'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('jefe', password='clave-segura-123', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['nombre'], 'Dragón')
+
+    def test_filas_invalidas_no_detienen_la_importacion(self):
+        ruta = self.archivo('catalogo.jsonl', '\n'.join([
+            '{"nombre": "Dragón", "precio": "10", "categoria": "Figuras"}',
+            '{"nombre": "Roto", "precio": ',
+            '["no", "es", "un", "objeto"]',
+            '{"nombre": "Caro", "precio": "123456789.00", "categoria": "Figuras"}',
+            '{"nombre": "Fino", "precio": "1.999", "categoria": "Figuras"}',
+            '{"nombre": "Alto", "precio": "5", "categoria": "Figuras", "alto_cm": "10000"}',
+            '{"nombre": "Gato", "precio": 3.5, "categoria": "Peluches", "peso_kg": "0.25"}',
+            '{"nombre": "Lleno", "precio": "5", "categoria": "Figuras", "stock": 2147483648}',
+        ]))
+        importador = ImportadorCatalogo()
+        self.assertEqual(importador.importar(ruta)[:2], (8, 2))
+        self.assertEqual([numero for numero, _ in importador.errores], [2, 3, 4, 5, 6, 8])
+        self.assertIn('JSON inválido', importador.errores[0][1])
+        self.assertEqual(
+            sorted(ProductoResumen.objects.values_list('nombre', 'precio', 'peso_kg')),
+            [('Dragón', Decimal('10'), None), ('Gato', Decimal('3.5'), Decimal('0.25'))],
+        )
+
+    def test_reanudar_desde_checkpoint(self):
+        ruta = self.archivo('catalogo.csv', 'nombre,precio,categoria,etiquetas\n' + ''.join(
+            f'Producto {i},{i},Figuras,Dragones|Rojo\n' for i in range(1, 6)
+        ))
+        guardar_checkpoint(ruta, 3)
+        salida = StringIO()
+        call_command('importar_catalogo', ruta, reanudar=True, stdout=salida)
+        self.assertIn('Reanudando desde la fila 3', salida.getvalue())
+        self.assertEqual(sorted(Producto.objects.values_list('nombre', flat=True)), ['Producto 4', 'Producto 5'])
+        self.assertEqual(
+            list(ProductoResumen.objects.values_list('etiquetas', flat=True)), [['Dragones', 'Rojo']] * 2,
+        )
+        self.assertFalse(CheckpointImportacion.objects.exists())
+
+    def test_checkpoint_en_la_transaccion_del_lote(self):
+        ruta = self.archivo('catalogo.csv', 'nombre,precio,categoria\n' + ''.join(
+            f'Producto {i},{i},Figuras\n' for i in range(1, 6)
+        ))
+
+        class Interrumpido(ImportadorCatalogo):
+            def _escribir_lote(self, registros):
+                super()._escribir_lote(registros)
+                if registros[-1]['nombre'] == 'Producto 4':
+                    raise RuntimeError('se cortó la conexión')
+
+        with self.assertRaises(RuntimeError):
+            Interrumpido(lote=2).importar(ruta)
+        # El segundo lote se revirtió junto con su checkpoint
+        self.assertEqual(leer_checkpoint(ruta), 2)
+        self.assertEqual(Producto.objects.count(), 2)
+        ImportadorCatalogo(lote=2).importar(ruta, reanudar=True)
+        self.assertEqual(Producto.objects.count(), 5)
+        self.assertEqual(leer_checkpoint(ruta), 0)
+
+
+@override_settings(CACHES=CACHES_TEST)
+class StockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('clerk', password='clave-segura-123')
+        cls.categoria = Categoria.objects.create(nombre='Figuras')
+        cls.dragon = Producto.objects.create(nombre='Dragón', precio=1000, stock=10, categoria=cls.categoria)
+        cls.gato = Producto.objects.create(nombre='Gato', precio=500, stock=1, categoria=cls.categoria)
+
+    def stock(self, producto):
+        return (
+            Producto.objects.values_list('stock', 'reservado').get(pk=producto.pk),
+            ProductoResumen.objects.values_list('stock', flat=True).get(pk=producto.pk),
+        )
+
+    def test_reservar_liberar_confirmar(self):
+        reservar(self.dragon.pk, 4, referencia='pedido-1')
+        self.assertEqual(self.stock(self.dragon), ((6, 4), 6))
+        liberar(self.dragon.pk, 1, referencia='pedido-1')
+        self.assertEqual(self.stock(self.dragon), ((7, 3), 7))
+        confirmar(self.dragon.pk, 3, referencia='pedido-1')
+        self.assertEqual(self.stock(self.dragon), ((7, 0), 7))
+        self.assertEqual(
+            list(MovimientoStock.objects.filter(producto=self.dragon).order_by('pk').values_list('tipo', 'cantidad')),
+            [('ajuste', 10), ('reserva', 4), ('liberacion', 1), ('confirmacion', 3)],
+        )
+        # Ajustes (el primero, el stock inicial) - reservas + liberaciones = stock
+        signos = {'ajuste': 1, 'reserva': -1, 'liberacion': 1, 'confirmacion': 0}
+        self.assertEqual(
+            sum(signos[t] * c for t, c in self.dragon.movimientos.values_list('tipo', 'cantidad')), 7,
+        )
+
+    def test_stock_insuficiente(self):
+        with self.assertRaises(StockInsuficiente):
+            reservar(self.gato.pk, 2)
+        with self.assertRaises(ReservaInsuficiente):
+            confirmar(self.dragon.pk, 1)
+        with self.assertRaises(StockInsuficiente):
+            ajustar(self.gato.pk, -2)
+        self.assertEqual(self.stock(self.gato), ((1, 0), 1))
+        self.assertFalse(MovimientoStock.objects.exclude(referencia='stock inicial').exists())
+
+    def test_operar_stock(self):
+        url = reverse('operar_stock', args=['reservar'])
+        cuerpo = {'referencia': 'pedido-2', 'items': [{'producto': self.dragon.pk, 'cantidad': 2}]}
+        self.assertEqual(self.client.post(url, cuerpo, content_type='application/json').status_code, 302)
+
+        self.client.force_login(self.usuario)
+        response = self.client.post(url, cuerpo, content_type='application/json')
+        self.assertEqual(response.json(), {'ok': True, 'items': [{'producto': self.dragon.pk, 'cantidad': 2}]})
+        self.assertEqual(self.stock(self.dragon), ((8, 2), 8))
+
+        # Un carrito se aplica entero o nada
+        cuerpo['items'].append({'producto': self.gato.pk, 'cantidad': 5})
+        response = self.client.post(url, cuerpo, content_type='application/json')
+        self.assertEqual((response.status_code, response.json()['producto']), (409, self.gato.pk))
+        self.assertEqual(self.stock(self.dragon), ((8, 2), 8))
+
+        self.assertEqual(self.client.post(url, {'items': []}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, 'basura', content_type='application/json').status_code, 400)
+        otra = reverse('operar_stock', args=['regalar'])
+        self.assertEqual(self.client.post(otra, cuerpo, content_type='application/json').status_code, 404)
+
+    def test_reserva_durante_la_edicion(self):
+        self.client.force_login(self.usuario)
+        url = reverse('editar_producto', args=[self.dragon.pk])
+        formulario = self.client.get(url).context['form']
+        self.assertEqual(formulario['stock_mostrado'].value(), 10)
+
+        # Mientras el formulario está abierto se reservan 3 unidades; el
+        # usuario sube el stock de 10 a 12
+        reservar(self.dragon.pk, 3)
+        datos = {
+            'nombre': 'Dragón', 'descripcion': 'De resina', 'precio': '1000', 'stock': '12',
+            'stock_mostrado': '10', 'categoria': self.categoria.pk,
+        }
+        self.assertEqual(self.client.post(url, datos).status_code, 302)
+        self.assertEqual(self.stock(self.dragon), ((9, 3), 9))
+
+        # Bajarlo más de lo que queda disponible no se aplica: el formulario
+        # vuelve con el stock actual como base
+        reservar(self.dragon.pk, 9)
+        datos.update(stock='5', stock_mostrado='9')
+        response = self.client.post(url, datos)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ahora hay 0', response.context['form'].errors['stock'][0])
+        self.assertEqual(response.context['form']['stock_mostrado'].value(), 0)
+        self.assertEqual(self.stock(self.dragon), ((0, 12), 0))
+
+
+@override_settings(CACHES=CACHES_TEST, PRODUCTOS_CAMBIOS_MARGEN=0)
+class FeedCambiosTests(TestCase):
+    def crear(self, *pks):
+        Cambio.objects.bulk_create([Cambio(pk=pk, modelo='producto', objeto_id=pk, accion='crear') for pk in pks])
+
+    def leer_todo(self, token=None, limite=2):
+        ids = []
+        while True:
+            cambios, token, hay_mas = leer_feed(token, limite=limite)
+            ids += [c.pk for c in cambios]
+            if not hay_mas:
+                return ids, token
+
+    def test_paginas_y_token(self):
+        self.crear(1, 2, 3, 4, 5)
+        cambios, token, hay_mas = leer_feed(None, limite=2)
+        self.assertEqual(([c.pk for c in cambios], hay_mas), ([1, 2], True))
+        ids, token = self.leer_todo(token)
+        self.assertEqual(ids, [3, 4, 5])
+        self.assertEqual(leer_feed(token)[:2], ([], token))
+
+        self.crear(6)
+        response = self.client.get(reverse('feed_cambios'), {'desde': token})
+        datos = response.json()
+        self.assertEqual(([c['id'] for c in datos['cambios']], datos['hay_mas']), ([6], False))
+        self.assertEqual(leer_feed(datos['siguiente'])[0], [])
+
+    def test_token_invalido(self):
+        for token in ('basura', codificar_cursor(['x']), codificar_cursor([1, [[2, 3]]]), codificar_cursor([1, 2, 3])):
+            with self.subTest(token=token):
+                response = self.client.get(reverse('feed_cambios'), {'desde': token})
+                self.assertEqual(response.status_code, 400)
+
+    def test_transaccion_que_confirma_tarde(self):
+        # 2 y 3 son de una transacción que aún no confirmó cuando se leyó el 4
+        self.crear(1, 4, 5)
+        ids, token = self.leer_todo()
+        self.assertEqual(ids, [1, 4, 5])
+        self.crear(2, 3, 6)
+        ids, token = self.leer_todo(token, limite=1)
+        self.assertEqual(ids, [2, 3, 6])
+        self.assertEqual(token, codificar_cursor([6]))
+
+        # Pasada la ventana, un hueco (p. ej. de una transacción revertida) se abandona
+        self.crear(8)
+        _, token, _ = leer_feed(token)
+        visto = int(Cambio.objects.get(pk=8).momento.timestamp())  # el hueco lleva el momento del 8
+        self.assertEqual(token, codificar_cursor([8, [[7, 7, visto]]]))
+        self.crear(9)
+        self.assertEqual(leer_feed(token)[1], codificar_cursor([9, [[7, 7, visto]]]))
+        with override_settings(PRODUCTOS_CAMBIOS_VENTANA=-1):
+            self.assertEqual(leer_feed(token)[1], codificar_cursor([9]))
+
+    def test_posicion_incluye_los_huecos_recientes(self):
+        self.crear(1, 2, 4)
+        token = posicion_feed()
+        self.assertEqual(leer_feed(token)[0], [])
+        self.crear(3)
+        self.assertEqual([c.pk for c in leer_feed(token)[0]], [3])
+
+
+@override_settings(CACHES=CACHES_TEST, PRODUCTOS_CAMBIOS_MARGEN=0, PRODUCTOS_STOCK_BAJO=2)
+class AnaliticaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('jefe', password='clave-segura-123', is_staff=True)
+        cls.categorias = [Categoria.objects.create(nombre=f'Categoría {i}') for i in range(3)]
+        cls.etiqueta = Etiqueta.objects.create(nombre='Oferta')
+        for i in range(6):
+            p = Producto.objects.create(
+                nombre=f'Figura {i}', descripcion='Figura', precio=4000 * (i + 1),
+                stock=i, categoria=cls.categorias[i % 2],
+            )
+            if i % 2:
+                p.etiquetas.add(cls.etiqueta)
+        reconstruir_proyeccion()
+
+    def setUp(self):
+        cache_detalle.local.clear()
+        tabla_categorias.filas()
+        tabla_etiquetas.filas()
+
+    def test_refresco_guiado_por_cambios(self):
+        refresco = refrescar()
+        self.assertEqual(refresco.filas_escritas, 4)  # 3 categorías (una vacía) y 1 etiqueta
+        self.assertIsNone(refrescar())  # sin cambios nuevos no hace nada
+
+        pares = ResumenCategoria.objects.get(categoria=self.categorias[0])
+        # Figuras 0, 2 y 4: precios 4000, 12000, 20000; stock 0, 2, 4
+        self.assertEqual(
+            (pares.productos, pares.unidades, pares.valor_inventario, pares.sin_stock, pares.stock_bajo),
+            (3, 6, Decimal('104000.00'), 1, 1),
+        )
+        self.assertEqual(pares.rangos, [1, 0, 2, 0])
+        self.assertEqual(ResumenEtiqueta.objects.get(etiqueta=self.etiqueta).productos, 3)
+
+        # Un ajuste de stock cambia solo la fila de su categoría
+        ajustar(Producto.objects.get(nombre='Figura 0').pk, 10)
+        refresco = refrescar()
+        self.assertEqual(refresco.filas_escritas, 1)
+        self.assertEqual(ResumenCategoria.objects.get(categoria=self.categorias[0]).unidades, 16)
+
+    def test_tablero_y_listas_leen_los_resumenes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            refrescar()
+        self.client.force_login(self.staff)
+        with verificar_presupuesto('analitica'):
+            response = self.client.get(reverse('analitica'))
+        self.assertContains(response, '$280000.00')  # valor total del inventario
+        self.assertEqual([p['nombre'] for p in response.context['stock_bajo']], ['Figura 0', 'Figura 1', 'Figura 2'])
+
+        response = self.client.get(reverse('lista_categorias'))
+        self.assertEqual([c['productos'] for c in response.context['categorias']], [3, 3, 0])
+        response = self.client.get(reverse('lista_etiquetas'))
+        self.assertEqual(response.context['etiquetas'][0]['productos'], 3)
+
+
+@override_settings(CACHES=CACHES_TEST, PRODUCTOS_TAREAS_INMEDIATAS=False)
+class TareasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre='Figuras')
+
+    def setUp(self):
+        Tarea.objects.all().delete()
+        self.llamadas = []
+
+        @tarea('prueba', lote=3, reintentos=2)
+        def prueba(claves):
+            self.llamadas.append(sorted(claves))
+            if 'falla' in claves:
+                raise RuntimeError('sin conexión')
+
+        self.addCleanup(_tipos.pop, 'prueba')
+
+    def test_guardados_repetidos_se_fusionan(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            p = Producto.objects.create(nombre='Dragón', precio=1000, stock=1, categoria=self.categoria)
+            for nombre in ('Dragón rojo', 'Dragón dorado'):
+                p.nombre = nombre
+                p.save()
+        self.assertEqual(
+            sorted(Tarea.objects.values_list('tipo', 'clave')),
+            [('indexar_busqueda', str(p.pk)), ('recalcular_relacionados', str(p.pk)), ('refrescar_analitica', '')],
+        )
+        self.assertEqual(metricas()['cola']['indexar_busqueda']['pendiente'], 1)
+
+        # La búsqueda lo encuentra cuando pasa el worker
+        buscar = lambda: list(obtener_backend().buscar(Producto.objects.all(), 'dorado'))
+        self.assertEqual(buscar(), [])
+        self.assertEqual(procesar_pendientes(), 1)  # la analítica y los relacionados esperan su demora
+        self.assertEqual(buscar(), [p])
+
+    @override_settings(PRODUCTOS_TAREAS_INMEDIATAS=True)
+    def test_inmediatas_indexan_sin_worker(self):
+        # El perfil de desarrollo (settings.py): sin worker, la búsqueda sigue al día.
+        # La analítica también corre al confirmar: que no lea etiquetas de otra prueba
+        tabla_etiquetas.invalidar()
+        with self.captureOnCommitCallbacks(execute=True):
+            p = Producto.objects.create(nombre='Dragón dorado', precio=1000, stock=1, categoria=self.categoria)
+        self.assertEqual(list(obtener_backend().buscar(Producto.objects.all(), 'dorado')), [p])
+        self.assertFalse(Tarea.objects.exists())
+
+    @override_settings(PRODUCTOS_TAREAS_INMEDIATAS=True)
+    def test_inmediatas_no_rompen_la_peticion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            encolar('prueba', ['a'])
+        self.assertEqual(self.llamadas, [['a']])
+        with self.assertLogs('productos.tareas', 'ERROR') as log, self.captureOnCommitCallbacks(execute=True):
+            encolar('prueba', ['falla'])
+        self.assertIn('prueba', log.output[0])
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_lotes_y_reintentos(self):
+        encolar('prueba', ['a', 'b', 'c', 'd'])
+        encolar('prueba', ['a'])
+        self.assertEqual(procesar_pendientes(['prueba']), 4)
+        self.assertEqual(self.llamadas, [['a', 'b', 'c'], ['d']])
+        self.assertFalse(Tarea.objects.exists())
+
+        encolar('prueba', ['falla'])
+        ejecutar_lote('prueba')
+        tarea_fallida = Tarea.objects.get()
+        self.assertEqual((tarea_fallida.estado, tarea_fallida.intentos), ('pendiente', 1))
+        self.assertIn('sin conexión', tarea_fallida.error)
+        self.assertEqual(ejecutar_lote('prueba'), 0)  # espera antes de reintentar
+
+        # Mientras espera, otra igual se fusiona con ella
+        encolar('prueba', ['falla'])
+        self.assertEqual(Tarea.objects.count(), 1)
+        Tarea.objects.update(disponible_desde=tarea_fallida.creado)
+        ejecutar_lote('prueba')
+        self.assertEqual(Tarea.objects.get().estado, 'fallida')
+
+        datos = metricas()
+        self.assertEqual(datos['cola']['prueba']['fallida'], 1)
+        self.assertEqual(
+            {k: datos['recientes']['prueba'][k] for k in ('lotes', 'tareas', 'fallos')},
+            {'lotes': 4, 'tareas': 6, 'fallos': 2},
+        )
+
+
+@override_settings(CACHES=CACHES_TEST, PRODUCTOS_TAREAS_INMEDIATAS=False, PRODUCTOS_CAMBIOS_MARGEN=0, PRODUCTOS_SUGERENCIAS_SINCRONIZACION=0)
+class SugerenciasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        figuras = Categoria.objects.create(nombre='Figuras')
+        Categoria.objects.create(nombre='Peluches')
+        Etiqueta.objects.create(nombre='Dragones')
+        cls.productos = {
+            nombre: Producto.objects.create(nombre=nombre, precio=1000, stock=1, categoria=figuras)
+            for nombre in ('Figura Dragón rojo', 'Figura dragón azul', 'Peluche gato')
+        }
+        procesar_pendientes()
+
+    def setUp(self):
+        indice_productos.limpiar()
+        tabla_categorias.filas()
+        tabla_etiquetas.filas()
+
+    def sugerir(self, q):
+        with verificar_presupuesto('sugerencias'):
+            return self.client.get(reverse('sugerencias'), {'q': q}).json()
+
+    def nombres(self, datos):
+        return [p['nombre'] for p in datos['productos']]
+
+    def test_prefijos_desde_memoria(self):
+        datos = self.sugerir('drag')
+        self.assertEqual(datos['fuente'], 'memoria')
+        self.assertEqual(self.nombres(datos), ['Figura Dragón rojo', 'Figura dragón azul'])
+        self.assertEqual([e['nombre'] for e in datos['etiquetas']], ['Dragones'])
+        self.assertEqual(self.nombres(self.sugerir('fig AZ')), ['Figura dragón azul'])
+        self.assertEqual([c['nombre'] for c in self.sugerir('pel')['categorias']], ['Peluches'])
+        self.assertEqual(self.sugerir('de'), {'productos': [], 'categorias': [], 'etiquetas': [], 'fuente': 'memoria'})
+
+    def test_cambios_se_aplican_sin_recargar(self):
+        self.sugerir('drag')
+        indice = indice_productos.indice
+        gato = self.productos['Peluche gato']
+        with self.captureOnCommitCallbacks(execute=True):
+            gato.nombre = 'Peluche dragón'
+            gato.save()
+            self.productos['Figura Dragón rojo'].delete()
+        self.assertEqual(self.nombres(self.sugerir('drag')), ['Figura dragón azul', 'Peluche dragón'])
+        self.assertEqual(self.nombres(self.sugerir('gato')), [])
+        self.assertIs(indice_productos.indice, indice)
+
+    @override_settings(PRODUCTOS_SUGERENCIAS_EN_MEMORIA=False)
+    def test_sin_indice_en_memoria_usa_la_base_de_datos(self):
+        datos = self.sugerir('drag')
+        self.assertEqual(datos['fuente'], 'bd')
+        # Por nombre, con el orden de la intercalación de la base de datos
+        self.assertCountEqual(self.nombres(datos), ['Figura Dragón rojo', 'Figura dragón azul'])
+        self.assertEqual(self.nombres(self.sugerir('fig az')), ['Figura dragón azul'])
+
+    def test_indice_incremental(self):
+        indice = IndicePrefijos([(1, 'Taza Totoro'), (2, 'Taza Kiki')])
+        indice.poner(3, 'Llavero Totoro')
+        indice.poner(1, 'Vaso Totoro')
+        indice.quitar(2)
+        self.assertEqual(indice.terminos, ['llavero', 'totoro', 'vaso'])
+        self.assertEqual(indice.buscar('to'), [(1, 'Vaso Totoro'), (3, 'Llavero Totoro')])
+        self.assertEqual(indice.buscar('to', escaneo=1), [(1, 'Vaso Totoro')])
+
+
+@override_settings(CACHES=CACHES_TEST, PRODUCTOS_TAREAS_INMEDIATAS=False, PRODUCTOS_RELACIONADOS_K=2, PRODUCTOS_RELACIONADOS_DEMORA=0)
+class RelacionadosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        figuras = Categoria.objects.create(nombre='Figuras')
+        peluches = Categoria.objects.create(nombre='Peluches')
+        dragones = Etiqueta.objects.create(nombre='Dragones')
+        rojo = Etiqueta.objects.create(nombre='Rojo')
+        cls.productos = {}
+        for nombre, categoria, precio, etiquetas in [
+            ('Dragón rojo', figuras, 1000, [dragones, rojo]),
+            ('Dragón azul', figuras, 1100, [dragones]),
+            ('Peluche dragón rojo', peluches, 1000, [dragones, rojo]),
+            ('Peluche gato', peluches, 50000, []),
+        ]:
+            p = cls.productos[nombre] = Producto.objects.create(
+                nombre=nombre, precio=precio, stock=1, categoria=categoria,
+            )
+            p.etiquetas.set(etiquetas)
+        reconstruir_proyeccion()
+        Tarea.objects.all().delete()
+
+    def setUp(self):
+        cache_detalle.local.clear()
+
+    def relacionados(self, nombre):
+        return [
+            Producto.objects.get(pk=pk).nombre
+            for pk in ProductoRelacionado.objects.filter(producto=self.productos[nombre])
+            .order_by('posicion').values_list('relacionado_id', flat=True)
+        ]
+
+    def test_calculo_completo_y_detalle(self):
+        self.assertEqual(calcular(), 4)
+        self.assertCountEqual(self.relacionados('Dragón rojo'), ['Dragón azul', 'Peluche dragón rojo'])
+        # Sin etiquetas ni otros productos cerca: solo el de su categoría
+        self.assertEqual(self.relacionados('Peluche gato'), ['Peluche dragón rojo'])
+        self.assertEqual(calcular(), 0)  # nada cambió: no se reescribe
+
+        response = self.client.get(reverse('detalle_producto', args=[self.productos['Peluche gato'].pk]))
+        self.assertContains(response, 'Productos relacionados')
+        self.assertContains(
+            response, reverse('detalle_producto', args=[self.productos['Peluche dragón rojo'].pk]),
+        )
+
+    def test_recalculo_incremental_por_la_cola(self):
+        calcular()
+        url = reverse('detalle_producto', args=[self.productos['Dragón rojo'].pk])
+        self.client.get(url)  # queda en caché
+
+        peluche = self.productos['Peluche dragón rojo'].pk
+        Producto.objects.get(pk=peluche).delete()
+        # Hasta el recálculo, el detalle descarta al borrado
+        self.assertEqual(ProductoRelacionado.objects.filter(relacionado_id=peluche).count(), 3)
+        self.assertEqual(procesar_pendientes(['recalcular_relacionados']), 1)
+        self.assertFalse(ProductoRelacionado.objects.filter(relacionado_id=peluche).exists())
+        self.assertEqual(self.relacionados('Dragón rojo'), ['Dragón azul'])
+        self.assertEqual(self.relacionados('Peluche gato'), [])
+        self.assertNotContains(self.client.get(url), 'Peluche dragón rojo')
+
+        gato = self.productos['Peluche gato']
+        gato.categoria = self.productos['Dragón rojo'].categoria
+        gato.save()
+        actualizar_proyeccion([gato.pk])
+        procesar_pendientes(['recalcular_relacionados'])
+        self.assertEqual(self.relacionados('Peluche gato'), ['Dragón azul', 'Dragón rojo'])
+
+    def test_detalle_refleja_cambios_de_sus_relacionados(self):
+        calcular()
+        url = reverse('detalle_producto', args=[self.productos['Dragón rojo'].pk])
+        etag = self.client.get(url)['ETag']
+
+        # Cambiar nombre y precio de un relacionado no cambia la lista de
+        # 'Dragón rojo', pero su detalle se invalida con el recálculo
+        azul = self.productos['Dragón azul']
+        azul.nombre = 'Dragón celeste'
+        azul.precio = 1234
+        azul.save()
+        procesar_pendientes(['recalcular_relacionados'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Dragón celeste')
+        self.assertContains(response, '$1234.00')
+
+        # Y la categoría de los relacionados sale de la tabla de referencia
+        peluches = self.productos['Peluche gato'].categoria
+        peluches.nombre = 'Felpa'
+        peluches.save()
+        self.assertContains(self.client.get(url), 'Felpa')
+
+    def test_cambios_de_stock_no_recalculan(self):
+        recalculos = lambda: Tarea.objects.filter(tipo='recalcular_relacionados').count()
+        rojo = self.productos['Dragón rojo']
+        reservar(rojo.pk, 1)
+        ajustar(rojo.pk, 5)
+        aplicar('stock', seleccionar(ids=[rojo.pk]), 3)
+        self.assertEqual(recalculos(), 0)
+
+        # El formulario de edición: solo el stock, sin recálculo; el precio, sí
+        usuario = User.objects.create_user('clerk', password='clave-segura-123')
+        self.client.force_login(usuario)
+        datos = {
+            'nombre': rojo.nombre, 'descripcion': 'Figura', 'precio': '1000', 'stock': '9', 'stock_mostrado': '3',
+            'categoria': rojo.categoria_id, 'etiquetas': list(rojo.etiquetas.values_list('pk', flat=True)),
+        }
+        Producto.objects.filter(pk=rojo.pk).update(descripcion='Figura')
+        self.client.post(reverse('editar_producto', args=[rojo.pk]), datos)
+        self.assertEqual(Producto.objects.get(pk=rojo.pk).stock, 9)
+        self.assertEqual(recalculos(), 0)
+        self.client.post(reverse('editar_producto', args=[rojo.pk]), {**datos, 'precio': '1200', 'stock_mostrado': '9'})
+        self.assertEqual(recalculos(), 1)
+
+    def test_vecinos_coinciden_con_la_fuerza_bruta(self):
+        # Con pocos productos las ventanas de candidatos cubren a todos
+        rng = np.random.default_rng(7)
+        productos = [
+            (pk, int(rng.integers(1, 3)), float(rng.integers(100, 10000)), None, 10.0, None, None)
+            for pk in range(1, 21)
+        ]
+        pares = {(pk, int(rng.integers(1, 6))) for pk in range(1, 21) for _ in range(3)}
+        catalogo = Catalogo(productos, pares)
+        filas = np.arange(len(catalogo))
+        fila, vecino, similitud, posicion = catalogo.vecinos(filas, 3)
+        for f in filas:
+            otras = filas[filas != f]
+            esperadas = np.sort(catalogo.similitud(np.full(len(otras), f), otras))[::-1][:3]
+            np.testing.assert_allclose(similitud[fila == f], esperadas, rtol=1e-6)
+            self.assertEqual(posicion[fila == f].tolist(), [0, 1, 2])
+
+
+class ArranqueTests(SimpleTestCase):
+    def test_precarga_de_plantillas_y_urls(self):
+        cargador = engines['django'].engine.template_loaders[0]
+        cargador.reset()
+        self.assertGreaterEqual(compilar_plantillas(), 20)
+        for nombre in ('base.html', 'productos/lista.html', 'productos/fila.html', 'registration/login.html'):
+            self.assertIn(nombre, cargador.get_template_cache)
+        self.assertIn('sugerencias', get_resolver().reverse_dict)
+        self.assertEqual(resolver_urls(), len(get_resolver().reverse_dict))
+
+
+@override_settings(PRODUCTOS_REPLICAS=['replica'])
+class EnrutamientoReplicasTests(SimpleTestCase):
+    def destino(self, request):
+        """Alias al que el router manda las lecturas de Producto y de User durante el request."""
+        destinos = {}
+
+        def vista(request):
+            router = RouterReplicas()
+            destinos['producto'] = router.db_for_read(Producto)
+            destinos['usuario'] = router.db_for_read(User)
+            return HttpResponse()
+
+        response = EnrutamientoLecturasMiddleware(vista)(request)
+        return destinos, response
+
+    def test_vistas_de_lectura_van_a_la_replica(self):
+        destinos, _ = self.destino(RequestFactory().get(reverse('lista_productos')))
+        self.assertEqual(destinos, {'producto': 'replica', 'usuario': None})
+        destinos, _ = self.destino(RequestFactory().get(reverse('crear_producto')))
+        self.assertIsNone(destinos['producto'])
+
+    def test_lectura_tras_escritura_queda_en_el_primario(self):
+        destinos, response = self.destino(RequestFactory().post(reverse('crear_producto')))
+        self.assertIsNone(destinos['producto'])
+        self.assertIn(COOKIE_PRIMARIO, response.cookies)
+
+        request = RequestFactory().get(reverse('lista_productos'))
+        request.COOKIES[COOKIE_PRIMARIO] = response.cookies[COOKIE_PRIMARIO].value
+        destinos, _ = self.destino(request)
+        self.assertIsNone(destinos['producto'])
+
+    @override_settings(PRODUCTOS_REPLICAS=[])
+    def test_sin_replicas_todo_al_primario(self):
+        destinos, response = self.destino(RequestFactory().post(reverse('crear_producto')))
+        self.assertIsNone(destinos['producto'])
+        self.assertNotIn(COOKIE_PRIMARIO, response.cookies)
@@ -10,10 +10,20 @@ urlpatterns = [
     # Productos
     path('productos/', views.lista_productos, name='lista_productos'),
     path('productos/crear/', views.crear_producto, name='crear_producto'),
+    path('productos/exportar/', views.exportar_productos, name='exportar_productos'),
+    path('productos/cambios/', views.feed_cambios, name='feed_cambios'),
+    path('productos/sugerencias/', views.sugerencias, name='sugerencias'),
+    path('productos/stock/<str:operacion>/', views.operar_stock, name='operar_stock'),
+    path('productos/masivo/', views.operacion_masiva, name='operacion_masiva'),
+    path('productos/analitica/', views.analitica, name='analitica'),
+    path('productos/estadisticas/', views.estadisticas, name='estadisticas'),
     path('productos/<int:id>/', views.detalle_producto, name='detalle_producto'),
     path('productos/<int:id>/editar/', views.editar_producto, name='editar_producto'),
     path('productos/<int:id>/eliminar/', views.eliminar_producto, name='eliminar_producto'),
 
+    # API JSON de lectura por lotes
+    path('api/productos/', views.api_productos, name='api_productos'),
+
     # Categorías
     path('categorias/', views.lista_categorias, name='lista_categorias'),
     path('categorias/crear/', views.crear_categoria, name='crear_categoria'),
@@ -1,9 +1,35 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
-from django.db.models import Q
-from .models import Producto, Categoria, Etiqueta, DetalleProductos
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.db import transaction
+from django.db.models import F
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_POST
+from .models import Producto, Categoria, Etiqueta, DetalleProductos, ProductoRelacionado, ProductoResumen
 from .forms import ProductoForm, CategoriaForm, EtiquetaForm
+from .paginacion import apaginar_por_cursor, tamano_pagina
+from .busqueda import obtener_backend
+from .proyeccion import actualizar_proyeccion, proyeccion_diferida
+from .cache import aversion_catalogo, cache_detalle
+from .condicional import encabezados_cache, no_modificado, validador
+from .exportacion import bloques, interpretar_fecha
+from .cambios import cambios_agrupados, leer_feed, limite_feed
+from .facetas import FiltrosCatalogo, acalcular_facetas
+from .stock import ErrorStock, ajustar, procesar_lote
+from .api import aproductos, interpretar
+from .analitica import aconteos_categorias, aconteos_etiquetas, tablero
+from .masivo import BorradoProtegido, ErrorMasivo, aplicar, parametros, seleccionar
+from .instrumentacion import estadisticas_vistas
+from .routers import leer_del_primario
+from .sugerencias import sugerir
+from .tablas import tabla_categorias, tabla_etiquetas
+from .tareas import metricas as metricas_tareas
 
 
 def index(request):
@@ -12,58 +38,214 @@ def index(request):
 
 # =================== Productos ===================
 
-def lista_productos(request):
+async def _resolver_usuario(request):
+    # Carga sesión y usuario con el ORM async; así el render (síncrono) no
+    # consulta la base de datos desde el event loop al leer {{ user }}.
+    request.user = await request.auser()
+
+
+async def lista_productos(request):
+    # GET condicional: si el catálogo no cambió desde la copia del cliente, 304
+    version = await aversion_catalogo()
+    etag = validador('catalogo', version)
+    response = no_modificado(request, etag)
+    if response is not None:
+        return response
+
     q = request.GET.get('q', '').strip()
-    categoria_id = request.GET.get('categoria', '')
+    filtros = FiltrosCatalogo(request.GET)
 
-    productos = (
-        Producto.objects
-        .select_related('categoria')
-        .all()
-        .order_by('-id')
-    )
+    # Lectura desde la proyección desnormalizada: sin JOIN con Categoria
+    productos = ProductoResumen.objects.defer('descripcion')
 
+    orden = ('-pk',)
     if q:
-        productos = productos.filter(
-            Q(nombre__icontains=q) | Q(descripcion__icontains=q)
+        # Búsqueda indexada y ordenada por relevancia (ver productos.busqueda)
+        productos = obtener_backend().buscar(productos, q)
+        orden = ('-rango', '-pk')
+
+    # Facetas (con el texto aplicado), página y usuario son independientes y
+    # se piden juntos, pero el ORM async ejecuta las consultas de una en una
+    # en el hilo del request (sync_to_async thread_sensitive): gather no las
+    # solapa en la base de datos, solo evita escribir la secuencia a mano
+    try:
+        facetas, pagina, _ = await asyncio.gather(
+            acalcular_facetas(productos, filtros, clave=f'{version}:{q}'),
+            apaginar_por_cursor(
+                filtros.aplicar(productos),
+                after=request.GET.get('after'),
+                before=request.GET.get('before'),
+                tamano=tamano_pagina(request.GET.get('por_pagina')),
+                orden=orden,
+            ),
+            _resolver_usuario(request),
         )
-
-    if categoria_id:
-        productos = productos.filter(categoria_id=categoria_id)
-
-    categorias = Categoria.objects.order_by('nombre')
+    except ValueError as exc:  # cursor inválido
+        return HttpResponseBadRequest(str(exc))
 
     ctx = {
-        'productos': productos,
+        'productos': pagina,
+        'pagina': pagina,
         'q': q,
-        'categoria_id': categoria_id,
-        'categorias': categorias,
+        'filtros': filtros,
+        'facetas': facetas,
     }
-    return render(request, 'productos/lista.html', ctx)
+    response = render(request, 'productos/lista.html', ctx)
+    return encabezados_cache(request, response, etag)
+
+
+async def _cargar_resumen(id):
+    # Del primario: una réplica atrasada dejaría cacheada la versión anterior
+    # con el token de versión nuevo hasta la próxima invalidación.
+    with leer_del_primario():
+        producto = await ProductoResumen.objects.filter(pk=id).afirst()
+        if producto is None:
+            # Producto sin proyección (p. ej. cargado con loaddata): se proyecta al vuelo
+            if not await Producto.objects.filter(pk=id).aexists():
+                raise Http404('No existe el producto.')
+            await sync_to_async(actualizar_proyeccion)([id])
+            producto = await ProductoResumen.objects.aget(pk=id)
+        # Relacionados precalculados (productos.relacionados): una consulta
+        # por el índice (producto, posicion); se cachean con el producto y el
+        # recálculo invalida a los que tienen a uno que cambió
+        producto.relacionados = [
+            r async for r in ProductoRelacionado.objects
+            .filter(producto_id=id, relacionado__resumen__isnull=False)
+            .order_by('posicion')
+            .values(
+                'relacionado_id',
+                nombre=F('relacionado__resumen__nombre'),
+                precio=F('relacionado__resumen__precio'),
+                categoria_id=F('relacionado__resumen__categoria_id'),
+            )
+        ]
+    return producto
+
+
+async def detalle_producto(request, id):
+    # El nombre de la categoría (del producto y de sus relacionados) sale de
+    # la tabla de referencia y no de la entrada cacheada: renombrar una
+    # categoría no invalida el detalle de cada uno de sus productos, solo
+    # cambia la versión de la tabla
+    version = await cache_detalle.aversion(id)
+    version_categorias = await tabla_categorias.aversion()
+    etag = validador(f'producto-{id}-{version_categorias}', version)
+    response = no_modificado(request, etag)
+    if response is not None:
+        return response
+
+    # Caché versionada por producto (LRU local + caché compartida)
+    producto, _ = await asyncio.gather(
+        cache_detalle.aobtener(id, lambda: _cargar_resumen(id)),
+        _resolver_usuario(request),
+    )
+    categorias = await tabla_categorias.anombres()
+    response = render(request, 'productos/detalle.html', {
+        'producto': producto,
+        'categoria': categorias.get(producto.categoria_id, producto.categoria_nombre),
+        'relacionados': [
+            {**r, 'categoria_nombre': categorias.get(r.get('categoria_id'), '')} for r in producto.relacionados
+        ],
+    })
+    return encabezados_cache(request, response, etag)
+
+async def api_productos(request):
+    # /api/productos/?ids=1,2,3&fields=nombre,precio&include=categoria,etiquetas,detalle
+    try:
+        ids, campos, inclusiones = interpretar(request.GET)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    etag = validador('api', await aversion_catalogo())
+    response = no_modificado(request, etag)
+    if response is not None:
+        return response
+
+    productos, no_encontrados = await aproductos(ids, campos, inclusiones)
+    response = JsonResponse(
+        {'productos': productos, 'no_encontrados': no_encontrados},
+        json_dumps_params={'ensure_ascii': False},
+    )
+    return encabezados_cache(request, response, etag)
 
 
-def detalle_producto(request, id):
-    producto = get_object_or_404(Producto, pk=id)
-    return render(request, 'productos/detalle.html', {'producto': producto})
+TIPOS_EXPORTACION = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+
+
+@user_passes_test(lambda u: u.is_staff)
+def exportar_productos(request):
+    # El catálogo completo (stock incluido) de una vez: solo para el personal
+    formato = request.GET.get('formato', 'csv')
+    if formato not in TIPOS_EXPORTACION:
+        return HttpResponseBadRequest('formato debe ser csv o jsonl.')
+    try:
+        desde = interpretar_fecha(request.GET.get('updated_since'))
+    except ValueError:
+        return HttpResponseBadRequest('updated_since no es una fecha válida.')
+    comprimir = request.GET.get('gzip') in ('1', 'true')
+
+    # Streaming: memoria constante sin importar el tamaño del catálogo
+    response = StreamingHttpResponse(
+        bloques(formato, desde=desde, comprimir=comprimir),
+        content_type='application/gzip' if comprimir else TIPOS_EXPORTACION[formato],
+    )
+    nombre = f'catalogo.{formato}' + ('.gz' if comprimir else '')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+def sugerencias(request):
+    # Buscador con sugerencias: /productos/sugerencias/?q=drag
+    q = request.GET.get('q', '').strip()[:100]
+    limite = getattr(settings, 'PRODUCTOS_SUGERENCIAS_LIMITE', 8)
+    response = JsonResponse(sugerir(q, limite), json_dumps_params={'ensure_ascii': False})
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'PRODUCTOS_HTTP_MAX_AGE', 30))
+    return response
+
+
+def feed_cambios(request):
+    # Sincronización incremental: ?desde=<token devuelto en la llamada anterior>
+    try:
+        cambios, siguiente, hay_mas = leer_feed(
+            request.GET.get('desde'), limite=limite_feed(request.GET.get('limite'))
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({
+        'cambios': [
+            {
+                'id': c.pk,
+                'modelo': c.modelo,
+                'objeto_id': c.objeto_id,
+                'accion': c.accion,
+                'momento': c.momento.isoformat(),
+            }
+            for c in cambios
+        ],
+        'siguiente': siguiente,
+        'hay_mas': hay_mas,
+    })
+
+CAMPOS_DIMENSIONES = ['peso_kg', 'alto_cm', 'ancho_cm', 'largo_cm']
+
+
+def _dimensiones(form):
+    return {campo: form.cleaned_data.get(campo) or None for campo in CAMPOS_DIMENSIONES}
+
 
 @login_required
 def crear_producto(request):
     if request.method == 'POST':
         form = ProductoForm(request.POST)
         if form.is_valid():
-            p = form.save(commit=False)
-            p.save()
-            form.save_m2m()
-
-            DetalleProductos.objects.update_or_create(
-                producto=p,
-                defaults={
-                    'peso_kg':  form.cleaned_data.get('peso_kg')  or None,
-                    'alto_cm':  form.cleaned_data.get('alto_cm')  or None,
-                    'ancho_cm': form.cleaned_data.get('ancho_cm') or None,
-                    'largo_cm': form.cleaned_data.get('largo_cm') or None,
-                },
-            )
+            # Una sola transacción para el producto y todos sus derivados
+            with transaction.atomic(), proyeccion_diferida(), cambios_agrupados():
+                p = form.save(commit=False)
+                p.save()
+                form.save_m2m()
+
+                # Producto nuevo: su detalle no puede existir todavía
+                DetalleProductos.objects.create(producto=p, **_dimensiones(form))
+            cache_detalle.invalidar([p.pk])
             messages.success(request, 'Producto creado exitosamente.')
             return redirect('detalle_producto', id=p.id)
     else:
@@ -71,34 +253,58 @@ def crear_producto(request):
     return render(request, 'productos/crear.html', {'form': form})
 
 
+# El stock no se guarda desde el formulario: lo que el usuario cambió respecto
+# del valor que vio al abrirlo (campo oculto stock_mostrado) se aplica como
+# ajuste atómico (productos.stock), sin pisar reservas hechas mientras editaba.
+# Del resto se guardan solo los que cambiaron: así el producto y su detalle no
+# se reescriben (ni encolan el recálculo de relacionados) si solo cambió el stock.
+CAMPOS_EDITABLES = ['nombre', 'descripcion', 'precio', 'categoria']
+
+
 @login_required
 def editar_producto(request, id):
     p = get_object_or_404(Producto, pk=id)
+    stock_actual = p.stock
 
-    inicial = {}
+    inicial = {'stock_mostrado': p.stock}
     # OJO: related_name='detalle' → acceso como p.detalle
     d = getattr(p, 'detalle', None)
     if d:
-        inicial = {
+        inicial.update({
             'peso_kg':  d.peso_kg,
             'alto_cm':  d.alto_cm,
             'ancho_cm': d.ancho_cm,
             'largo_cm': d.largo_cm,
-        }
+        })
 
     if request.method == 'POST':
-        form = ProductoForm(request.POST, instance=p)
+        form = ProductoForm(request.POST, instance=p, initial=inicial)
         if form.is_valid():
-            p = form.save()
-            DetalleProductos.objects.update_or_create(
-                producto=p,
-                defaults={
-                    'peso_kg':  form.cleaned_data.get('peso_kg')  or None,
-                    'alto_cm':  form.cleaned_data.get('alto_cm')  or None,
-                    'ancho_cm': form.cleaned_data.get('ancho_cm') or None,
-                    'largo_cm': form.cleaned_data.get('largo_cm') or None,
-                },
-            )
+            mostrado = form.cleaned_data.get('stock_mostrado')
+            if mostrado is None:
+                mostrado = stock_actual
+            try:
+                with transaction.atomic(), proyeccion_diferida(), cambios_agrupados():
+                    p = form.save(commit=False)
+                    cambiados = [c for c in CAMPOS_EDITABLES if c in form.changed_data]
+                    p.save(update_fields=cambiados + ['actualizado'])
+                    form.save_m2m()
+                    ajustar(p.pk, p.stock - mostrado, referencia=f'edición: {request.user}')
+                    # El detalle ya se leyó arriba: se guarda sin volver a buscarlo
+                    if d is None:
+                        DetalleProductos.objects.create(producto=p, **_dimensiones(form))
+                    elif any(c in form.changed_data for c in CAMPOS_DIMENSIONES):
+                        for campo, valor in _dimensiones(form).items():
+                            setattr(d, campo, valor)
+                        d.save()
+            except ErrorStock:
+                # El formulario vuelve con el stock de ahora como base
+                actual = Producto.objects.values_list('stock', flat=True).get(pk=p.pk)
+                form.data = form.data.copy()
+                form.data['stock_mostrado'] = actual
+                form.add_error('stock', f'El stock cambió mientras editabas (ahora hay {actual}); revisa el valor.')
+                return render(request, 'productos/editar.html', {'form': form, 'producto': p})
+            cache_detalle.invalidar([p.pk])
             messages.success(request, 'Producto actualizado.')
             return redirect('detalle_producto', id=p.id)
     else:
@@ -111,17 +317,107 @@ def eliminar_producto(request, id):
     producto = get_object_or_404(Producto, pk=id)
     if request.method == 'POST':
         nombre = producto.nombre
+        pk = producto.pk
         producto.delete()
+        cache_detalle.invalidar([pk])
         messages.success(request, f'Producto "{nombre}" eliminado exitosamente.')
         return redirect('lista_productos')
     return render(request, 'productos/eliminar.html', {'producto': producto})
 
 
+OPERACIONES_STOCK = {'reservar': 'reserva', 'liberar': 'liberacion', 'confirmar': 'confirmacion'}
+
+
+@login_required
+@require_POST
+def operar_stock(request, operacion):
+    """
+    Reserva, libera o confirma un carrito completo en una transacción.
+
+    Cuerpo JSON: {"referencia": "pedido-123", "items": [{"producto": 1, "cantidad": 2}, ...]}
+    """
+    tipo = OPERACIONES_STOCK.get(operacion)
+    if tipo is None:
+        raise Http404('Operación de stock desconocida.')
+    try:
+        datos = json.loads(request.body)
+        items = [(int(i['producto']), int(i['cantidad'])) for i in datos['items']]
+        referencia = str(datos.get('referencia', ''))[:100]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Cuerpo JSON inválido.'}, status=400)
+    if not items or any(cantidad <= 0 for _, cantidad in items):
+        return JsonResponse({'error': 'Se necesitan items con cantidad positiva.'}, status=400)
+
+    try:
+        movimientos = procesar_lote(tipo, items, referencia)
+    except ErrorStock as exc:
+        return JsonResponse({'error': str(exc), 'producto': exc.producto_id}, status=409)
+    return JsonResponse({
+        'ok': True,
+        'items': [{'producto': m.producto_id, 'cantidad': m.cantidad} for m in movimientos],
+    })
+
+
+@user_passes_test(lambda u: u.is_staff)
+@require_POST
+def operacion_masiva(request):
+    """
+    Edición o borrado masivo por lista de ids y/o filtros del catálogo.
+
+    Cuerpo JSON: {"operacion": "precio_porcentaje", "valor": -10,
+    "ids": [1, 2], "filtros": {"categoria": [3]}, "simular": true}
+
+    Sin ids ni filtros no se toca nada, salvo con "todos": true.
+    """
+    try:
+        datos = json.loads(request.body)
+        operacion = str(datos['operacion'])
+        ids = datos.get('ids')
+        if ids is not None:
+            ids = [int(pk) for pk in ids]
+        filtros = datos.get('filtros')
+        seleccion = seleccionar(ids, parametros(filtros) if filtros else None, todos=datos.get('todos') is True)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Cuerpo JSON inválido.'}, status=400)
+
+    try:
+        resultado = aplicar(operacion, seleccion, datos.get('valor'), simular=bool(datos.get('simular')))
+    except BorradoProtegido as exc:
+        return JsonResponse({'error': str(exc), 'protegidos': exc.protegidos}, status=409)
+    except ErrorMasivo as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse(resultado)
+
+
+@user_passes_test(lambda u: u.is_staff)
+def analitica(request):
+    # Solo lee las tablas de resumen: refrescar con `manage.py refrescar_analitica`
+    return render(request, 'productos/analitica.html', tablero())
+
+
+@user_passes_test(lambda u: u.is_staff)
+def estadisticas(request):
+    # Consultas/tiempos por vista (InstrumentacionConsultasMiddleware), caché de
+    # detalle y cola de tareas (profundidad y latencia de la última hora)
+    return JsonResponse({
+        'vistas': estadisticas_vistas.resumen(),
+        'cache_detalle': cache_detalle.estadisticas(),
+        'tareas': metricas_tareas(),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
 # =================== Categorías ===================
 
-def lista_categorias(request):
-    categorias = Categoria.objects.order_by('nombre')
-    return render(request, 'categorias/lista.html', {'categorias': categorias})
+def _con_conteos(filas, conteos):
+    # Conteos del último refresco de productos.analitica; None si aún no lo tiene
+    return [{'id': f.id, 'nombre': f.nombre, 'productos': conteos.get(f.id)} for f in filas]
+
+
+async def lista_categorias(request):
+    categorias, conteos, _ = await asyncio.gather(
+        tabla_categorias.afilas(), aconteos_categorias(), _resolver_usuario(request),
+    )
+    return render(request, 'categorias/lista.html', {'categorias': _con_conteos(categorias, conteos)})
 
 
 @login_required
@@ -166,9 +462,11 @@ def eliminar_categoria(request, id):
 
 # =================== Etiquetas ===================
 
-def lista_etiquetas(request):
-    etiquetas = Etiqueta.objects.order_by('nombre')
-    return render(request, 'etiquetas/lista.html', {'etiquetas': etiquetas})
+async def lista_etiquetas(request):
+    etiquetas, conteos, _ = await asyncio.gather(
+        tabla_etiquetas.afilas(), aconteos_etiquetas(), _resolver_usuario(request),
+    )
+    return render(request, 'etiquetas/lista.html', {'etiquetas': _con_conteos(etiquetas, conteos)})
 
 
 @login_required